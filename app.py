@@ -1,15 +1,23 @@
 import logging
 import os
 import glob
+import shutil
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy
 import json
 
 import argparse
 
-from models import (personCountInZone, personDetectionModel, ppeDetectionModel,FireSmokeDetectionModel,fallDetectionModel,garbageDetectionModel,triphazardDetectionModel,spillDetectionModel,
-                    reID)
-from utils import drawOnFrames, jsonConfigParser, jsonResultsManager, S3VideoDownloader
+# analytics are imported when a camera config enables them, see models.analytics
+from models import ANALYTIC_PLUGINS, enabled_plugins
+from utils import (drawOnFrames, jsonConfigParser, load_camera_config, cameraConfigWatcher, jsonResultsManager,
+                   resultsIndex, violationEventEngine,
+                   resultReplayCache, detectionLogReader, detectionLogWriter, detection_log, trackStitcher,
+                   split_into_chunks, stageProfiler, tracer, pipelineMetrics, metricsServer,
+                   identityService, identityServer, init_identity_service)
 
 
 logging.basicConfig(level=logging.INFO)
@@ -30,23 +38,76 @@ class VideoProcessor:
         personInZoneCounting: handles counting person in a particular zone
         fireSmokeDetectionPipeline: Handles fire and smoke  on full image
         reidPipeline: Handles the re-identification pipeline
+        analytics: analyticPlugin of every analytic the current camera runs, their
+                   modules are only imported once a camera enables them
         videosDir: Path to local videos dir
         jsonResultsManager: Defines results schema and add different results values in
                             respective fields
         drawOnFrames: Handles drawing different results based on compliance
+        resultsIndex: Sqlite index of every frame results for fast violation queries,
+                      None if disabled in main config
+        eventEngine: Turns per frame results into start/update/end violation events,
+                     None if disabled in main config
+        resultCache: Persistent cache of frame results, used to replay videos without running
+                     any model on later loops. None if disabled in main config
+        replayDetections: If True, models are not loaded and raw detections are read from
+                          the detection logs, only analytics (zones, validation, results, draw) run
+        detectionRecorder: Writes raw detections of every model for the current video,
+                           None if recording is disabled or while replaying
+        detectionLogReader: Reads raw detections of current video while replaying
+        offlineConfig: "offlineMode" field of main config, used by process_video_offline
+        chunkWorkers: number of worker processes for process_video_chunked, 0 or 1 disables it
+        chunkWorker: True inside a chunk worker process, nothing shared by the whole video
+                     (index, result cache, events, old db cleanup) is touched there
+        reidDatabaseName: reid embedding store of current video, None for the default <camID>
+        modelLoadingConfig: "modelLoading" field of main config, parallelWorkers of the thread
+                            pool loading models and their warmUp inferences
+        cameraConfigReloadConfig: "cameraConfigReload" field of main config
+        cameraConfigWatcher: polls the camera config file of the video being processed for
+                             edits, None if hot reload is disabled or while replaying cached results
+        pendingReload: (edited camera config, future of its new models) while the models of
+                       analytics it turns on load in the background, else None
+        profiler: Per camera, per stage latency histograms and counters of the pipeline
+        metrics: Live fps, dropped frames, queue depth, model load times and reid gallery size
+        metricsServer: http server of /metrics and /healthz, None if disabled
+        identityService: cross camera identities shared by the reid of every camera, an
+                         identityService, an identityClient of another process or None if disabled
+        identityServer: serves identityService to other processes, None if not configured
+        queueDepth: decoded frames waiting to be processed in offline mode
 
     Methods:
         __call_: Call method to run our class as function
         init_pipelines: Initializes different pipelines based on camera.
                 eg: one camera may only need person in zone counting so we define those
                 in that respective cam json
+        build_analytic: Creates the pipeline of one analytic enabled by the camera
+        init_analytic: Creates the pipeline of one analytic and sets it on the processor
+        load_models: Loads the models of the camera concurrently and warms them up
+        load_model: Loads and warms up the model of one analytic
+        poll_camera_config: Applies edits of the camera config between two frames
+        apply_camera_config: Swaps the camera config and the pipelines depending on it
+        init_replay_pipelines: Initializes detection log backed pipelines instead of models
+        get_camera_config_path: path of the camera config of a video
+        get_results_config: fields of main config the results of a camera depend on
         get_camera_config_info: this will read the camera config information
+        get_cached_results: Get cached results of a video if models, configs and video are unchanged
         process_video: Start processing the individual videos from __call__
+        process_video_offline: Process a video as fast as possible, frames are read in batches
+                and frame level models run batched, no window is shown
+        predict_frame_batch: Run batched inference of frame level models on a batch of frames
+        process_video_chunked: Process chunks of a video in parallel worker processes, stitch
+                their tracks and run analytics on the stitched detections
+        process_chunk: Process one chunk inside a worker, used by process_video_chunked
         process_frame: process each frame via different pipelines via "process_video" method
+        replay_frame: draw and publish cached results of a frame instead of process_frame
+        record_detections: add raw detections of a model into the detection log
+        finish_frame: send results of a frame to recorder, cache, index and event engine
         process_ppe_detection: run ppe detection on frame.
         process_zone_counting: Counting the number of people in zone.
         process_fire_and_smoke: Run fire and smoke detection on frame.
         process_garbage_detection: Run garbage detection on frame
+        index_results: Add frame results into the results index
+        publish_events: Run event engine on frame results and send events to the sinks
 
     Order of Execution:
     1. __call__
@@ -60,17 +121,35 @@ class VideoProcessor:
     9. process_triphazard_detection
     """
 
-    def __init__(self, config_path):
+    def __init__(self, config_path, replay_detections=False, offline=False, render=None, chunk_workers=None,
+                 chunk_worker=False, trace=None):
         """FallDetector
         Initialize the VideoProcessor object.
 
         Args:
             config_path (str): Path to the main configuration file.
+            replay_detections (bool): Re-run only analytics on detections recorded
+                by a previous run, no model is loaded.
+            offline (bool): Process the video directory for maximum throughput instead of
+                displaying frames, see process_video_offline.
+            render (bool, optional): In offline mode also draw and save the output videos,
+                defaults to offlineMode.render from main config.
+            chunk_workers (int, optional): In offline mode process every video in this many
+                chunks in parallel, defaults to offlineMode.chunkWorkers from main config.
+            chunk_worker (bool): Set in the worker processes of process_video_chunked.
+            trace (bool, optional): Record a chrome trace of every video, defaults to
+                tracing.enabled from main config.
         """
-        #delete old db files if exists
-        self.delete_old_db_files()
+        self.configPath = config_path
+        self.chunkWorker = chunk_worker
         # Load main config file, this is our global config file.
         self.globalConfigInfo = jsonConfigParser(config_path).config
+        # reid identities are kept across restarts if the embedding stores are persistent
+        self.reidStoreConfig = self.globalConfigInfo["reIdModel"].get("featureStore", {})
+        self.persistentReid = self.reidStoreConfig.get("persistent", False)
+        #delete old db files if exists, other workers are still using theirs
+        if not chunk_worker:
+            self.delete_old_db_files()
 
         # Initialize different piplelines with None values
         self.personDetectionPipeline = None
@@ -84,6 +163,64 @@ class VideoProcessor:
         self.drawOnFrames = None
         self.reidPipeline = None   
         self.fallDetectionPipeline = None
+        self.spillDetectionPipeline = None
+        self.analytics = []
+        self.reidDatabaseName = None
+        # Stage latency instrumentation, a no-op if disabled in main config
+        self.profiler = stageProfiler(self.globalConfigInfo.get("profiler", {}))
+        # Chrome trace of every video, spans are added by the profiler stages and by the models
+        tracer.configure(self.globalConfigInfo.get("tracing", {}), trace)
+        # Prometheus metrics and health check, served on the port exposed by the Dockerfile
+        metrics_config = self.globalConfigInfo.get("metricsServer", {})
+        self.metrics = pipelineMetrics(self.profiler, metrics_config)
+        # Models of a camera load concurrently and are warmed up before its first frame
+        self.modelLoadingConfig = self.globalConfigInfo.get("modelLoading", {})
+        # Edits of the camera config are applied while its video runs
+        self.cameraConfigReloadConfig = self.globalConfigInfo.get("cameraConfigReload", {})
+        self.cameraConfigWatcher = None
+        self.pendingReload = None
+        self.metricsServer = None
+        self.queueDepth = 0
+        if metrics_config.get("enabled", False) and not chunk_worker:
+            self.metricsServer = metricsServer(self.metrics, metrics_config)
+            self.metricsServer.start()
+        # Cross camera global ids, chunk workers stitch their tracks instead
+        self.identityService = None
+        self.identityServer = None
+        if not chunk_worker:
+            self.identityService = init_identity_service(self.globalConfigInfo)
+            service_config = self.globalConfigInfo.get("identityService", {})
+            if isinstance(self.identityService, identityService) and service_config.get("serve", False):
+                self.identityServer = identityServer(self.identityService, service_config)
+                self.identityServer.start()
+        # Index for results, shared by all videos
+        self.resultsIndex = None
+        index_config = self.globalConfigInfo.get("resultsIndex", {})
+        if index_config.get("enabled", False) and not chunk_worker:
+            self.resultsIndex = resultsIndex(
+                index_config["databasePath"],
+                index_config["batchSize"],
+                index_config["flushInterval"],
+            )
+        # Cache of frame results for looping over the same videos
+        self.resultCache = None
+        self.resultCacheKey = None
+        self.resultCacheWriter = None
+        cache_config = self.globalConfigInfo.get("resultCache", {})
+        if cache_config.get("enabled", False) and not chunk_worker:
+            self.resultCache = resultReplayCache(cache_config["cacheDir"])
+        # Raw detections recorder and analytics-only replay
+        self.replayDetections = replay_detections
+        self.detectionRecorder = None
+        self.detectionLogReader = None
+        recorder_config = self.globalConfigInfo.get("detectionRecorder", {})
+        self.detectionLogDir = recorder_config.get("logDir", "detection_logs")
+        self.recordDetections = recorder_config.get("enabled", False) and not replay_detections
+        # Offline maximum throughput mode
+        self.offline = offline
+        self.offlineConfig = self.globalConfigInfo.get("offlineMode", {})
+        self.render = self.offlineConfig.get("render", False) if render is None else render
+        self.chunkWorkers = self.offlineConfig.get("chunkWorkers", 0) if chunk_workers is None else chunk_workers
         # Path to all videos directory
         self.videosDir = self.globalConfigInfo["videoDownloader"]["localVideoPath"]
         
@@ -91,10 +228,14 @@ class VideoProcessor:
         #S3VideoDownloader(self.globalConfigInfo) 
         
     def delete_old_db_files(self):
-        """This method deletes the old database files (.db) from the current directory.
-        This will remain only if script exectuion is stopped in between. If not, this is handled in
-        self.process_video method
+        """This method deletes the old reid embedding stores and the legacy database files (.db)
+        from the current directory. This will remain only if script exectuion is stopped in between.
+        If not, this is handled in self.process_video method. Persistent stores are kept.
         """
+        store_dir = self.reidStoreConfig.get("storeDir", "reid_store")
+        if not self.persistentReid and os.path.isdir(store_dir):
+            shutil.rmtree(store_dir)
+            print(f"Deleted: {store_dir}")
         db_files = glob.glob("*.db")
 
         # Iterate over the list of files and remove each one
@@ -111,113 +252,356 @@ class VideoProcessor:
         if not video_files_list:
             logging.error("Video dir is empty  %s", self.videosDir)
 
+        if self.offline:
+            self.process_videos_offline(video_files_list)
+            return
+
         for video_file in video_files_list:
             print("processing video  %s", video_file)
-            # Initialize camera specific pipelines
-            self.init_pipelines(video_file)
+            video_path = os.path.join(self.videosDir, video_file)
+            # Analytics only re-run on recorded detections
+            if self.replayDetections:
+                self.init_pipelines(video_file, load_models=False)
+                if not self.init_replay_pipelines(video_file):
+                    continue
+                self.process_video(video_path, video_file)
+                continue
+            # If this video was already processed with same models and configs, replay the results
+            cached_results = self.get_cached_results(video_path, video_file)
+            # Initialize camera specific pipelines, models are not needed while replaying
+            self.init_pipelines(video_file, load_models=cached_results is None)
             # process videos
-            self.process_video(os.path.join(self.videosDir, video_file), video_file)
+            self.process_video(video_path, video_file, cached_results)
             
             
 
-    def init_pipelines(self, video_file):
+    def get_cached_results(self, video_path, video_file):
+        """Look up the result cache for this video. The key is made of video content,
+        weights of every model this camera uses, camera config and main config.
+
+        Args:
+            video_path (str): Path to the video file
+            video_file (str): Name of video file
+
+        Returns:
+            resultCacheReader or None: cached results, None on cache miss or if cache is disabled
+        """
+        self.resultCacheKey = None
+        if not self.resultCache:
+            return None
+        camera_config = self.get_camera_config_info(video_file)
+        if not camera_config:
+            return None
+        self.resultCacheKey = self.resultCache.get_key(
+            video_path,
+            self.get_model_weight_paths(camera_config),
+            camera_config.as_dict(),
+            self.get_results_config(camera_config),
+        )
+        cached_results = self.resultCache.get_reader(self.resultCacheKey)
+        if cached_results:
+            logging.info("Replaying cached results for %s", video_file)
+        return cached_results
+
+    def get_model_weight_paths(self, camera_config):
+        """Weight files of all models used for this camera
+
+        Args:
+            camera_config (cameraConfig): camera config
+
+        Returns:
+            list: paths of weight files
+        """
+        return [
+            os.path.join(self.globalConfigInfo["modelsDir"], self.globalConfigInfo[name]["modelName"])
+            for name in self.get_model_config_names(camera_config)
+        ]
+
+    def get_model_config_names(self, camera_config):
+        """Main config fields of the models used for this camera"""
+        return [name for plugin in enabled_plugins(camera_config) for name in plugin.modelConfigs]
+
+    def get_results_config(self, camera_config):
+        """Fields of main config the results of this camera depend on, part of the result
+        cache key: the tracker, the model fields of the analytics it enables (thresholds,
+        class lists, validationMapping, reid gallery) without their device, and cross camera
+        identities if enabled. Profiler, metrics, downloader ... settings are left out.
+
+        Args:
+            camera_config (cameraConfig): camera config
+
+        Returns:
+            dict: json serializable subset of main config
+        """
+        results_config = {"trackerName": self.globalConfigInfo.get("trackerName")}
+        for name in self.get_model_config_names(camera_config):
+            results_config[name] = {
+                key: value for key, value in self.globalConfigInfo[name].items() if key != "device"
+            }
+        if self.identityService:
+            results_config["identityService"] = self.globalConfigInfo["identityService"]
+        return results_config
+
+    def init_pipelines(self, video_file, load_models=True):
         """Initializes various other pipelines based on camera
 
         Args:
             video_file (str): Name of video file
+            load_models (bool): If False only pipelines without models (drawing, zone counting,
+                results and events) are initialized, used when replaying cached results or detections
         """
         #stash all pipelines from previous runs
-        self.personDetectionPipeline=None
-        self.ppeDetectionPipeline = None
-        self.fallDetectionPipeline = None
-        self.personInZoneCounting = None
+        for plugin in ANALYTIC_PLUGINS:
+            setattr(self, plugin.attribute, None)
         self.jsonResultsManager = None
-        self.reidPipeline = None
-        self.fireSmokeDetectionPipeline = None
-        self.garbageDetectionPipeline = None
-        self.triphazardDetectionPipeline = None
-        self.spillDetectionPipeline = None
-        self.personDetectionPipeline = personDetectionModel(self.globalConfigInfo)
+        self.eventEngine = None
         # read camera config, if not found throw error
         self.cameraConfigInfo = self.get_camera_config_info(video_file)
         if not self.cameraConfigInfo:
-            logging.error(
-                "An error occurred, config file not found for  %s", video_file
-            )
+            raise ValueError("An error occurred, config file not found for {}".format(video_file))
+        self.profiler.set_camera(self.cameraConfigInfo["camID"])
         #Initialize the drawing on frame pipeline    
         self.drawOnFrames = drawOnFrames(self.globalConfigInfo,self.cameraConfigInfo)
-        # Initialize the reid pipeline
-        self.reidPipeline = reID(self.cameraConfigInfo, self.globalConfigInfo)
 
         # Initialize the json results manager
         self.jsonResultsManager = jsonResultsManager(self.cameraConfigInfo)
 
-        # Init ppe detection pipeline
-        if self.cameraConfigInfo["analytics"]["ppeDetection"]:
-            self.ppeDetectionPipeline = ppeDetectionModel(
-                self.globalConfigInfo, self.cameraConfigInfo
-            )
-        
-        #initialize fall detection pipeline
-        if self.cameraConfigInfo["analytics"]["fallDetection"]:
-            self.fallDetectionPipeline = fallDetectionModel(self.globalConfigInfo)
+        # Initialize the event engine, state of events is per camera
+        event_config = self.globalConfigInfo.get("eventEngine", {})
+        if event_config.get("enabled", False) and not self.chunkWorker:
+            self.eventEngine = violationEventEngine(self.cameraConfigInfo, event_config)
 
-        #initialize garbage detection pipeline
+        # Analytics enabled by this camera, only their modules get imported
+        self.analytics = enabled_plugins(self.cameraConfigInfo)
+        # Analytics without a model (person in zone counting) run on replays too
+        for plugin in self.analytics:
+            if not plugin.hasModel:
+                self.init_analytic(plugin)
 
-        if self.cameraConfigInfo["analytics"]["garbageDetection"]:
-            self.garbageDetectionPipeline = garbageDetectionModel(self.globalConfigInfo)
+        if not load_models:
+            self.metrics.set_ready(True)
+            return
+        self.load_models()
 
-        #initialize trip hazard detection pipeline
-        if self.cameraConfigInfo["analytics"]["tripHazardDetection"]:
-            self.triphazardDetectionPipeline = triphazardDetectionModel(self.globalConfigInfo)
+    def load_models(self):
+        """Loads the models of the analytics enabled by the camera in a thread pool of
+        modelLoading.parallelWorkers threads, after those with exclusiveLoad. Every model then
+        runs modelLoading.warmUpIterations inferences at its configured imageSize and batchSize,
+        so the first frames of the video don't stall on lazy initialisation. The pipeline is
+        reported ready (/readyz) only once every model is warmed up.
+        """
+        self.metrics.set_ready(False)
+        plugins = [plugin for plugin in self.analytics if plugin.hasModel]
+        # import every module first, threads importing the same packages can deadlock
+        for plugin in plugins:
+            plugin.load_class()
+        start_time = time.perf_counter()
+        # models traced with torch.fx load alone, see analyticPlugin.exclusiveLoad
+        for plugin in plugins:
+            if plugin.exclusiveLoad:
+                setattr(self, plugin.attribute, self.load_model(plugin))
+        shared = [plugin for plugin in plugins if not plugin.exclusiveLoad]
+        workers = max(1, min(self.modelLoadingConfig.get("parallelWorkers", 4), len(shared)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="modelLoader") as executor:
+            futures = [(plugin, executor.submit(self.load_model, plugin)) for plugin in shared]
+            # result() raises the first loading error, like loading the models one by one
+            for plugin, future in futures:
+                setattr(self, plugin.attribute, future.result())
+        logging.info("%d models loaded and warmed up in %.2fs", len(plugins), time.perf_counter() - start_time)
+        self.metrics.set_ready(True)
 
-        #initialize spill detection pipeline
+    def load_model(self, plugin):
+        """Loads the model of one analytic and warms it up, runs on a thread of load_models
+        or in the background of poll_camera_config
 
-        if self.cameraConfigInfo["analytics"]["spillDetection"]:
-            self.spillDetectionPipeline = spillDetectionModel(self.globalConfigInfo)
+        Args:
+            plugin (analyticPlugin): analytic enabled by the camera, with a model
 
-        # Init person in zone counting
-        if self.cameraConfigInfo["analytics"]["personInZoneCounting"]:
-            self.personInZoneCounting = personCountInZone(self.cameraConfigInfo)
-            if not self.personInZoneCounting.validZones:
-                logging.warning(
-                    "All zone points are empty, skipping counting person in zone"
-                )
+        Returns:
+            object: pipeline of the analytic, None if it was dropped
+        """
+        with self.metrics.time_model_load(plugin.name):
+            pipeline = self.build_analytic(plugin)
+        if pipeline is None or not self.modelLoadingConfig.get("warmUp", True):
+            logging.info("%s loaded in %.2fs", plugin.name, self.metrics.modelLoadSeconds[plugin.name])
+            return pipeline
+        with self.metrics.time_model_warmup(plugin.name):
+            for _ in range(self.modelLoadingConfig.get("warmUpIterations", 1)):
+                pipeline.warm_up()
+        logging.info(
+            "%s loaded in %.2fs, warmed up in %.2fs",
+            plugin.name,
+            self.metrics.modelLoadSeconds[plugin.name],
+            self.metrics.modelWarmupSeconds[plugin.name],
+        )
+        return pipeline
 
-                self.personInZoneCounting = None
-            
-        # Initialize fire and smoke detection pipeline if enabled in camera config        
-        fireandsmoke = self.cameraConfigInfo["analytics"]["fire_smoke_detection"]
-        
-        if fireandsmoke:
-            self.fireSmokeDetectionPipeline = FireSmokeDetectionModel(self.globalConfigInfo)
-            
+    def build_analytic(self, plugin, replay=False):
+        """Create the pipeline of an analytic, dropped with a warning if it has nothing to
+        run on, eg: zones without points
 
-                
-    def get_camera_config_info(self, video_path):
+        Args:
+            plugin (analyticPlugin): analytic enabled by the camera
+            replay (bool): read raw detections from the detection log instead of running the model
+
+        Returns:
+            object: pipeline, None if it was dropped
         """
-        Get camera configuration information from the corresponding JSON file.
+        pipeline = plugin.build(self, replay)
+        if plugin.required and not getattr(pipeline, plugin.required):
+            logging.warning("%s has no %s, skipping %s", plugin.configKey, plugin.required, plugin.name)
+            return None
+        return pipeline
+
+    def init_analytic(self, plugin, replay=False):
+        """Create the pipeline of an analytic and set it on the processor, see build_analytic"""
+        setattr(self, plugin.attribute, self.build_analytic(plugin, replay))
+
+    def poll_camera_config(self):
+        """Apply edits of the camera config of the running video, called between two frames.
+        Analytics turned on by the edit get their models loaded and warmed up on a background
+        thread while frames keep being processed with the current config, the edited config
+        is applied once they are ready. Person detection, reid and the tracks are kept.
+        """
+        if self.pendingReload is not None:
+            camera_config, future = self.pendingReload
+            if not future.done():
+                return
+            self.pendingReload = None
+            try:
+                pipelines = future.result()
+            except Exception as e:
+                logging.error("Could not load the models of the edited %s, keeping the current config: %s",
+                              self.cameraConfigWatcher.configFile, e)
+                return
+            self.apply_camera_config(camera_config, pipelines)
+            return
+
+        camera_config = self.cameraConfigWatcher.poll()
+        if camera_config is None:
+            return
+        if camera_config.camID != self.cameraConfigInfo.camID:
+            logging.error("camID of %s can not change while its video runs, edit ignored", self.cameraConfigWatcher.configFile)
+            return
+        running = {plugin.attribute for plugin in self.analytics}
+        added = [plugin for plugin in enabled_plugins(camera_config) if plugin.hasModel and plugin.attribute not in running]
+        if added and not self.replayDetections:
+            logging.info("Loading %s for the edited %s", ", ".join(plugin.name for plugin in added),
+                         self.cameraConfigWatcher.configFile)
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="configReload")
+            future = executor.submit(lambda: {plugin.attribute: self.load_model(plugin) for plugin in added})
+            executor.shutdown(wait=False)
+            self.pendingReload = (camera_config, future)
+            return
+        pipelines = {plugin.attribute: self.build_analytic(plugin, replay=True) for plugin in added}
+        self.apply_camera_config(camera_config, pipelines)
+
+    def apply_camera_config(self, camera_config, pipelines):
+        """Swap the camera config between two frames. Zone counting, results templates and
+        drawing are rebuilt from it, pipelines of analytics it turns off are dropped, and
+        pipelines having an update_camera_config method (eg: enabled ppes) are updated.
+        The result cache entry of the video is not written, its key is the old config.
 
         Args:
-            video_path (str): Path to the video file.
+            camera_config (cameraConfig): edited camera config
+            pipelines (dict): pipeline attribute --> pipeline of the analytics with a model
+                              it turns on, already loaded
+        """
+        start_time = time.perf_counter()
+        self.cameraConfigInfo = camera_config
+        self.analytics = enabled_plugins(camera_config)
+        for plugin in ANALYTIC_PLUGINS:
+            if plugin not in self.analytics:
+                setattr(self, plugin.attribute, None)
+                continue
+            if not plugin.hasModel:
+                self.init_analytic(plugin)
+            elif plugin.attribute in pipelines:
+                setattr(self, plugin.attribute, pipelines[plugin.attribute])
+            pipeline = getattr(self, plugin.attribute)
+            if hasattr(pipeline, "update_camera_config"):
+                pipeline.update_camera_config(camera_config)
+        self.drawOnFrames = drawOnFrames(self.globalConfigInfo, camera_config)
+        self.jsonResultsManager = jsonResultsManager(camera_config)
+        if self.resultCacheWriter:
+            self.resultCacheWriter.abort()
+            self.resultCacheWriter = None
+        logging.info(
+            "Camera config %s reloaded in %.1fms, running %s",
+            camera_config.source,
+            1e3 * (time.perf_counter() - start_time),
+            ", ".join(plugin.name for plugin in self.analytics),
+        )
+
+    def get_detection_log_path(self, video_file):
+        """Path of detection log of a video"""
+        return os.path.join(self.detectionLogDir, os.path.splitext(video_file)[0] + ".detlog")
+
+    def init_replay_pipelines(self, video_file):
+        """Initializes pipelines that read raw detections from the detection log of this
+        video instead of running models. Everything after the models (zones, ppe validation,
+        confidence thresholds, results, events and drawing) runs with the current configs.
+        Please note thresholds can only be raised compared to the recorded run.
+
+        Args:
+            video_file (str): Name of video file
 
         Returns:
-            dict: Camera configuration information.
+            bool: False if there is no detection log for this video
         """
-        camera_config_file = os.path.join(
+        log_path = self.get_detection_log_path(video_file)
+        if not os.path.exists(log_path):
+            logging.error("No detection log found for %s at %s", video_file, log_path)
+            return False
+        self.detectionLogReader = detectionLogReader(log_path)
+
+        for plugin in self.analytics:
+            if plugin.hasModel:
+                self.init_analytic(plugin, replay=True)
+        return True
+
+    def get_camera_config_path(self, video_path):
+        """Camera config of a video is config/<video name>.json"""
+        return os.path.join(
             "config", os.path.splitext(video_path)[0] + ".json"
         )
 
-        return jsonConfigParser(camera_config_file).config
+    def get_camera_config_info(self, video_path):
+        """
+        Get camera configuration information from the corresponding JSON file.
+        The config is validated and compiled once here, see utils.camera_config.
+
+        Args:
+            video_path (str): Path to the video file.
+
+        Returns:
+            cameraConfig or None: Camera configuration information, None if the file can not be read.
+
+        Raises:
+            ValueError: if the camera config is not valid
+        """
+        return load_camera_config(self.get_camera_config_path(video_path), self.globalConfigInfo)
     
-    def process_video(self, video_path, video_file_name):
+    def process_video(self, video_path, video_file_name, cached_results=None):
         """
         Process an individual video file.
 
         Args:
             video_path (str): Path to the video file.
             video_file_name(str): Name of video we are processing
+            cached_results (resultCacheReader, optional): results of every frame from the
+                result cache. If given, no model is run on this video.
         """
+        self.start_video(video_file_name, cached_results)
+        video_completed = True
+        # cached results were computed with the current config, edits apply on the next loop
+        if cached_results is None and self.cameraConfigReloadConfig.get("enabled", False):
+            self.cameraConfigWatcher = cameraConfigWatcher(
+                self.get_camera_config_path(video_file_name),
+                self.cameraConfigInfo,
+                self.globalConfigInfo,
+                self.cameraConfigReloadConfig.get("pollIntervalSec", 1.0),
+            )
 
         cap = cv2.VideoCapture(video_path)
         cv2.namedWindow("frame", cv2.WINDOW_NORMAL)
@@ -228,104 +612,602 @@ class VideoProcessor:
         )
 
         while cap.isOpened():
-            success, frame = cap.read()
+            with self.profiler.stage("decode"):
+                success, frame = cap.read()
             if success:
                 #check if the frame is valid, opencv used numpy arry to store the images
                 if not isinstance(frame, numpy.ndarray):
                     logging.warning("error with the frame")
+                    self.metrics.frame_dropped(self.cameraConfigInfo["camID"])
                     continue
-                drawn_frame = self.process_frame(frame, frame_id, video_file_name)
+                # edits of the camera config are swapped in between two frames
+                if self.cameraConfigWatcher:
+                    self.poll_camera_config()
+                with self.profiler.stage("processFrame"):
+                    if cached_results is None:
+                        drawn_frame = self.process_frame(frame, frame_id, video_file_name)
+                    elif frame_id < len(cached_results):
+                        drawn_frame = self.replay_frame(frame, frame_id, cached_results[frame_id])
+                    else:
+                        logging.warning("Result cache of %s has less frames than video", video_file_name)
+                        break
                 # save the frame in video
-                video_out_file.write(drawn_frame)
+                with self.profiler.stage("write"):
+                    video_out_file.write(drawn_frame)
                 frame_id += 1
-                cv2.imshow("frame", drawn_frame)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                with self.profiler.stage("display"):
+                    cv2.imshow("frame", drawn_frame)
+                    key = cv2.waitKey(1)
+                if key & 0xFF == ord('q'):
+                    video_completed = False
                     break
             else:
                 break                
             
         cap.release()
         video_out_file.release()
-        # remove the local db file
+        # models still loading for an edit are dropped, the next video reads the config again
+        self.cameraConfigWatcher = None
+        self.pendingReload = None
+        self.finish_video(frame_id, video_completed, cached_results)
+
+    def start_video(self, video_file_name, cached_results=None):
+        """Open the result cache writer and detection recorder of a video
+
+        Args:
+            video_file_name(str): Name of video we are processing
+            cached_results (resultCacheReader, optional): results from the result cache,
+                nothing is written while replaying them
+        """
+        self.metrics.start_camera(self.cameraConfigInfo["camID"])
+        # cache results of this run, so next loop can replay them
+        self.resultCacheWriter = None
+        if cached_results is None and self.resultCacheKey:
+            self.resultCacheWriter = self.resultCache.get_writer(self.resultCacheKey)
+        # record raw detections of this run for analytics-only re-runs
+        self.detectionRecorder = None
+        if self.recordDetections and cached_results is None:
+            self.detectionRecorder = detectionLogWriter(self.get_detection_log_path(video_file_name))
+
+    def finish_video(self, frame_id, video_completed, cached_results=None):
+        """Close everything opened for a video and flush events and index
 
-        os.remove(self.reidPipeline.local_database_name)
-        self.reidPipeline.tracklets.clear()
+        Args:
+            frame_id (int): number of processed frames
+            video_completed (bool): False if processing was stopped before the last frame
+            cached_results (resultCacheReader, optional): results from the result cache
+        """
+        # only a fully processed video is a valid cache entry
+        if cached_results is not None:
+            cached_results.close()
+        elif self.resultCacheWriter:
+            if video_completed:
+                self.resultCacheWriter.finalize()
+                self.resultCache.remove_stale_entries(self.resultCacheKey)
+            else:
+                self.resultCacheWriter.abort()
+            self.resultCacheWriter = None
+        if self.detectionRecorder:
+            self.detectionRecorder.close()
+            self.detectionRecorder = None
+        if self.detectionLogReader:
+            self.detectionLogReader.close()
+            self.detectionLogReader = None
+        # close the embedding store, removed unless identities are kept across runs,
+        # replayReID has none and importing reID would load torch
+        if hasattr(self.reidPipeline, "close"):
+            self.reidPipeline.close(delete=not self.persistentReid)
+            self.reidPipeline.tracklets.clear()
+            # track ids start again on the next run unless the store is kept
+            if self.identityService and not self.persistentReid:
+                try:
+                    self.identityService.forget_camera(self.cameraConfigInfo["camID"])
+                except (ConnectionError, RuntimeError) as e:
+                    logging.error("Identity service could not forget %s: %s", self.cameraConfigInfo["camID"], e)
+        # close all the open events of this video
+        if self.eventEngine:
+            self.send_events(self.eventEngine.flush(frame_id))
+        # write the remaining results of this video into the index
+        if self.resultsIndex:
+            self.resultsIndex.flush()
+        self.metrics.stop_camera(self.cameraConfigInfo["camID"])
+        self.profiler.report()
+        tracer.save(os.path.splitext(self.cameraConfigInfo["camID"])[0])
 
     
 
-    def process_frame(self, frame, frame_id, video_name):
+    def process_videos_offline(self, video_files_list):
+        """Process all videos with process_video_offline and report throughput
+
+        Args:
+            video_files_list (list): names of video files in self.videosDir
+        """
+        total_frames = 0
+        total_time = 0.0
+        for video_file in video_files_list:
+            video_path = os.path.join(self.videosDir, video_file)
+            self.resultCacheKey = None
+            if self.chunkWorkers > 1:
+                # models are loaded inside every worker
+                load_time = 0.0
+                start_time = time.perf_counter()
+                frames = self.process_video_chunked(video_path, video_file)
+                elapsed = time.perf_counter() - start_time
+            else:
+                start_time = time.perf_counter()
+                self.init_pipelines(video_file)
+                load_time = time.perf_counter() - start_time
+                start_time = time.perf_counter()
+                frames = self.process_video_offline(video_path, video_file)
+                elapsed = time.perf_counter() - start_time
+            total_frames += frames
+            total_time += elapsed
+            print(
+                "Offline {}: {} frames in {:.2f}s, {:.2f} fps (models loaded in {:.2f}s)".format(
+                    video_file, frames, elapsed, frames / elapsed if elapsed else 0.0, load_time
+                )
+            )
+        fps = total_frames / total_time if total_time else 0.0
+        # throughput per device, models of the pipeline share the same devices
+        devices = {
+            self.globalConfigInfo[name]["device"]
+            for name in ["PersonDetectionModel", "FireSmokeDetectionModel", "garbageDetectionModel",
+                         "triphazardDetectionModel", "spillDetectionModel"]
+            if name in self.globalConfigInfo and "device" in self.globalConfigInfo[name]
+        }
+        gpus = len([device for device in devices if str(device).startswith("cuda")])
+        if self.chunkWorkers > 1:
+            per_device = "{:.2f} fps per worker ({} workers)".format(fps / self.chunkWorkers, self.chunkWorkers)
+        elif gpus:
+            per_device = "{:.2f} fps per gpu ({} gpu)".format(fps / gpus, gpus)
+        else:
+            cores = os.cpu_count() or 1
+            per_device = "{:.2f} fps per core ({} cores)".format(fps / cores, cores)
+        print(
+            "Offline total: {} frames of {} videos in {:.2f}s, {:.2f} fps, {}".format(
+                total_frames, len(video_files_list), total_time, fps, per_device
+            )
+        )
+
+    def read_frame_batch(self, cap, batch_size):
+        """Read up to batch_size valid frames
+
+        Returns:
+            list of np.array: frames, empty at end of video
+        """
+        frames = []
+        while len(frames) < batch_size:
+            success, frame = cap.read()
+            if not success:
+                break
+            if not isinstance(frame, numpy.ndarray):
+                logging.warning("error with the frame")
+                self.metrics.frame_dropped(self.cameraConfigInfo["camID"])
+                continue
+            frames.append(frame)
+        return frames
+
+    def predict_frame_batch(self, frames):
+        """Run the models that work on full frames batched over all frames, each model
+        splits the frames by its own batchSize. Person detection and tracking keeps
+        updating the tracker frame by frame in order, and reid, ppe and fall detection
+        still run per frame in process_frame because they depend on the tracks.
+
+        Args:
+            frames (list of np.array): consecutive frames
+
+        Returns:
+            list of dict: per frame, pipeline name --> result to pass to that pipeline
+        """
+        batch_results = [dict() for _ in frames]
+        # (name, batched predict, results of one frame are a list for this pipeline)
+        batch_predictors = [("person", self.personDetectionPipeline.track_batch, True)]
+        if self.fireSmokeDetectionPipeline:
+            batch_predictors.append(("fireSmoke", self.fireSmokeDetectionPipeline.predict_batch, True))
+        if self.garbageDetectionPipeline:
+            batch_predictors.append(("garbage", self.garbageDetectionPipeline.predict_batch, False))
+        if self.triphazardDetectionPipeline:
+            batch_predictors.append(("tripHazard", self.triphazardDetectionPipeline.predict_batch, False))
+        if self.spillDetectionPipeline:
+            batch_predictors.append(("spill", self.spillDetectionPipeline.predict_batch, False))
+
+        for name, predict_batch, as_list in batch_predictors:
+            with self.profiler.stage(name + "Batch", len(frames)):
+                results = predict_batch(frames)
+            for frame_results, result in zip(batch_results, results):
+                frame_results[name] = [result] if as_list else result
+        return batch_results
+
+    def process_video_offline(self, video_path, video_file_name):
+        """
+        Process an individual video for maximum throughput. Frames are read in batches of
+        offlineMode.frameBatchSize, frame level models run batched with predict_frame_batch
+        and the results of every frame are written as json lines in offlineMode.resultsDir.
+        Frames are only drawn and saved if self.render is set.
+
+        Args:
+            video_path (str): Path to the video file.
+            video_file_name(str): Name of video we are processing
+
+        Returns:
+            int: number of processed frames
+        """
+        self.start_video(video_file_name)
+        cap = cv2.VideoCapture(video_path)
+        video_out_file = None
+        if self.render:
+            video_out_file = self.drawOnFrames.video_save_init(
+                cap, video_file_name, self.globalConfigInfo["videoSaveDir"]
+            )
+        frame_id = 0
+        with open(self.get_offline_results_path(video_file_name), "w") as results_file:
+            while True:
+                with self.profiler.stage("decode", self.offlineConfig.get("frameBatchSize", 32)):
+                    frames = self.read_frame_batch(cap, self.offlineConfig.get("frameBatchSize", 32))
+                if not frames:
+                    break
+                batch_ready_time = time.perf_counter()
+                self.queueDepth = len(frames)
+                for frame, frame_batch_results in zip(frames, self.predict_frame_batch(frames)):
+                    self.queueDepth -= 1
+                    # time this frame waited for the rest of its batch
+                    self.profiler.record("queueWait", time.perf_counter() - batch_ready_time)
+                    with self.profiler.stage("processFrame"):
+                        drawn_frame = self.process_frame(
+                            frame, frame_id, video_file_name, frame_batch_results, render=self.render
+                        )
+                    with self.profiler.stage("write"):
+                        self.write_offline_results(results_file)
+                        if video_out_file:
+                            video_out_file.write(drawn_frame)
+                    frame_id += 1
+        self.queueDepth = 0
+
+        cap.release()
+        if video_out_file:
+            video_out_file.release()
+        self.finish_video(frame_id, True)
+        return frame_id
+
+    def get_offline_results_path(self, video_file_name):
+        """Path of json lines results of a video in offline mode"""
+        results_dir = self.offlineConfig.get("resultsDir", "offline_results")
+        os.makedirs(results_dir, exist_ok=True)
+        return os.path.join(results_dir, os.path.splitext(video_file_name)[0] + ".jsonl")
+
+    def write_offline_results(self, results_file):
+        """Write results of current frame as one json line"""
+        # numpy values from the models are converted to python numbers
+        results_file.write(
+            json.dumps(self.jsonResultsManager.fullImageResults, default=lambda value: value.item()) + "\n"
+        )
+
+    def process_video_chunked(self, video_path, video_file_name):
+        """
+        Process a long video on many cores. The video is split in self.chunkWorkers chunks
+        with offlineMode.chunkOverlapFrames overlap, every chunk is processed by process_chunk
+        in its own process with its own person detection and reid, and raw detections are
+        recorded per chunk. Tracks are stitched into global ids by trackStitcher, the chunk
+        logs are merged into the detection log of the video and analytics (ppe validation,
+        zones, results, events, index) run once in order on the merged log.
+
+        Args:
+            video_path (str): Path to the video file.
+            video_file_name(str): Name of video we are processing
+
+        Returns:
+            int: number of processed frames
+        """
+        cap = cv2.VideoCapture(video_path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        chunks = split_into_chunks(
+            total_frames, self.chunkWorkers, self.offlineConfig.get("chunkOverlapFrames", 30)
+        )
+        # share the cores between workers instead of every worker using all of them
+        threads = max(1, (os.cpu_count() or 1) // len(chunks))
+        tasks = [(self.configPath, video_path, video_file_name, chunk, threads, tracer.enabled) for chunk in chunks]
+        # spawn, cuda can't be used in forked processes
+        with multiprocessing.get_context("spawn").Pool(len(chunks)) as pool:
+            chunk_results = pool.map(process_video_chunk, tasks)
+        # spans of the workers go into the trace of this video
+        for chunk in chunk_results:
+            if chunk["tracePath"]:
+                tracer.merge(chunk["tracePath"])
+
+        # stitch tracks of all chunks and merge their detections
+        stitcher = trackStitcher(
+            self.offlineConfig.get("stitchIouThreshold", 0.5), self.globalConfigInfo["reIdModel"]["confidence"]
+        )
+        mappings = stitcher.stitch(chunk_results)
+        stitcher.write_stitched_log(chunk_results, mappings, self.get_detection_log_path(video_file_name))
+        for chunk in chunk_results:
+            os.remove(chunk["logPath"])
+
+        # analytics only pass over stitched detections, frames are only decoded to render them
+        self.init_pipelines(video_file_name, load_models=False)
+        self.init_replay_pipelines(video_file_name)
+        self.metrics.start_camera(self.cameraConfigInfo["camID"])
+        cap = cv2.VideoCapture(video_path) if self.render else None
+        video_out_file = None
+        if self.render:
+            video_out_file = self.drawOnFrames.video_save_init(
+                cap, video_file_name, self.globalConfigInfo["videoSaveDir"]
+            )
+        frame_id = 0
+        processed_frames = chunk_results[-1]["end"]
+        with open(self.get_offline_results_path(video_file_name), "w") as results_file:
+            while frame_id < processed_frames:
+                frame = None
+                if cap:
+                    success, frame = cap.read()
+                    if not success:
+                        break
+                with self.profiler.stage("processFrame"):
+                    drawn_frame = self.process_frame(frame, frame_id, video_file_name, render=self.render)
+                with self.profiler.stage("write"):
+                    self.write_offline_results(results_file)
+                    if video_out_file:
+                        video_out_file.write(drawn_frame)
+                frame_id += 1
+        if cap:
+            cap.release()
+            video_out_file.release()
+        self.finish_video(frame_id, True)
+        return frame_id
+
+    def process_chunk(self, video_path, video_file_name, chunk):
+        """
+        Process one chunk of a video inside a worker of process_video_chunked. Frames from
+        chunk["firstFrame"] to chunk["end"] go through the batched offline pipeline and raw
+        detections are recorded in a chunk detection log with global frame ids.
+
+        Args:
+            video_path (str): Path to the video file.
+            video_file_name(str): Name of video we are processing
+            chunk (dict): chunk bounds from split_into_chunks
+
+        Returns:
+            dict: chunk bounds, logPath of chunk detection log, end of processed frames,
+                embeddings (track id --> reid embedding) for stitching and tracePath of
+                the chunk trace or None
+        """
+        name = "{}.chunk{}".format(os.path.splitext(video_file_name)[0], chunk["chunkId"])
+        self.reidDatabaseName = name
+        # every worker dumps its own stage stats next to the main dump
+        if self.profiler.dumpPath:
+            self.profiler.dumpPath = "{}.{}.json".format(os.path.splitext(self.profiler.dumpPath)[0], name)
+        shutil.rmtree(os.path.join(self.reidStoreConfig.get("storeDir", "reid_store"), name), ignore_errors=True)
+        self.init_pipelines(video_file_name)
+        log_path = os.path.join(self.detectionLogDir, name + ".detlog")
+        self.detectionRecorder = detectionLogWriter(log_path)
+
+        cap = cv2.VideoCapture(video_path)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, chunk["firstFrame"])
+        frame_id = chunk["firstFrame"]
+        while frame_id < chunk["end"]:
+            frames = self.read_frame_batch(
+                cap, min(self.offlineConfig.get("frameBatchSize", 32), chunk["end"] - frame_id)
+            )
+            if not frames:
+                break
+            for frame, frame_batch_results in zip(frames, self.predict_frame_batch(frames)):
+                with self.profiler.stage("processFrame"):
+                    self.process_frame(frame, frame_id, video_file_name, frame_batch_results, render=False)
+                frame_id += 1
+        cap.release()
+        self.detectionRecorder.close()
+        self.detectionRecorder = None
+        self.profiler.report()
+        trace_path = tracer.save(name)
+
+        embeddings = self.reidPipeline.get_track_embeddings()
+        self.reidPipeline.close(delete=True)
+        return dict(chunk, logPath=log_path, end=frame_id, embeddings=embeddings, tracePath=trace_path)
+
+    def process_frame(self, frame, frame_id, video_name, batch_results=None, render=True):
         """Main function for running different pipelines on frame
 
         Args:
             frame (np.array): Opencv read frame
             frame_id (int): frame id
             video_name (str): Name of the video file
+            batch_results (dict, optional): results of this frame from predict_frame_batch,
+                the models of these results are not run again
+            render (bool): draw the results on the frame
 
         Returns:
             np.array: drawn image for different piplelines
         """
+        batch_results = batch_results or {}
+        tracer.set_frame(frame_id)
         #initialize results template:
-        self.jsonResultsManager.init_template(self.cameraConfigInfo)
+        self.jsonResultsManager.init_template()
+        self.jsonResultsManager.fullImageResults["frameID"] = frame_id
+        # move detection log to this frame
+        if self.detectionRecorder:
+            self.detectionRecorder.begin_frame(frame_id)
+        if self.detectionLogReader:
+            self.detectionLogReader.advance(frame_id)
 
         # Run fire and smoke detection pipeline
         if self.fireSmokeDetectionPipeline:
-            self.process_fire_and_smoke(frame)
+            with self.profiler.stage("fireSmoke"):
+                self.process_fire_and_smoke(frame, batch_results.get("fireSmoke"))
             
         
         #Run Person detection
-        self.personDetectionPipeline(frame, )
-        self.reidPipeline(self.personDetectionPipeline.personBboxes, frame)
+        with self.profiler.stage("personDetection"):
+            self.personDetectionPipeline(frame, batch_results.get("person"))
+        person_count = len(self.personDetectionPipeline.personBboxes)
+        with self.profiler.stage("reid", person_count):
+            self.reidPipeline(self.personDetectionPipeline.personBboxes, frame)
+        self.record_detections(detection_log.PERSON, self.personDetectionPipeline.personBboxes)
 
-        frameLevelInference = self.fireSmokeDetectionPipeline or self.garbageDetectionPipeline or self.triphazardDetectionPipeline
+        # analytics enabled by the camera that can find something on a frame without persons,
+        # person detection always runs and finds nothing here
+        frameLevelInference = any(
+            plugin.configKey is not None and plugin.frameLevel and plugin.hasModel for plugin in self.analytics
+        )
 
         if not self.personDetectionPipeline.personBboxes and not frameLevelInference:
+            self.finish_frame(frame_id, None)
             return frame
         
         # add person results in json results, mainly bbox, and track_id
         if self.personDetectionPipeline.personBboxes:
             #print("Adding person results!")
-            self.jsonResultsManager.add_person_results(
-                self.personDetectionPipeline.personBboxes, frame_id
-            )
+            with self.profiler.stage("personResults", person_count):
+                self.jsonResultsManager.add_person_results(
+                    self.personDetectionPipeline.personBboxes,
+                    frame_id,
+                    getattr(self.reidPipeline, "globalIds", None) if self.identityService else None,
+                )
 
-        # Run ppe detection pipeline on image
-        if self.ppeDetectionPipeline:
-            self.process_ppe_detection(frame, self.personDetectionPipeline.personBboxes)
+        # Run ppe detection pipeline on image, it only looks inside person boxes
+        if self.ppeDetectionPipeline and person_count:
+            with self.profiler.stage("ppe", person_count):
+                self.process_ppe_detection(frame, self.personDetectionPipeline.personBboxes)
 
         # Run fall detection pipeline on image
-        if self.fallDetectionPipeline:
-            self.process_fall_detection(frame, self.personDetectionPipeline.personBboxes)
+        if self.fallDetectionPipeline and person_count:
+            with self.profiler.stage("fall", person_count):
+                self.process_fall_detection(frame, self.personDetectionPipeline.personBboxes)
             #clear data structures after adding to results
             self.fallDetectionPipeline.fall_result.clear()
 
         # Run garbage detection pipeline on image    
         if self.garbageDetectionPipeline:
-            self.process_garbage_detection(frame)
+            with self.profiler.stage("garbage"):
+                self.process_garbage_detection(frame, batch_results.get("garbage"))
 
 
         # Run trip hazard detection pipeline on image
         if self.triphazardDetectionPipeline:
-            self.process_triphazard_detection(frame)
+            with self.profiler.stage("tripHazard"):
+                self.process_triphazard_detection(frame, batch_results.get("tripHazard"))
 
         if self.spillDetectionPipeline:
-            self.process_spill_detection(frame)
+            with self.profiler.stage("spill"):
+                self.process_spill_detection(frame, batch_results.get("spill"))
 
         # Run person counting in a zone
-        if self.personInZoneCounting:
-            self.process_zone_counting()
+        if self.personInZoneCounting and person_count:
+            with self.profiler.stage("zoneCounting", person_count):
+                self.process_zone_counting()
             
 
         # delete the values that were tracked
         self.personDetectionPipeline.personBboxes.clear()
         
         # print(json.dumps(self.jsonResultsManager.fullImageResults, indent=4))
+        self.finish_frame(frame_id, self.jsonResultsManager.fullImageResults)
+        if not render:
+            return frame
 
         #draw the results on the frame
-        drawn_frame = self.drawOnFrames([frame],[self.jsonResultsManager.fullImageResults])
+        with self.profiler.stage("draw"):
+            drawn_frame = self.drawOnFrames([frame],[self.jsonResultsManager.fullImageResults])
         
         # return drawn frames
         return drawn_frame
 
+    def replay_frame(self, frame, frame_id, cached_frame_results):
+        """Same as process_frame but results come from the result cache
+
+        Args:
+            frame (np.array): Opencv read frame
+            frame_id (int): frame id
+            cached_frame_results (dict or None): cached fullImageResults, None if
+                process_frame had nothing to draw on this frame
+
+        Returns:
+            np.array: drawn image
+        """
+        self.metrics.frame_processed(self.cameraConfigInfo["camID"])
+        if cached_frame_results is None:
+            self.jsonResultsManager.init_template()
+            self.jsonResultsManager.fullImageResults["frameID"] = frame_id
+            self.index_results()
+            self.publish_events()
+            return frame
+
+        self.jsonResultsManager.fullImageResults = cached_frame_results
+        self.index_results()
+        self.publish_events()
+        with self.profiler.stage("draw"):
+            return self.drawOnFrames([frame], [cached_frame_results])
+
+    def record_detections(self, kind, rows):
+        """
+        Add raw detections of a model into the detection log if we are recording
+
+        Args:
+            kind (int): kind of detections, eg: detection_log.PERSON
+            rows (list of lists): detections of current frame
+        """
+        if self.detectionRecorder:
+            self.detectionRecorder.add(kind, rows)
+
+    def finish_frame(self, frame_id, frame_results):
+        """Send results of current frame to the detection recorder, result cache,
+        results index and event engine
+
+        Args:
+            frame_id (int): frame id
+            frame_results (dict or None): fullImageResults, None if nothing to draw
+        """
+        with self.profiler.stage("finishFrame"):
+            if self.detectionRecorder:
+                self.detectionRecorder.end_frame()
+            self.cache_results(frame_id, frame_results)
+            self.index_results()
+            self.publish_events()
+        self.metrics.frame_processed(
+            self.cameraConfigInfo["camID"], len(self.reidPipeline.tracklets), self.queueDepth
+        )
+        self.profiler.maybe_report()
+
+    def cache_results(self, frame_id, frame_results):
+        """
+        Add results of current frame into the result cache if we are writing one
+
+        Args:
+            frame_id (int): frame id
+            frame_results (dict or None): fullImageResults, None if nothing to draw
+        """
+        if self.resultCacheWriter:
+            self.resultCacheWriter.add(frame_id, frame_results)
+
+    def index_results(self):
+        """
+        Add the results of current frame into the results index if enabled.
+        Writes are batched inside resultsIndex so this is cheap per frame.
+        """
+        if self.resultsIndex:
+            self.resultsIndex.add_results(self.jsonResultsManager.fullImageResults)
+
+    def publish_events(self):
+        """
+        Run the event engine on results of current frame. Most frames produce
+        no event, only transitions of violations are sent to the sinks.
+        """
+        if self.eventEngine:
+            self.send_events(self.eventEngine(self.jsonResultsManager.fullImageResults))
+
+    def send_events(self, events):
+        """Send events to the log and the results index
+
+        Args:
+            events (list of dict): events from self.eventEngine
+        """
+        if not events:
+            return
+        for event in events:
+            logging.info("event %s", json.dumps(event))
+        if self.resultsIndex:
+            self.resultsIndex.add_events(events)
+
     def process_ppe_detection(self, frame, person_bboxes):
         """Run ppe detection on the image
 
@@ -337,6 +1219,8 @@ class VideoProcessor:
         # run ppe detection pipeline
         self.ppeDetectionPipeline(
             person_bboxes, frame,)
+        self.record_detections(detection_log.PPE, self.ppeDetectionPipeline.finalPpeBboxList)
+        self.record_detections(detection_log.BODYPART, self.ppeDetectionPipeline.finalBpBboxList)
 
         # Add ppe results in results json
         self.jsonResultsManager.add_ppe_results(
@@ -352,17 +1236,20 @@ class VideoProcessor:
         """
         self.personInZoneCounting.calculate_person_within_zone(self.jsonResultsManager.fullImageResults)
 
-    def process_fire_and_smoke(self, frame):
+    def process_fire_and_smoke(self, frame, results=None):
         """
         Handle fire and smoke detection on frames.
 
         Args:
             frame (np.array): The current video frame.
+            results (list, optional): batched inference results of this frame
         """
         
-        self.fireSmokeDetectionPipeline(frame)
+        self.fireSmokeDetectionPipeline(frame, results)
         fire_bboxes = self.fireSmokeDetectionPipeline.fire_bboxes
         smoke_bboxes = self.fireSmokeDetectionPipeline.smoke_bboxes
+        self.record_detections(detection_log.FIRE, fire_bboxes)
+        self.record_detections(detection_log.SMOKE, smoke_bboxes)
         fire_flag = self.fireSmokeDetectionPipeline.fire_detected
         smoke_flag = self.fireSmokeDetectionPipeline.smoke_detected
         if fire_flag or smoke_flag:
@@ -373,21 +1260,25 @@ class VideoProcessor:
         Runs fall detection pipeline and adds the results
         """
         self.fallDetectionPipeline(frame, person_bboxes)
+        if person_bboxes:
+            self.record_detections(detection_log.FALL, self.fallDetectionPipeline.fall_probs)
         self.jsonResultsManager.add_fall_results(self.fallDetectionPipeline.fall_result)
 
-    def process_garbage_detection(self,frame):
+    def process_garbage_detection(self,frame,result=None):
         """
         Handles garbage detection on the frames
         """
-        self.garbageDetectionPipeline(frame)
+        self.garbageDetectionPipeline(frame, result)
+        self.record_detections(detection_log.GARBAGE, self.garbageDetectionPipeline.garbage_results)
         self.jsonResultsManager.add_garbage_results(self.garbageDetectionPipeline.garbage_results)
         self.garbageDetectionPipeline.garbage_results.clear()
        
-    def process_triphazard_detection(self,frame):
+    def process_triphazard_detection(self,frame,result=None):
         """
         Handles  trip hazard detection on the frames
         """
-        self.triphazardDetectionPipeline(frame)
+        self.triphazardDetectionPipeline(frame, result)
+        self.record_detections(detection_log.TRIPHAZARD, self.triphazardDetectionPipeline.detection_results)
         #If no object is detected 
         if not self.triphazardDetectionPipeline.detection_results:
             return
@@ -395,12 +1286,65 @@ class VideoProcessor:
         self.jsonResultsManager.add_triphazard_results(self.triphazardDetectionPipeline.detection_results)
         self.triphazardDetectionPipeline.detection_results.clear()
 
-    def process_spill_detection(self,frame):
-        self.spillDetectionPipeline(frame)
+    def process_spill_detection(self,frame,result=None):
+        self.spillDetectionPipeline(frame, result)
+        self.record_detections(detection_log.SPILL, self.spillDetectionPipeline.spill_results)
         self.jsonResultsManager.add_spill_results(self.spillDetectionPipeline.spill_results)
         self.spillDetectionPipeline.spill_results.clear()
 
+def process_video_chunk(task):
+    """Entry point of a chunk worker process of VideoProcessor.process_video_chunked
+
+    Args:
+        task (tuple): main config path, video path, video file name, chunk, torch threads, tracing on
+    """
+    import torch
+
+    config_path, video_path, video_file_name, chunk, threads, trace = task
+    torch.set_num_threads(threads)
+    processor = VideoProcessor(config_path, offline=True, render=False, chunk_worker=True, trace=trace)
+    return processor.process_chunk(video_path, video_file_name, chunk)
+
+
 if __name__ == "__main__":
-    processor = VideoProcessor("config/config.json")
+    parser = argparse.ArgumentParser(description="Run safety analytics on all videos")
+    parser.add_argument("--config", default="config/config.json", help="main config file")
+    parser.add_argument(
+        "--replay-detections",
+        action="store_true",
+        help="re-run only analytics on detections recorded by a previous run, no model is loaded",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="process the video dir for maximum throughput, results are written as json lines",
+    )
+    parser.add_argument(
+        "--chunk-workers",
+        type=int,
+        default=None,
+        help="in offline mode split every video in chunks processed by this many worker processes",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        default=None,
+        help="write a chrome trace of every video into tracing.outputDir",
+    )
+    parser.add_argument(
+        "--render",
+        action="store_true",
+        default=None,
+        help="in offline mode also draw and save output videos",
+    )
+    args = parser.parse_args()
+    processor = VideoProcessor(
+        args.config,
+        replay_detections=args.replay_detections,
+        offline=args.offline,
+        render=args.render,
+        chunk_workers=args.chunk_workers,
+        trace=args.trace,
+    )
     processor()
 
@@ -0,0 +1,150 @@
+"""Recall and latency of the reid gallery index (ivfIndex) against brute force search
+
+Galleries of synthetic identities are generated like osnet ones: every identity has a
+direction and its gallery entry is the mean of noisy normalized embeddings around it.
+Directions are uniformly random, the worst case of an ivf index, or spread around
+--appearance-groups group directions (eg: uniforms, clothing colors) like real galleries. Queries are new noisy embeddings of random identities. For every gallery size and
+nprobe, recall@1 and recall@10 of the ivf search are measured against the exact search of
+the same index, with per query latency of both. Insert and delete latency are timed on
+the trained index.
+
+Run from repo root, eg:
+    python -m benchmarks.ann_benchmark
+    python -m benchmarks.ann_benchmark --tracks 1000,10000,100000 --nprobe 4,8,16 --queries 500
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.e2e_benchmark import get_commit
+from utils.ann_index.ann_index import ivfIndex, normalize
+
+DIM = 512
+
+
+def make_gallery(tracks, features_per_track, noise, groups, group_spread, rng):
+    """
+    Returns:
+        np.array: (tracks, dim) identity directions
+        np.array: (tracks, dim) gallery entries, mean of normalized noisy embeddings
+    """
+    identities = rng.standard_normal((tracks, DIM))
+    if groups:
+        centers = normalize(rng.standard_normal((groups, DIM)))
+        identities = centers[rng.integers(0, groups, size=tracks)] + group_spread * identities / np.sqrt(DIM)
+    identities = normalize(identities)
+    entries = np.zeros((tracks, DIM), dtype=np.float32)
+    for _ in range(features_per_track):
+        entries += normalize(identities + noise * rng.standard_normal((tracks, DIM)) / np.sqrt(DIM))
+    return identities, entries / features_per_track
+
+
+def make_queries(identities, queries, noise, rng):
+    targets = rng.integers(0, len(identities), size=queries)
+    return normalize(identities[targets] + noise * rng.standard_normal((queries, DIM)) / np.sqrt(DIM))
+
+
+def time_searches(index, queries, top_k, exact):
+    """
+    Returns:
+        list: ids found for every query
+        float: median latency per query in us
+    """
+    found, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        ids, _ = index.search(query, top_k=top_k, exact=exact)
+        latencies.append(time.perf_counter() - start)
+        found.append(ids)
+    return found, 1e6 * float(np.median(latencies))
+
+
+def run_case(tracks, nprobes, args, rng):
+    identities, entries = make_gallery(
+        tracks, args.features, args.noise, args.appearance_groups, args.group_spread, rng
+    )
+    queries = make_queries(identities, args.queries, args.noise, rng)
+    index = ivfIndex(DIM, nlist=args.nlist, exact_threshold=args.exact_threshold)
+    start = time.perf_counter()
+    for track_id, entry in enumerate(entries):
+        index.add(track_id, entry)
+    build_seconds = time.perf_counter() - start
+
+    exact, exact_us = time_searches(index, queries, 10, exact=True)
+    results = []
+    for nprobe in nprobes:
+        index.nprobe = nprobe
+        approximate, approximate_us = time_searches(index, queries, 10, exact=False)
+        results.append(
+            {
+                "tracks": tracks,
+                "nprobe": nprobe,
+                "nlist": 0 if index.centroids is None else len(index.centroids),
+                "exactSearch": index.centroids is None,
+                "recallAt1": float(np.mean([a[:1] == e[:1] for a, e in zip(approximate, exact)])),
+                "recallAt10": float(np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approximate, exact)])),
+                "bruteForceUs": exact_us,
+                "indexUs": approximate_us,
+                "speedup": exact_us / approximate_us,
+                "buildSeconds": build_seconds,
+            }
+        )
+
+    # incremental updates on the trained index, ids are replaced then removed
+    update_ids = rng.choice(tracks, size=min(tracks, args.queries), replace=False).tolist()
+    start = time.perf_counter()
+    for track_id in update_ids:
+        index.add(track_id, entries[track_id])
+    add_us = 1e6 * (time.perf_counter() - start) / len(update_ids)
+    start = time.perf_counter()
+    for track_id in update_ids:
+        index.remove(track_id)
+    remove_us = 1e6 * (time.perf_counter() - start) / len(update_ids)
+    for result in results:
+        result.update({"insertUs": add_us, "deleteUs": remove_us})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the reid gallery index vs brute force")
+    parser.add_argument("--tracks", default="1000,10000,50000", help="comma separated gallery sizes")
+    parser.add_argument("--nprobe", default="4,8,16,32", help="comma separated lists probed per search")
+    parser.add_argument("--nlist", type=int, default=0, help="coarse centroids, 0 for sqrt(tracks)")
+    parser.add_argument("--exact-threshold", type=int, default=2048, help="galleries smaller than this are searched exactly")
+    parser.add_argument("--queries", type=int, default=200, help="queries per gallery size")
+    parser.add_argument("--features", type=int, default=10, help="embeddings averaged per gallery entry")
+    parser.add_argument("--noise", type=float, default=1.0, help="embedding noise around the identity")
+    parser.add_argument("--appearance-groups", type=int, default=0, help="identity groups, 0 for uniform identities")
+    parser.add_argument("--group-spread", type=float, default=1.0, help="identity spread around its group")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="results path, defaults to benchmark_results/ann_<commit>.json")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    nprobes = [int(value) for value in args.nprobe.split(",")]
+    results = []
+    print("{:>8} {:>6} {:>6} {:>8} {:>9} {:>12} {:>10} {:>8}".format(
+        "tracks", "nlist", "nprobe", "recall@1", "recall@10", "bruteForceUs", "indexUs", "speedup"))
+    for tracks in [int(value) for value in args.tracks.split(",")]:
+        for result in run_case(tracks, nprobes, args, rng):
+            results.append(result)
+            print("{tracks:>8} {nlist:>6} {nprobe:>6} {recallAt1:>8.3f} {recallAt10:>9.3f} "
+                  "{bruteForceUs:>12.1f} {indexUs:>10.1f} {speedup:>7.1f}x".format(**result))
+
+    commit = get_commit()
+    output = args.output or os.path.join("benchmark_results", "ann_{}.json".format(commit))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {"commit": commit, "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args), "results": results},
+            f,
+            indent=2,
+        )
+    print("results written to", output)
+
+
+if __name__ == "__main__":
+    main()
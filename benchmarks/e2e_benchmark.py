@@ -0,0 +1,243 @@
+"""End to end throughput benchmark of VideoProcessor with stub models on synthetic videos
+
+Every scenario (persons x zones x analytics) runs the offline pipeline of app.py on a
+synthetic video whose "workers" are moving rectangles. YOLO and osnet are replaced by
+deterministic stubs of configurable latency and detection count (see stub_backends),
+so results are reproducible on any machine and only change when the pipeline does.
+
+Run from repo root, eg:
+    python -m benchmarks.e2e_benchmark
+    python -m benchmarks.e2e_benchmark --persons 1,8 --zones 0,10 --analytics none,all --frames 60
+    python -m benchmarks.e2e_benchmark --compare benchmark_results/e2e_<old commit>.json
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from app import VideoProcessor
+from benchmarks.stub_backends import install_stub_backends, syntheticScene, write_synthetic_video
+from utils.metrics.metrics import get_rss_bytes
+
+# analytics of a scenario --> camera config analytics fields turned on
+ANALYTICS_FIELDS = {
+    "ppe": ["ppeDetection"],
+    "fall": ["fallDetection"],
+    "fireSmoke": ["fire_smoke_detection"],
+    "garbage": ["garbageDetection"],
+    "tripHazard": ["tripHazardDetection"],
+    "spill": ["spillDetection"],
+}
+ANALYTICS_FIELDS["all"] = [field for fields in ANALYTICS_FIELDS.values() for field in fields]
+ANALYTICS_FIELDS["none"] = []
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def make_zones(num_zones, width, height, seed=0):
+    """Hexagon zones spread on a grid over the frame"""
+    rng = np.random.default_rng(seed)
+    columns = max(1, int(np.ceil(np.sqrt(num_zones))))
+    rows = max(1, int(np.ceil(num_zones / columns)))
+    cell_w, cell_h = width / columns, height / rows
+    zones = dict()
+    for index in range(num_zones):
+        center_x = (index % columns + 0.5) * cell_w
+        center_y = (index // columns + 0.5) * cell_h
+        angles = np.linspace(0, 2 * np.pi, 6, endpoint=False) + rng.uniform(0, 0.5)
+        radius = 0.45 * min(cell_w, cell_h)
+        points = [[int(center_x + radius * np.cos(a)), int(center_y + radius * np.sin(a))] for a in angles]
+        zones["zone{}".format(index + 1)] = {"id": index, "name": "zone{}".format(index + 1), "zonePoints": points}
+    return zones
+
+
+def make_camera_config(cam_id, num_zones, analytics, width, height):
+    """Camera config of one scenario"""
+    analytics_config = {
+        "personDetectionCounting": True,
+        "personInZoneCounting": num_zones > 0,
+        "ppeDetection": False,
+        "fallDetection": False,
+        "fire_smoke_detection": False,
+        "garbageDetection": False,
+        "tripHazardDetection": False,
+        "spillDetection": False,
+    }
+    for field in ANALYTICS_FIELDS[analytics]:
+        analytics_config[field] = True
+    return {
+        "camID": cam_id,
+        "description": "synthetic benchmark camera",
+        "analytics": analytics_config,
+        "visualizeAnalytics": True,
+        "ppeDetection": {
+            "hard-hat": True, "gloves": True, "mask": False, "glasses": False, "boots": True,
+            "vest": True, "ppe-suit": False, "ear-protector": False, "safety-harness": False,
+        },
+        "zones": make_zones(num_zones, width, height),
+        "tripzones": {"zone1": {"id": 0, "name": "floor", "zonePoints": [[0, height // 2], [width, height // 2], [width, height], [0, height]]}},
+    }
+
+
+def make_main_config(main_config):
+    """Main config for benchmarking, everything that is not per frame pipeline work is off"""
+    config = copy.deepcopy(main_config)
+    for field in config.values():
+        if isinstance(field, dict) and "device" in field:
+            field["device"] = "cpu"
+    config["videoDownloader"]["localVideoPath"] = "videos"
+    for field in ["resultsIndex", "resultCache", "detectionRecorder", "metricsServer", "tracing"]:
+        config.setdefault(field, {})["enabled"] = False
+    config["profiler"] = {"enabled": True, "reportIntervalSec": 1e9, "dumpPath": None}
+    return config
+
+
+def run_scenario(config_path, main_config, stub_config, persons, zones, analytics, frames, width, height, render):
+    """Run one scenario in the current (workspace) dir
+
+    Returns:
+        dict: scenario results
+    """
+    video_file = "persons{}.mp4".format(persons)
+    video_path = os.path.join("videos", video_file)
+    scene = syntheticScene(persons, width, height)
+    if not os.path.exists(video_path):
+        write_synthetic_video(video_path, scene, frames)
+    with open(os.path.join("config", "persons{}.json".format(persons)), "w") as f:
+        json.dump(make_camera_config(video_file, zones, analytics, width, height), f)
+
+    install_stub_backends(main_config, stub_config, scene)
+    processor = VideoProcessor(config_path, offline=True, render=render)
+    rss_before = get_rss_bytes()
+    start_time = time.perf_counter()
+    processor.init_pipelines(video_file)
+    load_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    processed_frames = processor.process_video_offline(video_path, video_file)
+    seconds = time.perf_counter() - start_time
+    summary = processor.profiler.summary()
+    return {
+        "name": "persons{}_zones{}_{}".format(persons, zones, analytics),
+        "persons": persons,
+        "zones": zones,
+        "analytics": analytics,
+        "frames": processed_frames,
+        "seconds": seconds,
+        "fps": processed_frames / seconds if seconds else 0.0,
+        "loadSeconds": load_seconds,
+        "rssBytes": get_rss_bytes(),
+        "rssDeltaBytes": get_rss_bytes() - rss_before,
+        "peakRssBytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "profilerOverheadPercent": summary["overheadPercent"],
+        "stages": summary["cameras"].get(video_file, {}),
+    }
+
+
+def compare_reports(old_report, new_report):
+    """Print fps change of every scenario present in both reports"""
+    old_scenarios = {scenario["name"]: scenario for scenario in old_report["scenarios"]}
+    print("{:<40} {:>10} {:>10} {:>8}".format("scenario", "old fps", "new fps", "change"))
+    for scenario in new_report["scenarios"]:
+        old = old_scenarios.get(scenario["name"])
+        if not old:
+            continue
+        change = 100.0 * (scenario["fps"] / old["fps"] - 1) if old["fps"] else 0.0
+        print("{:<40} {:>10.2f} {:>10.2f} {:>7.1f}%".format(scenario["name"], old["fps"], scenario["fps"], change))
+
+
+def parse_list(value, cast=str):
+    return [cast(item) for item in value.split(",")] if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End to end pipeline benchmark with stub models")
+    parser.add_argument("--config", default="config/config.json", help="main config file")
+    parser.add_argument("--bench-config", default="benchmarks/e2e_config.json", help="scenarios and stub backends")
+    parser.add_argument("--persons", default=None, help="comma separated, overrides bench config")
+    parser.add_argument("--zones", default=None, help="comma separated, overrides bench config")
+    parser.add_argument("--analytics", default=None, help="comma separated, " + ",".join(ANALYTICS_FIELDS))
+    parser.add_argument("--frames", type=int, default=None, help="frames per synthetic video")
+    parser.add_argument("--render", action="store_true", help="also draw and write output videos")
+    parser.add_argument("--output", default=None, help="report path, defaults to benchmark_results/e2e_<commit>.json")
+    parser.add_argument("--compare", default=None, help="older report to compare fps with")
+    parser.add_argument("--keep-workspace", action="store_true", help="keep generated videos and configs")
+    args = parser.parse_args()
+
+    with open(args.bench_config) as f:
+        bench_config = json.load(f)
+    with open(args.config) as f:
+        main_config = make_main_config(json.load(f))
+    persons_list = parse_list(args.persons, int) or bench_config["persons"]
+    zones_list = parse_list(args.zones, int) or bench_config["zones"]
+    analytics_list = parse_list(args.analytics) or bench_config["analytics"]
+    frames = args.frames or bench_config["frames"]
+    width, height = bench_config["width"], bench_config["height"]
+    commit = get_commit()
+    output = os.path.abspath(args.output or os.path.join("benchmark_results", "e2e_{}.json".format(commit)))
+    compare = os.path.abspath(args.compare) if args.compare else None
+
+    # VideoProcessor reads camera configs from ./config and writes reid dbs in cwd
+    workspace = tempfile.mkdtemp(prefix="e2e_benchmark_")
+    repo_dir = os.getcwd()
+    os.chdir(workspace)
+    os.makedirs("config", exist_ok=True)
+    config_path = os.path.join("config", "config.json")
+    with open(config_path, "w") as f:
+        json.dump(main_config, f, indent=4)
+
+    scenarios = []
+    try:
+        for persons in persons_list:
+            for zones in zones_list:
+                for analytics in analytics_list:
+                    scenario = run_scenario(
+                        config_path, main_config, bench_config["stubs"], persons, zones, analytics,
+                        frames, width, height, args.render,
+                    )
+                    print("{:<40} {:>8.2f} fps".format(scenario["name"], scenario["fps"]))
+                    scenarios.append(scenario)
+    finally:
+        os.chdir(repo_dir)
+        if args.keep_workspace:
+            print("workspace kept at", workspace)
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    report = {
+        "commit": commit,
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "frames": frames,
+        "stubs": bench_config["stubs"],
+        "scenarios": scenarios,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("report written to", output)
+
+    if compare:
+        with open(compare) as f:
+            compare_reports(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
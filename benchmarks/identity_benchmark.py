@@ -0,0 +1,132 @@
+"""Throughput and latency of the cross camera identity service
+
+Simulated camera streams send match requests with the embeddings of the tracks updated on
+a frame, the way reID does, to an identityService in this process or, with --ipc, to an
+identityServer reached by identityClients of separate processes. Persons walk between
+cameras, so most embeddings match an existing global identity. Reports match queries
+(embeddings) per second, request latency percentiles and the share of persons that got
+one global id on every camera.
+
+Run from repo root, eg:
+    python -m benchmarks.identity_benchmark
+    python -m benchmarks.identity_benchmark --ipc --cameras 16 --persons 2000 --seconds 20
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.e2e_benchmark import get_commit
+from utils.ann_index.ann_index import normalize
+from utils.identity_service.identity_service import identityClient, identityServer, identityService
+
+DIM = 512
+
+
+def run_camera(task):
+    """Send the requests of one camera for a fixed time
+
+    Returns:
+        dict: latencies of requests and run time in seconds, embeddings sent and persons with their global ids
+    """
+    cam_id, service_config, args, seed = task
+    rng = np.random.default_rng(seed)
+    identities = normalize(np.random.default_rng(args["seed"]).standard_normal((args["persons"], DIM)))
+    service = identityClient(service_config) if args["ipc"] else args["service"]
+    latencies, embeddings_sent, global_ids = [], 0, dict()
+    started = time.monotonic()
+    deadline = started + args["seconds"]
+    while time.monotonic() < deadline:
+        # tracks of a frame with a gallery update
+        persons = rng.choice(args["persons"], size=args["tracksPerRequest"], replace=False)
+        embeddings = normalize(identities[persons] + args["noise"] * rng.standard_normal((len(persons), DIM)) / np.sqrt(DIM))
+        # track ids are per camera, a person keeps the track id of its first sighting
+        track_ids = [int(person) + 1 for person in persons]
+        start = time.perf_counter()
+        result = service.match(cam_id, track_ids, embeddings)
+        latencies.append(time.perf_counter() - start)
+        embeddings_sent += len(track_ids)
+        global_ids.update(zip(persons.tolist(), result))
+    seconds = time.monotonic() - started
+    if args["ipc"]:
+        service.close()
+    return {"latencies": latencies, "seconds": seconds, "embeddings": embeddings_sent, "globalIds": global_ids}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and latency of the cross camera identity service")
+    parser.add_argument("--cameras", type=int, default=8, help="simulated camera streams")
+    parser.add_argument("--persons", type=int, default=500, help="persons walking between cameras")
+    parser.add_argument("--tracks-per-request", type=int, default=4, help="embeddings per match request")
+    parser.add_argument("--seconds", type=float, default=10.0, help="run time")
+    parser.add_argument("--noise", type=float, default=0.5, help="embedding noise around the person")
+    parser.add_argument("--ipc", action="store_true", help="serve over a socket to client processes")
+    parser.add_argument("--address", default="127.0.0.1:6011", help="server address with --ipc")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="results path, defaults to benchmark_results/identity_<commit>.json")
+    args = parser.parse_args()
+
+    service_config = {"address": args.address, "authkey": "benchmark", "activeSeconds": 0}
+    service = identityService(service_config)
+    task_args = {
+        "persons": args.persons,
+        "tracksPerRequest": args.tracks_per_request,
+        "seconds": args.seconds,
+        "noise": args.noise,
+        "seed": args.seed,
+        "ipc": args.ipc,
+    }
+    tasks = [("camera{}".format(camera), service_config, task_args, args.seed + camera + 1) for camera in range(args.cameras)]
+    if args.ipc:
+        server = identityServer(service, service_config)
+        if not server.start():
+            raise SystemExit(1)
+        with multiprocessing.get_context("spawn").Pool(args.cameras) as pool:
+            results = pool.map(run_camera, tasks)
+        server.stop()
+    else:
+        # in process streams share the service, one thread per camera
+        task_args["service"] = service
+        with ThreadPoolExecutor(args.cameras) as executor:
+            results = list(executor.map(run_camera, tasks))
+    # process start up is not part of the run
+    seconds = max(result["seconds"] for result in results)
+
+    latencies = np.concatenate([result["latencies"] for result in results]) * 1e3
+    embeddings = sum(result["embeddings"] for result in results)
+    # persons whose global id is the same on every camera that saw them
+    person_ids = dict()
+    for result in results:
+        for person, global_id in result["globalIds"].items():
+            person_ids.setdefault(person, set()).add(global_id)
+    consistent = float(np.mean([len(ids) == 1 for ids in person_ids.values()])) if person_ids else 0.0
+    report = {
+        "commit": get_commit(),
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "args": vars(args),
+        "requestsPerSecond": len(latencies) / seconds,
+        "queriesPerSecond": embeddings / seconds,
+        "latencyP50Ms": float(np.percentile(latencies, 50)),
+        "latencyP99Ms": float(np.percentile(latencies, 99)),
+        "consistentIdentities": consistent,
+        "service": service.stats(),
+    }
+    print("{} cameras, {}: {:.0f} match queries/s ({:.0f} requests/s), latency p50 {:.2f} ms, p99 {:.2f} ms".format(
+        args.cameras, "ipc" if args.ipc else "in process", report["queriesPerSecond"],
+        report["requestsPerSecond"], report["latencyP50Ms"], report["latencyP99Ms"]))
+    print("{:.1%} of persons got one global id on every camera, {} identities".format(
+        consistent, report["service"]["identities"]))
+
+    output = args.output or os.path.join("benchmark_results", "identity_{}.json".format(report["commit"]))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("results written to", output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""Micro benchmarks of the per frame post-processing hot paths, with regression check
+
+Each case drives one function with generated inputs at several sizes (persons, zones,
+gallery tracks) and times single calls with perf_counter, inputs are rebuilt outside
+the timed region. Median time per call is compared with benchmarks/micro_baselines.json,
+the run fails (exit code 1) if a case is slower than its baseline by more than the
+threshold. Timings are normalized by a pure python calibration loop so baselines
+recorded on another machine remain comparable. Cases and calibration are timed in
+--rounds rounds spread over the whole run, and each keeps its fastest round: a busy or
+throttled machine slows down a few seconds at a time, not every round of a case. A case
+flagged as regressed is timed again --rechecks times before failing.
+
+Run from repo root, eg:
+    python -m benchmarks.micro_benchmark
+    python -m benchmarks.micro_benchmark --filter zoneCounting --threshold 0.5
+    python -m benchmarks.micro_benchmark --update-baselines
+"""
+import argparse
+import copy
+import ctypes
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from benchmarks.e2e_benchmark import make_camera_config, make_main_config
+from benchmarks.stub_backends import install_stub_backends, syntheticScene
+from models.person_counting_in_zone.person_counting_in_zone import personCountInZone
+from models.ppe_detection.ppe_detection import ppeDetectionModel
+from models.reid.reid import reID
+from utils.ann_index.ann_index import ivfIndex, normalize
+from utils.draw.draw import drawOnFrames
+from utils.results.results import jsonResultsManager
+
+BASELINES_PATH = os.path.join("benchmarks", "micro_baselines.json")
+WIDTH, HEIGHT = 1280, 720
+PERSONS = [1, 8, 64]
+ZONES = [1, 10, 50]
+GALLERY_TRACKS = [10, 100, 1000]
+# mallopt parameters of glibc
+M_TRIM_THRESHOLD = -1
+M_MMAP_THRESHOLD = -3
+
+
+def pin_allocator():
+    """Keep freed memory in the glibc heap. Its default mmap threshold moves with the
+    allocation history, so in some processes every large temporary (eg: reid cosine
+    similarity over 1000 tracks) is a fresh mmap paying thousands of page faults per call,
+    and the case takes twice as long from one run to the next
+    """
+    try:
+        libc = ctypes.CDLL("libc.so.6")
+    except OSError:
+        return
+    libc.mallopt(M_MMAP_THRESHOLD, 256 << 20)
+    libc.mallopt(M_TRIM_THRESHOLD, 512 << 20)
+
+
+def calibrate(loops=200000, rounds=4):
+    """Seconds taken by a fixed pure python loop, the unit timings are normalized with"""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        total = 0
+        for i in range(loops):
+            total += i % 7
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def time_round(setup, call, min_calls=10, min_seconds=0.05):
+    """Time single calls of call(*setup()) for at least min_seconds, setup is not timed
+
+    Returns:
+        list of float: seconds of every call
+    """
+    durations = []
+    deadline = time.perf_counter() + min_seconds
+    while len(durations) < min_calls or time.perf_counter() < deadline:
+        args = setup()
+        start = time.perf_counter()
+        call(*args)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def time_cases(cases, rounds=5):
+    """Time cases in rounds, each round times every case once and runs the calibration.
+    The median of a round is robust to outlier calls, the fastest round to a busy machine.
+
+    Args:
+        cases (dict): name --> (setup, call)
+        rounds (int): rounds of every case
+
+    Returns:
+        dict: calibrationSeconds, and cases: name --> calls, medianUs (fastest round
+            median) and minUs per call
+    """
+    # warm up caches and lazy imports
+    for setup, call in cases.values():
+        call(*setup())
+    results = {
+        "calibrationSeconds": calibrate(),
+        "cases": {name: {"calls": 0, "medianUs": float("inf"), "minUs": float("inf")} for name in cases},
+    }
+    for _ in range(rounds):
+        for name, (setup, call) in cases.items():
+            durations = time_round(setup, call)
+            result = results["cases"][name]
+            result["calls"] += len(durations)
+            result["medianUs"] = min(result["medianUs"], statistics.median(durations) * 1e6)
+            result["minUs"] = min(result["minUs"], min(durations) * 1e6)
+        results["calibrationSeconds"] = min(results["calibrationSeconds"], calibrate())
+    return results
+
+
+def make_person_bboxes(persons, seed=0):
+    """[xmin, ymin, xmax, ymax, track id, conf, class] of persons inside the frame"""
+    boxes = syntheticScene(persons, WIDTH, HEIGHT, seed).person_boxes(0)
+    return [[int(b[0]), int(b[1]), int(b[2]), int(b[3]), int(b[4]), 0.9, 0] for b in boxes]
+
+
+def make_crop_detections(persons, detections, num_classes, seed=0):
+    """Per person list of detections in crop co-ords, as given by get_bbox_in_crop_img"""
+    rng = np.random.default_rng(seed)
+    crop_list = []
+    for _ in range(persons):
+        one_person = []
+        for _ in range(detections):
+            xmin, ymin = rng.uniform(0, 40, size=2)
+            one_person.append([xmin, ymin, xmin + 20, ymin + 30, 0.8, int(rng.integers(1, num_classes))])
+        crop_list.append(one_person)
+    return crop_list
+
+
+def make_results_manager(camera_config, person_bboxes, frame_id=1):
+    results_manager = jsonResultsManager(camera_config)
+    results_manager.init_template(camera_config)
+    results_manager.add_person_results(copy.deepcopy(person_bboxes), frame_id)
+    return results_manager
+
+
+def build_cases(main_config):
+    """
+    Returns:
+        list of (name, setup, call): benchmark cases
+    """
+    cases = []
+    ppe_classes = len(main_config["ppeDetectionModel"]["orignalClassList"])
+    bp_classes = len(main_config["bodyPartDetectionModel"]["orignalClassList"])
+    ppe_model = ppeDetectionModel(main_config, make_camera_config("micro.mp4", 0, "ppe", WIDTH, HEIGHT))
+
+    for persons in PERSONS:
+        person_bboxes = make_person_bboxes(persons)
+
+        for zones in ZONES:
+            camera_config = make_camera_config("micro.mp4", zones, "none", WIDTH, HEIGHT)
+            zone_counter = personCountInZone(camera_config)
+            cases.append((
+                "zoneCounting_p{}_z{}".format(persons, zones),
+                lambda c=camera_config, b=person_bboxes: (make_results_manager(c, b).fullImageResults,),
+                zone_counter.calculate_person_within_zone,
+            ))
+
+        camera_config = make_camera_config("micro.mp4", 10, "all", WIDTH, HEIGHT)
+        cases.append((
+            "resultsAddPerson_p{}".format(persons),
+            lambda c=camera_config, b=person_bboxes: (make_results_manager(c, []), b),
+            lambda manager, b: manager.add_person_results(b, 1),
+        ))
+        ppe_results = {b[4]: {"hard-hat": 1, "gloves": 0, "boots": -1, "vest": 1} for b in person_bboxes}
+        cases.append((
+            "resultsAddPpe_p{}".format(persons),
+            lambda c=camera_config, b=person_bboxes, r=ppe_results: (make_results_manager(c, b), r),
+            lambda manager, r: manager.add_ppe_results(r),
+        ))
+        fall_results = [[i % 7 == 0, b[4]] for i, b in enumerate(person_bboxes)]
+        cases.append((
+            "resultsAddFall_p{}".format(persons),
+            lambda c=camera_config, b=person_bboxes, r=fall_results: (make_results_manager(c, b), r),
+            lambda manager, r: manager.add_fall_results(r),
+        ))
+        hazards = [[b[0], b[1], b[2], b[3], 0.8, 0] for b in person_bboxes]
+        cases.append((
+            "resultsAddTripHazard_d{}".format(persons),
+            lambda c=camera_config, r=hazards: (make_results_manager(c, []), r),
+            lambda manager, r: manager.add_triphazard_results(r),
+        ))
+
+        ppe_crops = make_crop_detections(persons, 3, ppe_classes)
+        bp_crops = make_crop_detections(persons, 4, bp_classes, seed=1)
+        cases.append((
+            "ppeAddFinalList_p{}".format(persons),
+            lambda c=ppe_crops, b=person_bboxes: (copy.deepcopy(c), [], b),
+            ppe_model.add_final_list,
+        ))
+
+        def setup_validate(ppe_crops=ppe_crops, bp_crops=bp_crops, person_bboxes=person_bboxes):
+            ppe_model.finalPpeBboxList.clear()
+            ppe_model.finalBpBboxList.clear()
+            ppe_model.add_final_list(copy.deepcopy(ppe_crops), ppe_model.finalPpeBboxList, person_bboxes)
+            ppe_model.add_final_list(copy.deepcopy(bp_crops), ppe_model.finalBpBboxList, person_bboxes)
+            return ()
+
+        cases.append(("ppeValidate_p{}".format(persons), setup_validate, ppe_model.validate_ppe))
+
+        frame = np.full((HEIGHT, WIDTH, 3), 90, dtype=np.uint8)
+        for zones in ZONES:
+            camera_config = make_camera_config("micro.mp4", zones, "all", WIDTH, HEIGHT)
+            zone_counter = personCountInZone(camera_config)
+            manager = make_results_manager(camera_config, person_bboxes)
+            manager.add_ppe_results(ppe_results)
+            manager.add_fall_results(fall_results)
+            zone_counter.calculate_person_within_zone(manager.fullImageResults)
+            draw = drawOnFrames(main_config, camera_config)
+            cases.append((
+                "draw_p{}_z{}".format(persons, zones),
+                lambda r=manager.fullImageResults: ([frame.copy()], [r]),
+                draw,
+            ))
+
+    for tracks in GALLERY_TRACKS:
+        # every reid needs its own embedding store
+        reid = reID(make_camera_config("micro_g{}.mp4".format(tracks), 0, "none", WIDTH, HEIGHT), main_config)
+        reid.tracklets = {track_id: [] for track_id in range(1, tracks + 1)}
+        features = main_config["reIdModel"]["noOfFrameFeatures"]
+        generator = torch.Generator().manual_seed(tracks)
+        gallery = torch.randn(tracks, features, 1, 512, generator=generator)
+        query = torch.randn(1, 512, generator=generator)
+        cases.append((
+            "reidCosineSimilarity_g{}".format(tracks),
+            lambda q=query, g=gallery: (q, g),
+            reid.calculate_cosine_similarity,
+        ))
+        reid.galleryIndex = ivfIndex(512)
+        for track_id, track_gallery in enumerate(gallery.squeeze(2).numpy(), start=1):
+            reid.galleryIndex.add(track_id, normalize(track_gallery).mean(axis=0))
+        cases.append((
+            "reidGalleryIndex_g{}".format(tracks),
+            lambda q=query: (q,),
+            reid.search_gallery_index,
+        ))
+    return cases
+
+
+def compare(results, baselines, threshold):
+    """A case regresses if it is slower than threshold and by more than minDeltaUs,
+    calls of a few microseconds are too noisy for a relative threshold alone
+
+    Returns:
+        list of str: names of cases slower than baseline by more than threshold
+    """
+    regressions = []
+    print("{:<32} {:>12} {:>12} {:>8}".format("case", "baseline us", "median us", "change"))
+    for name, result in results["cases"].items():
+        baseline = baselines["cases"].get(name)
+        if baseline is None:
+            print("{:<32} {:>12} {:>12.1f} {:>8}".format(name, "-", result["medianUs"], "new"))
+            continue
+        # scale the baseline to the speed of this machine
+        expected = baseline["medianUs"] * results["calibrationSeconds"] / baselines["calibrationSeconds"]
+        change = result["medianUs"] / expected - 1
+        slower = change > threshold and result["medianUs"] - expected > baselines.get("minDeltaUs", 0.0)
+        flag = " REGRESSION" if slower else ""
+        print("{:<32} {:>12.1f} {:>12.1f} {:>7.1f}%{}".format(name, expected, result["medianUs"], 100 * change, flag))
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def recheck(results, cases, names, rounds=5):
+    """Time cases again with their own calibration, and keep the fastest timings of both
+    runs once scaled to the calibration of results
+    """
+    rechecked = time_cases({name: cases[name] for name in names}, rounds)
+    scale = results["calibrationSeconds"] / rechecked["calibrationSeconds"]
+    for name, result in rechecked["cases"].items():
+        kept = results["cases"][name]
+        for key in ("medianUs", "minUs"):
+            kept[key] = min(kept[key], result[key] * scale)
+        kept["calls"] += result["calls"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro benchmarks of post-processing hot paths")
+    parser.add_argument("--config", default="config/config.json", help="main config file")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="baseline timings json")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="allowed slowdown as a fraction, defaults to the one in baselines")
+    parser.add_argument("--filter", default=None, help="only run cases whose name contains this")
+    parser.add_argument("--update-baselines", action="store_true", help="write results as new baselines")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds of every case, spread over the run")
+    parser.add_argument("--rechecks", type=int, default=2, help="times a regressed case is timed again before failing")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        main_config = make_main_config(json.load(f))
+    baselines = {"threshold": 0.25, "minDeltaUs": 5.0, "calibrationSeconds": None, "cases": dict()}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+    threshold = baselines["threshold"] if args.threshold is None else args.threshold
+    baselines_path = os.path.abspath(args.baselines)
+
+    pin_allocator()
+    # reid creates its database in cwd
+    workspace = tempfile.mkdtemp(prefix="micro_benchmark_")
+    repo_dir = os.getcwd()
+    os.chdir(workspace)
+    torch.set_num_threads(1)
+    try:
+        install_stub_backends(main_config, dict(), syntheticScene(0))
+        cases = {
+            name: (setup, call) for name, setup, call in build_cases(main_config)
+            if not args.filter or args.filter in name
+        }
+        results = time_cases(cases, args.rounds)
+        if not args.update_baselines:
+            regressions = compare(results, baselines, threshold)
+            for _ in range(args.rechecks):
+                if not regressions:
+                    break
+                print("timing {} regressed case(s) again".format(len(regressions)))
+                recheck(results, cases, regressions, args.rounds)
+                regressions = compare(dict(results, cases={name: results["cases"][name] for name in regressions}),
+                                      baselines, threshold)
+    finally:
+        os.chdir(repo_dir)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    if args.update_baselines:
+        baselines["calibrationSeconds"] = results["calibrationSeconds"]
+        baselines["threshold"] = threshold
+        baselines["cases"].update(results["cases"])
+        with open(baselines_path, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print("baselines written to", baselines_path)
+        return
+
+    if regressions:
+        print("{} case(s) regressed by more than {:.0f}%: {}".format(len(regressions), 100 * threshold, ", ".join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
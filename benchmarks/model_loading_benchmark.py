@@ -0,0 +1,178 @@
+"""Model loading, warm-up and first frame latency of VideoProcessor.init_pipelines
+
+Real ultralytics and torchreid models are loaded from random weights of the same
+architectures (yolov8n for detectors, yolov8n-cls for the fall classifier, the configured
+reIdModel.modelType), with every analytic enabled on cpu. Every scenario runs in a fresh
+interpreter, --repeats times, and reports the median of:
+    - startup: init_pipelines, loading (and warming up) every model
+    - firstFrame: one inference of every model right after startup, what the first frame
+      of the video pays
+    - steady: the same inferences once more
+    - readyToFirstFrame: startup + firstFrame
+
+Scenarios, with modelLoading of main config set to:
+    - sequential: parallelWorkers 1, no warm-up, how models used to be loaded
+    - parallel: parallelWorkers --workers, no warm-up
+    - warmup: parallelWorkers --workers, warmUpIterations --warmup-iterations
+
+Run from repo root, eg:
+    python -m benchmarks.model_loading_benchmark
+    python -m benchmarks.model_loading_benchmark --scenarios sequential,warmup --repeats 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import torch
+
+from benchmarks.e2e_benchmark import get_commit, make_camera_config, make_main_config
+from benchmarks.stub_backends import YOLO_MODULES
+
+VIDEO_FILE = "bench.mp4"
+# architecture of the random weights of every yolo model
+YOLO_ARCHITECTURES = {field: "yolov8n.yaml" for field in YOLO_MODULES}
+YOLO_ARCHITECTURES["fallDetectionModel"] = "yolov8n-cls.yaml"
+SCENARIO = """
+import json, sys, time
+sys.path[:0] = [{repo!r}, {reid!r}]
+from app import VideoProcessor
+processor = VideoProcessor("config/config.json", offline=True)
+start = time.perf_counter()
+processor.init_pipelines({video_file!r})
+startup = time.perf_counter() - start
+first, steady = dict(), dict()
+for plugin in processor.analytics:
+    pipeline = getattr(processor, plugin.attribute)
+    if not plugin.hasModel or pipeline is None:
+        continue
+    for seconds in (first, steady):
+        start = time.perf_counter()
+        pipeline.warm_up()
+        seconds[plugin.name] = time.perf_counter() - start
+print(json.dumps({{"startup": startup, "firstFrame": first, "steady": steady,
+                  "load": processor.metrics.modelLoadSeconds, "warmup": processor.metrics.modelWarmupSeconds}}))
+"""
+
+
+def write_random_weights(main_config, models_dir):
+    """Random weights of every model of main config, loading and inference cost only
+    depend on the architecture
+    """
+    from ultralytics import YOLO
+
+    sys.path.append("models/reid")
+    from torchreid.models import build_model
+
+    os.makedirs(models_dir, exist_ok=True)
+    for field, architecture in YOLO_ARCHITECTURES.items():
+        YOLO(architecture).save(os.path.join(models_dir, main_config[field]["modelName"]))
+    reid_config = main_config["reIdModel"]
+    model = build_model(reid_config["modelType"], num_classes=1, pretrained=False)
+    torch.save(model.state_dict(), os.path.join(models_dir, reid_config["modelName"]))
+
+
+def run_scenario(workspace, model_loading):
+    """Run one scenario in a fresh interpreter inside workspace
+
+    Returns:
+        dict: startup seconds, and per model seconds of firstFrame, steady, load and warmup
+    """
+    with open(os.path.join(workspace, "config", "config.json")) as f:
+        main_config = json.load(f)
+    main_config["modelLoading"] = model_loading
+    with open(os.path.join(workspace, "config", "config.json"), "w") as f:
+        json.dump(main_config, f, indent=4)
+    repo = os.getcwd()
+    code = SCENARIO.format(repo=repo, reid=os.path.join(repo, "models", "reid"), video_file=VIDEO_FILE)
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=workspace, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median_run(runs):
+    """Median of every number of the runs of a scenario"""
+    result = {"startup": statistics.median(run["startup"] for run in runs)}
+    for key in ("firstFrame", "steady", "load", "warmup"):
+        result[key] = {name: statistics.median(run[key].get(name, 0.0) for run in runs) for name in runs[0][key]}
+    result["readyToFirstFrame"] = result["startup"] + sum(result["firstFrame"].values())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model loading, warm-up and first frame latency")
+    parser.add_argument("--config", default="config/config.json", help="main config file")
+    parser.add_argument("--scenarios", default="sequential,parallel,warmup", help="comma separated scenarios")
+    parser.add_argument("--workers", type=int, default=4, help="parallelWorkers of parallel scenarios")
+    parser.add_argument("--warmup-iterations", type=int, default=1, help="warmUpIterations of the warmup scenario")
+    parser.add_argument("--repeats", type=int, default=3, help="fresh interpreters per scenario")
+    parser.add_argument("--keep-workspace", action="store_true", help="keep generated weights and configs")
+    parser.add_argument("--output", default=None, help="results path, defaults to benchmark_results/model_loading_<commit>.json")
+    args = parser.parse_args()
+
+    scenarios = {
+        "sequential": {"parallelWorkers": 1, "warmUp": False},
+        "parallel": {"parallelWorkers": args.workers, "warmUp": False},
+        "warmup": {"parallelWorkers": args.workers, "warmUp": True, "warmUpIterations": args.warmup_iterations},
+    }
+    with open(args.config) as f:
+        main_config = make_main_config(json.load(f))
+    workspace = tempfile.mkdtemp(prefix="model_loading_benchmark_")
+    main_config["modelsDir"] = os.path.join(workspace, "weights")
+    os.makedirs(os.path.join(workspace, "config"))
+    with open(os.path.join(workspace, "config", "config.json"), "w") as f:
+        json.dump(main_config, f, indent=4)
+    with open(os.path.join(workspace, "config", os.path.splitext(VIDEO_FILE)[0] + ".json"), "w") as f:
+        json.dump(make_camera_config(VIDEO_FILE, 1, "all", 1280, 720), f)
+
+    results = dict()
+    try:
+        write_random_weights(main_config, main_config["modelsDir"])
+        for name in args.scenarios.split(","):
+            results[name] = median_run([run_scenario(workspace, scenarios[name]) for _ in range(args.repeats)])
+            results[name]["modelLoading"] = scenarios[name]
+    finally:
+        if args.keep_workspace:
+            print("workspace kept at", workspace)
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    print("every analytic on cpu, {} torch threads, median of {} interpreters".format(torch.get_num_threads(), args.repeats))
+    print("{:<11} {:>8} {:>11} {:>8} {:>18}".format("scenario", "startup", "firstFrame", "steady", "readyToFirstFrame"))
+    for name, result in results.items():
+        print("{:<11} {:>7.2f}s {:>10.2f}s {:>7.2f}s {:>17.2f}s".format(
+            name, result["startup"], sum(result["firstFrame"].values()), sum(result["steady"].values()),
+            result["readyToFirstFrame"]))
+    for name, result in results.items():
+        print("{} per model, load / warm-up / first frame / steady seconds:".format(name))
+        for model in result["load"]:
+            print("    {:<20} {:>6.2f} {:>6.2f} {:>6.2f} {:>6.2f}".format(
+                model, result["load"][model], result["warmup"].get(model, 0.0),
+                result["firstFrame"].get(model, 0.0), result["steady"].get(model, 0.0)))
+
+    commit = get_commit()
+    output = args.output or os.path.join("benchmark_results", "model_loading_{}.json".format(commit))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "torchThreads": torch.get_num_threads(),
+                "args": vars(args),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print("results written to", output)
+
+
+if __name__ == "__main__":
+    main()
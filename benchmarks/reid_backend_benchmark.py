@@ -0,0 +1,171 @@
+"""Numerical equivalence and latency of the reid FeatureExtractor backends
+
+Builds the configured reIdModel.modelType once per backend (eager torch, torchscript,
+onnx) and runs the same person crop batches through each. Features of every backend
+are compared with the eager model: the run fails (exit code 1) if the cosine
+similarity of any feature drops below --min-cosine. Latency per batch and per crop is
+reported with the speedup over eager torch.
+
+Without the configured weights, random weights are written to a temporary file so
+export and runtime are still measured, features are then compared but meaningless.
+
+Run from repo root, eg:
+    python -m benchmarks.reid_backend_benchmark
+    python -m benchmarks.reid_backend_benchmark --backends torch,torchscript --batch-sizes 1,16 --device cpu
+    python -m benchmarks.reid_backend_benchmark --optimize
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import torch
+
+sys.path.append("models/reid")
+from torchreid.models import build_model
+from torchreid.utils import FeatureExtractor
+
+from benchmarks.e2e_benchmark import get_commit
+
+IMAGE_SIZE = (256, 128)
+
+
+def get_weights(main_config, workspace):
+    """
+    Returns:
+        str: configured reid weights, or random weights written in workspace
+        bool: True if the weights are random
+    """
+    model_path = os.path.join(main_config["modelsDir"], main_config["reIdModel"]["modelName"])
+    if os.path.isfile(model_path):
+        return model_path, False
+    model = build_model(main_config["reIdModel"]["modelType"], num_classes=1, pretrained=False)
+    model_path = os.path.join(workspace, "random_" + os.path.basename(model_path))
+    torch.save(model.state_dict(), model_path)
+    return model_path, True
+
+
+def time_batches(extractor, batches, repeats):
+    """
+    Returns:
+        list: features of every batch
+        list: median seconds of every batch
+    """
+    features, seconds = [], []
+    for batch in batches:
+        # first call of a runtime includes its graph optimizations
+        features.append(extractor(batch).cpu())
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            extractor(batch)
+            times.append(time.perf_counter() - start)
+        seconds.append(statistics.median(times))
+    return features, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Equivalence and latency of reid FeatureExtractor backends")
+    parser.add_argument("--config", default="config/config.json", help="main config file")
+    parser.add_argument("--backends", default="torch,torchscript,onnx", help="comma separated backends, torch first")
+    parser.add_argument("--batch-sizes", default="1,8,32", help="comma separated crops per batch")
+    parser.add_argument("--device", default="cpu", help="device of the extractor")
+    parser.add_argument("--repeats", type=int, default=10, help="timed calls per batch")
+    parser.add_argument("--threads", type=int, default=0, help="torch threads, 0 for default")
+    parser.add_argument("--min-cosine", type=float, default=0.9999, help="min cosine similarity with eager features")
+    parser.add_argument("--optimize", action="store_true", help="optimize_for_inference every backend but the first")
+    parser.add_argument("--cache-dir", default=None, help="exported models dir, defaults to next to the weights")
+    parser.add_argument("--output", default=None, help="results path, defaults to benchmark_results/reid_backends_<commit>.json")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        main_config = json.load(f)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model_type = main_config["reIdModel"]["modelType"]
+    backends = args.backends.split(",")
+    generator = torch.Generator().manual_seed(0)
+    batches = [
+        torch.randn(int(size), 3, IMAGE_SIZE[0], IMAGE_SIZE[1], generator=generator)
+        for size in args.batch_sizes.split(",")
+    ]
+
+    workspace = tempfile.mkdtemp(prefix="reid_backend_benchmark_")
+    try:
+        model_path, random_weights = get_weights(main_config, workspace)
+        cache_dir = args.cache_dir or (workspace if random_weights else None)
+        results, reference = [], None
+        for position, backend in enumerate(backends):
+            # the first backend is the reference of the others
+            optimize = args.optimize and position > 0
+            start = time.perf_counter()
+            extractor = FeatureExtractor(
+                model_name=model_type,
+                model_path=model_path,
+                device=args.device,
+                verbose=False,
+                backend=backend,
+                cache_dir=cache_dir,
+                optimize=optimize,
+            )
+            load_seconds = time.perf_counter() - start
+            features, seconds = time_batches(extractor, batches, args.repeats)
+            if reference is None:
+                reference = (features, seconds)
+            for batch, batch_features, batch_seconds, reference_features, reference_seconds in zip(
+                batches, features, seconds, reference[0], reference[1]
+            ):
+                cosine = torch.cosine_similarity(batch_features, reference_features, dim=1)
+                results.append(
+                    {
+                        "backend": backend + ("+optimized" if optimize else ""),
+                        "runtime": type(extractor.model).__name__,
+                        "batchSize": len(batch),
+                        "loadSeconds": load_seconds,
+                        "batchMs": 1e3 * batch_seconds,
+                        "cropMs": 1e3 * batch_seconds / len(batch),
+                        "speedup": reference_seconds / batch_seconds,
+                        "minCosine": float(cosine.min()),
+                        "maxAbsDiff": float((batch_features - reference_features).abs().max()),
+                        "equivalent": bool(cosine.min() >= args.min_cosine),
+                    }
+                )
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    print("{} on {}{}".format(model_type, args.device, ", random weights" if random_weights else ""))
+    print("{:<22} {:<22} {:>5} {:>9} {:>8} {:>8} {:>10} {:>11}".format(
+        "backend", "runtime", "batch", "batchMs", "cropMs", "speedup", "minCosine", "maxAbsDiff"))
+    for result in results:
+        print("{backend:<22} {runtime:<22} {batchSize:>5} {batchMs:>9.2f} {cropMs:>8.2f} {speedup:>7.2f}x "
+              "{minCosine:>10.6f} {maxAbsDiff:>11.2e}".format(**result))
+
+    commit = get_commit()
+    output = args.output or os.path.join("benchmark_results", "reid_backends_{}.json".format(commit))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "modelType": model_type,
+                "randomWeights": random_weights,
+                "args": vars(args),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print("results written to", output)
+    mismatches = sorted({result["backend"] for result in results if not result["equivalent"]})
+    if mismatches:
+        print("features differ from eager torch for: " + ", ".join(mismatches))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Feature equivalence and latency of torchreid backbones optimized for inference
+
+Every architecture is built with random weights and random batchnorm statistics, then
+run on the same person crops as is (eager), after optimize_for_inference (batchnorm
+folded into convs, dropout removed, channels last) and after optimize_for_inference
+with freeze (frozen TorchScript graph, conv + relu fused). Features of both optimized
+models are compared with the eager ones: the run fails (exit code 1) if the relative
+difference of any architecture exceeds --max-relative-diff.
+
+Run from repo root, eg:
+    python -m benchmarks.reid_fusion_benchmark
+    python -m benchmarks.reid_fusion_benchmark --models osnet_x1_0,resnet50 --batch-size 16
+    python -m benchmarks.reid_fusion_benchmark --models all --repeats 3
+"""
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+
+import torch
+import torch.nn as nn
+
+sys.path.append("models/reid")
+from torchreid.models import __model_factory, build_model
+from torchreid.utils.model_optimization import optimize_for_inference
+
+from benchmarks.e2e_benchmark import get_commit
+
+IMAGE_SIZE = (256, 128)
+DEFAULT_MODELS = (
+    "osnet_x1_0,osnet_x0_25,osnet_ain_x1_0,osnet_ibn_x1_0,resnet50,resnet50_fc512,"
+    "se_resnet50,resnet50_ibn_a,densenet121,mobilenetv2_x1_0,shufflenet_v2_x1_0,mlfn,pcb_p6"
+)
+
+
+def randomize_batchnorm(model, generator):
+    """Non trivial running statistics and affine parameters, so folding them is checked"""
+    for module in model.modules():
+        if isinstance(module, nn.modules.batchnorm._BatchNorm) and module.track_running_stats:
+            shape = module.running_mean.shape
+            module.running_mean.copy_(0.1 * torch.randn(shape, generator=generator))
+            module.running_var.copy_(0.5 + torch.rand(shape, generator=generator))
+            if module.affine:
+                module.weight.data.copy_(0.5 + torch.rand(shape, generator=generator))
+                module.bias.data.copy_(0.1 * torch.randn(shape, generator=generator))
+
+
+def time_model(model, images, repeats):
+    """
+    Returns:
+        torch.Tensor: features
+        float: median seconds of a call
+    """
+    with torch.no_grad():
+        # first call of a frozen graph runs its optimizations
+        features = model(images)
+        model(images)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(images)
+            times.append(time.perf_counter() - start)
+    return features, statistics.median(times)
+
+
+def relative_diff(features, reference):
+    return float((features - reference).norm() / reference.norm().clamp(min=1e-12))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Equivalence and latency of reid backbones optimized for inference")
+    parser.add_argument("--models", default=DEFAULT_MODELS, help="comma separated torchreid models, or all")
+    parser.add_argument("--batch-size", type=int, default=8, help="crops per batch")
+    parser.add_argument("--repeats", type=int, default=5, help="timed calls per model")
+    parser.add_argument("--threads", type=int, default=0, help="torch threads, 0 for default")
+    parser.add_argument("--max-relative-diff", type=float, default=1e-4, help="max relative difference with eager features")
+    parser.add_argument("--output", default=None, help="results path, defaults to benchmark_results/reid_fusion_<commit>.json")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    # hacnn builds cuda tensors in its forward
+    model_names = [name for name in __model_factory if name != "hacnn"] if args.models == "all" else args.models.split(",")
+    generator = torch.Generator().manual_seed(0)
+    images = torch.randn(args.batch_size, 3, IMAGE_SIZE[0], IMAGE_SIZE[1], generator=generator)
+
+    results = []
+    for name in model_names:
+        torch.manual_seed(0)
+        model = build_model(name, num_classes=1, pretrained=False)
+        randomize_batchnorm(model, generator)
+        model.eval()
+        batchnorms = sum(isinstance(module, nn.modules.batchnorm._BatchNorm) for module in model.modules())
+        reference, eager_seconds = time_model(model, images, args.repeats)
+
+        fused = optimize_for_inference(copy.deepcopy(model), image_size=IMAGE_SIZE)
+        remaining = sum(isinstance(module, nn.modules.batchnorm._BatchNorm) for module in fused.modules())
+        fused_features, fused_seconds = time_model(fused, images, args.repeats)
+
+        frozen = optimize_for_inference(copy.deepcopy(model), freeze=True, image_size=IMAGE_SIZE)
+        frozen_features, frozen_seconds = time_model(frozen, images, args.repeats)
+
+        result = {
+            "model": name,
+            "batchnorms": batchnorms,
+            "fusedBatchnorms": batchnorms - remaining,
+            "frozen": isinstance(frozen, torch.jit.ScriptModule),
+            "eagerMs": 1e3 * eager_seconds,
+            "fusedMs": 1e3 * fused_seconds,
+            "frozenMs": 1e3 * frozen_seconds,
+            "fusedSpeedup": eager_seconds / fused_seconds,
+            "frozenSpeedup": eager_seconds / frozen_seconds,
+            "fusedRelativeDiff": relative_diff(fused_features, reference),
+            "frozenRelativeDiff": relative_diff(frozen_features, reference),
+        }
+        result["equivalent"] = max(result["fusedRelativeDiff"], result["frozenRelativeDiff"]) <= args.max_relative_diff
+        results.append(result)
+        print("{model:<22} {fusedBatchnorms:>4}/{batchnorms:<4} {eagerMs:>9.1f} {fusedMs:>9.1f} {fusedSpeedup:>6.2f}x "
+              "{frozenMs:>9.1f} {frozenSpeedup:>6.2f}x {fusedRelativeDiff:>9.1e} {frozenRelativeDiff:>9.1e}".format(**result),
+              flush=True)
+
+    print("columns: model, fused/total batchnorms, eager ms, fused ms, speedup, frozen ms, speedup, "
+          "fused and frozen relative diff ({} crops)".format(args.batch_size))
+    commit = get_commit()
+    output = args.output or os.path.join("benchmark_results", "reid_fusion_{}.json".format(commit))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "torch": torch.__version__,
+                "threads": torch.get_num_threads(),
+                "args": vars(args),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print("results written to", output)
+    mismatches = [result["model"] for result in results if not result["equivalent"]]
+    if mismatches:
+        print("optimized features differ from eager for: " + ", ".join(mismatches))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Accuracy and latency of int8 quantized reid feature extraction on cpu
+
+Builds the configured reIdModel.modelType as a float FeatureExtractor and with every
+--modes quantization (dynamic, static), on cpu. Static quantization is calibrated on
+--calibration-images crops of the dataset train split, or of --calibration-dir.
+
+With a torchreid dataset under --data-root (eg: reid-data/market1501), every model is
+evaluated on its query and gallery splits by torchreid Engine._evaluate, and Rank-1 and
+mAP are reported with their delta to the float model. The run fails (exit code 1) if
+Rank-1 of a quantized model drops by more than --max-rank1-drop points. Without the
+dataset only latency and the cosine similarity with float features are reported.
+
+Run from repo root, eg:
+    python -m benchmarks.reid_quantization_benchmark --data-root reid-data --dataset market1501
+    python -m benchmarks.reid_quantization_benchmark --modes static --calibration-dir crops/
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import torch
+
+sys.path.append("models/reid")
+import torchreid
+from torchreid.engine import Engine
+from torchreid.utils import FeatureExtractor
+from torchreid.utils.quantization import list_calibration_images
+
+from benchmarks.e2e_benchmark import get_commit
+from benchmarks.reid_backend_benchmark import IMAGE_SIZE, get_weights
+
+
+def load_datamanager(args):
+    """
+    Returns:
+        torchreid.data.ImageDataManager: test loaders of args.dataset, None if it is missing
+    """
+    if not os.path.isdir(os.path.join(args.data_root, args.dataset)):
+        return None
+    return torchreid.data.ImageDataManager(
+        root=args.data_root,
+        sources=args.dataset,
+        height=IMAGE_SIZE[0],
+        width=IMAGE_SIZE[1],
+        use_gpu=False,
+        batch_size_test=args.batch_size,
+        workers=args.workers,
+    )
+
+
+def time_extractor(extractor, images, repeats):
+    """
+    Returns:
+        torch.Tensor: features of images
+        float: median seconds of a call
+    """
+    features = extractor(images)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        extractor(images)
+        times.append(time.perf_counter() - start)
+    return features, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy and latency of int8 quantized reid feature extraction")
+    parser.add_argument("--config", default="config/config.json", help="main config file")
+    parser.add_argument("--modes", default="dynamic,static", help="comma separated quantization modes")
+    parser.add_argument("--data-root", default="reid-data", help="root of torchreid datasets")
+    parser.add_argument("--dataset", default="market1501", help="torchreid image dataset to evaluate on")
+    parser.add_argument("--calibration-dir", default=None, help="person crops for static mode, defaults to the train split")
+    parser.add_argument("--calibration-images", type=int, default=256, help="crops used to calibrate")
+    parser.add_argument("--batch-size", type=int, default=64, help="evaluation batch size")
+    parser.add_argument("--workers", type=int, default=2, help="data loader workers")
+    parser.add_argument("--dist-metric", default="euclidean", help="euclidean or cosine")
+    parser.add_argument("--latency-batch", type=int, default=8, help="crops per timed call")
+    parser.add_argument("--repeats", type=int, default=10, help="timed calls per model")
+    parser.add_argument("--threads", type=int, default=0, help="torch threads, 0 for default")
+    parser.add_argument("--max-rank1-drop", type=float, default=1.0, help="max Rank-1 drop in points")
+    parser.add_argument("--output", default=None, help="results path, defaults to benchmark_results/reid_quantization_<commit>.json")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        main_config = json.load(f)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model_type = main_config["reIdModel"]["modelType"]
+    datamanager = load_datamanager(args)
+    if args.calibration_dir:
+        calibration = list_calibration_images(args.calibration_dir, args.calibration_images)
+    elif datamanager is not None:
+        train = datamanager.train_loader.dataset.train
+        calibration = list_calibration_images([item[0] for item in train], args.calibration_images)
+    else:
+        calibration = None
+    engine = Engine(datamanager, use_gpu=False) if datamanager is not None else None
+    images = torch.randn(args.latency_batch, 3, IMAGE_SIZE[0], IMAGE_SIZE[1], generator=torch.Generator().manual_seed(0))
+
+    workspace = tempfile.mkdtemp(prefix="reid_quantization_benchmark_")
+    try:
+        model_path, random_weights = get_weights(main_config, workspace)
+        results, reference = [], None
+        for mode in ["float"] + args.modes.split(","):
+            if mode == "static" and not calibration:
+                print("static skipped, no calibration crops: pass --calibration-dir or a dataset")
+                continue
+            start = time.perf_counter()
+            extractor = FeatureExtractor(
+                model_name=model_type,
+                model_path=model_path,
+                device="cpu",
+                verbose=False,
+                # quantized from scratch on every run
+                cache_dir=workspace,
+                quantize=None if mode == "float" else mode,
+                calibration=calibration,
+            )
+            load_seconds = time.perf_counter() - start
+            features, seconds = time_extractor(extractor, images, args.repeats)
+            if reference is None:
+                reference = (features, seconds)
+            result = {
+                "mode": mode,
+                "runtime": type(extractor.model).__name__,
+                "loadSeconds": load_seconds,
+                "cropMs": 1e3 * seconds / len(images),
+                "speedup": reference[1] / seconds,
+                "minCosine": float(torch.cosine_similarity(features, reference[0], dim=1).min()),
+            }
+            if engine is not None:
+                engine.model = extractor.model
+                rank1, mAP = engine._evaluate(
+                    dataset_name=args.dataset,
+                    query_loader=engine.test_loader[args.dataset]["query"],
+                    gallery_loader=engine.test_loader[args.dataset]["gallery"],
+                    dist_metric=args.dist_metric,
+                )
+                result.update({"rank1": float(rank1), "mAP": float(mAP)})
+            results.append(result)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    print("{} on cpu{}{}".format(
+        model_type, ", random weights" if random_weights else "",
+        ", {} calibration crops".format(len(calibration)) if calibration else ""))
+    print("{:<8} {:<22} {:>8} {:>8} {:>10} {:>7} {:>7} {:>8} {:>8}".format(
+        "mode", "runtime", "cropMs", "speedup", "minCosine", "Rank-1", "mAP", "dRank-1", "dmAP"))
+    for result in results:
+        if "rank1" in result:
+            result["rank1Delta"] = 100 * (result["rank1"] - results[0]["rank1"])
+            result["mAPDelta"] = 100 * (result["mAP"] - results[0]["mAP"])
+            accuracy = "{:>6.1%} {:>6.1%} {:>+8.2f} {:>+8.2f}".format(
+                result["rank1"], result["mAP"], result["rank1Delta"], result["mAPDelta"])
+        else:
+            accuracy = "no dataset under {}".format(os.path.join(args.data_root, args.dataset))
+        print("{mode:<8} {runtime:<22} {cropMs:>8.2f} {speedup:>7.2f}x {minCosine:>10.6f} ".format(**result) + accuracy)
+
+    commit = get_commit()
+    output = args.output or os.path.join("benchmark_results", "reid_quantization_{}.json".format(commit))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "modelType": model_type,
+                "randomWeights": random_weights,
+                "quantizedEngine": torch.backends.quantized.engine,
+                "args": vars(args),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print("results written to", output)
+    drops = [result["mode"] for result in results if result.get("rank1Delta", 0.0) < -args.max_rank1_drop]
+    if drops:
+        print("Rank-1 drops by more than {} points for: {}".format(args.max_rank1_drop, ", ".join(drops)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Long run soak test of VideoProcessor with memory growth detection
+
+Loops videos through one VideoProcessor for hours, the way a deployment keeps one
+process alive, and on an interval samples RSS, python heap (tracemalloc), open file
+descriptors, reid embedding store size and reid tracklets. At the end every series is checked
+for steady growth after warm up, and the allocation sites that grew most since warm up
+are reported.
+
+By default videos are synthetic and models are the stubs of stub_backends, with
+--real-models the videos, configs and weights of the repo are used as they are.
+
+Run from repo root, eg:
+    python -m benchmarks.soak_test --hours 4
+    python -m benchmarks.soak_test --iterations 20 --interval 5 --persons 16
+    python -m benchmarks.soak_test --real-models --hours 12
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from app import VideoProcessor
+from benchmarks.e2e_benchmark import get_commit, make_camera_config, make_main_config
+from benchmarks.stub_backends import install_stub_backends, syntheticScene, write_synthetic_video
+from utils.metrics.metrics import get_rss_bytes
+
+# sampled series, name --> unit shown in the report
+SERIES_UNITS = {
+    "rssBytes": "bytes",
+    "heapBytes": "bytes",
+    "openFds": "fds",
+    "reidStoreBytes": "bytes",
+    "reidTracklets": "tracks",
+    "reidTrackletBoxes": "boxes",
+}
+
+
+def count_open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return -1
+
+
+def get_dir_bytes(path):
+    """Size of the files in a directory tree, eg: reid embedding stores"""
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, dirs, files in os.walk(path) for name in files
+    )
+
+
+class soakSampler:
+    """Samples resource usage of a VideoProcessor on a background thread
+
+    Attributes:
+        processor (VideoProcessor): processor being soaked
+        interval (float): seconds between samples
+        topAllocations (int): allocation sites kept per report
+        samples (list): dicts of time, iteration and every series of SERIES_UNITS
+        baselineSnapshot (tracemalloc.Snapshot): heap after warm up, growth is measured from it
+    """
+
+    def __init__(self, processor, interval, top_allocations=20):
+        self.processor = processor
+        self.interval = interval
+        self.topAllocations = top_allocations
+        self.samples = []
+        self.iteration = 0
+        self.baselineSnapshot = None
+        self.startTime = time.monotonic()
+        self.stopEvent = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="soakSampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopEvent.set()
+        self.thread.join()
+        self.sample()
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        reid = self.processor.reidPipeline
+        tracklets = getattr(reid, "tracklets", None) or {}
+        self.samples.append(
+            {
+                "seconds": time.monotonic() - self.startTime,
+                "iteration": self.iteration,
+                "rssBytes": get_rss_bytes(),
+                "heapBytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0,
+                "openFds": count_open_fds(),
+                "reidStoreBytes": get_dir_bytes(self.processor.reidStoreConfig.get("storeDir", "reid_store")),
+                "reidTracklets": len(tracklets),
+                "reidTrackletBoxes": sum(len(boxes) for boxes in tracklets.values()),
+            }
+        )
+
+    def take_baseline(self):
+        """Heap snapshot after warm up"""
+        if tracemalloc.is_tracing():
+            self.baselineSnapshot = tracemalloc.take_snapshot()
+
+    def top_growing_allocations(self):
+        """
+        Returns:
+            list of dict: allocation sites that grew most since the baseline snapshot
+        """
+        if self.baselineSnapshot is None:
+            return []
+        snapshot_filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            # samples of this harness
+            tracemalloc.Filter(False, __file__),
+        ]
+        snapshot = tracemalloc.take_snapshot().filter_traces(snapshot_filters)
+        baseline = self.baselineSnapshot.filter_traces(snapshot_filters)
+        growing = []
+        for stat in snapshot.compare_to(baseline, "traceback")[: self.topAllocations]:
+            if stat.size_diff <= 0:
+                continue
+            growing.append(
+                {
+                    "sizeDiffBytes": stat.size_diff,
+                    "sizeBytes": stat.size,
+                    "countDiff": stat.count_diff,
+                    "traceback": [str(frame) for frame in stat.traceback],
+                }
+            )
+        return growing
+
+
+def analyze_growth(samples, name, warmup_samples, min_growth, max_decrease_fraction=0.1):
+    """Check if a series keeps growing after warm up
+
+    Args:
+        samples (list): sampler samples
+        name (str): series name
+        warmup_samples (int): samples skipped at the start
+        min_growth (float): growth from first to last sample, as a fraction, to be flagged
+        max_decrease_fraction (float): fraction of steps that may decrease in a growing series
+
+    Returns:
+        dict: first, last, growth, slope per hour and growing flag
+    """
+    values = [sample[name] for sample in samples[warmup_samples:]]
+    seconds = [sample["seconds"] for sample in samples[warmup_samples:]]
+    if len(values) < 3:
+        return {"samples": len(values), "growing": False}
+    steps = np.diff(values)
+    decreases = int(np.sum(steps < 0))
+    first, last = values[0], values[-1]
+    growth = (last - first) / first if first else float(last > 0)
+    slope = float(np.polyfit(np.array(seconds) / 3600.0, values, 1)[0]) if seconds[-1] > seconds[0] else 0.0
+    return {
+        "samples": len(values),
+        "first": first,
+        "last": last,
+        "max": max(values),
+        "growth": growth,
+        "slopePerHour": slope,
+        "decreasingSteps": decreases,
+        "growing": decreases <= max_decrease_fraction * len(steps) and growth > min_growth and slope > 0,
+    }
+
+
+def prepare_synthetic_workspace(main_config, persons, zones, frames):
+    """Write configs and a synthetic video in cwd
+
+    Returns:
+        syntheticScene: scene of the video, the stub person detector follows it
+    """
+    width, height = 1280, 720
+    os.makedirs("config", exist_ok=True)
+    with open(os.path.join("config", "config.json"), "w") as f:
+        json.dump(main_config, f, indent=4)
+    scene = syntheticScene(persons, width, height)
+    write_synthetic_video(os.path.join("videos", "soak.mp4"), scene, frames)
+    with open(os.path.join("config", "soak.json"), "w") as f:
+        json.dump(make_camera_config("soak.mp4", zones, "all", width, height), f)
+    return scene
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long run soak test with memory growth detection")
+    parser.add_argument("--config", default="config/config.json", help="main config file")
+    parser.add_argument("--bench-config", default="benchmarks/e2e_config.json", help="stub backends latencies")
+    parser.add_argument("--hours", type=float, default=None, help="run time, overrides --iterations")
+    parser.add_argument("--iterations", type=int, default=10, help="times every video is processed")
+    parser.add_argument("--interval", type=float, default=30.0, help="seconds between samples")
+    parser.add_argument("--warmup-iterations", type=int, default=1, help="iterations before growth is measured")
+    parser.add_argument("--min-growth", type=float, default=0.05, help="growth fraction flagged as a leak")
+    parser.add_argument("--persons", type=int, default=8, help="persons in the synthetic video")
+    parser.add_argument("--zones", type=int, default=10, help="zones of the synthetic camera")
+    parser.add_argument("--frames", type=int, default=300, help="frames of the synthetic video")
+    parser.add_argument("--real-models", action="store_true", help="use repo videos, configs and weights")
+    parser.add_argument("--render", action="store_true", help="also draw and write output videos")
+    parser.add_argument("--tracemalloc-frames", type=int, default=5, help="stack depth of allocation sites, 0 to disable")
+    parser.add_argument("--output", default=None, help="report path, defaults to soak_results/soak_<commit>_<time>.json")
+    args = parser.parse_args()
+
+    commit = get_commit()
+    output = os.path.abspath(
+        args.output or os.path.join("soak_results", "soak_{}_{}.json".format(commit, time.strftime("%Y%m%d_%H%M%S")))
+    )
+    repo_dir = os.getcwd()
+    workspace = None
+    config_path = args.config
+    if not args.real_models:
+        with open(args.config) as f:
+            main_config = make_main_config(json.load(f))
+        with open(args.bench_config) as f:
+            stub_config = json.load(f)["stubs"]
+        # VideoProcessor reads camera configs from ./config and writes reid dbs in cwd
+        workspace = tempfile.mkdtemp(prefix="soak_test_")
+        os.chdir(workspace)
+        config_path = os.path.join("config", "config.json")
+        scene = prepare_synthetic_workspace(main_config, args.persons, args.zones, args.frames)
+        install_stub_backends(main_config, stub_config, scene)
+
+    if args.tracemalloc_frames:
+        tracemalloc.start(args.tracemalloc_frames)
+    try:
+        processor = VideoProcessor(config_path, offline=True, render=args.render, chunk_workers=0)
+        video_files = sorted(os.listdir(processor.videosDir))
+        sampler = soakSampler(processor, args.interval)
+        sampler.start()
+        deadline = time.monotonic() + args.hours * 3600 if args.hours else None
+        iteration = 0
+        while (deadline is None and iteration < args.iterations) or (deadline and time.monotonic() < deadline):
+            if iteration == args.warmup_iterations:
+                sampler.take_baseline()
+                sampler.sample()
+                warmup_samples = len(sampler.samples) - 1
+            sampler.iteration = iteration
+            for video_file in video_files:
+                # models are rebuilt per video as in app.py
+                processor.init_pipelines(video_file)
+                processor.process_video_offline(os.path.join(processor.videosDir, video_file), video_file)
+            iteration += 1
+            print("soak iteration {} done, rss {:.1f} MB".format(iteration, get_rss_bytes() / 2**20))
+        sampler.stop()
+        if iteration <= args.warmup_iterations:
+            warmup_samples = 0
+        growth = {
+            name: analyze_growth(sampler.samples, name, warmup_samples, args.min_growth) for name in SERIES_UNITS
+        }
+        top_allocations = sampler.top_growing_allocations()
+    finally:
+        tracemalloc.stop()
+        os.chdir(repo_dir)
+        if workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    report = {
+        "commit": commit,
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "realModels": args.real_models,
+        "iterations": iteration,
+        "videos": video_files,
+        "units": SERIES_UNITS,
+        "growth": growth,
+        "topGrowingAllocations": top_allocations,
+        "samples": sampler.samples,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    growing = [name for name, result in growth.items() if result["growing"]]
+    for name, result in growth.items():
+        if result["samples"] >= 3:
+            print("{:<18} {:>14} -> {:>14} {:>+8.1f}% {}".format(
+                name, result["first"], result["last"], 100 * result["growth"], "GROWING" if result["growing"] else ""))
+    if top_allocations:
+        print("top growing allocation sites since warm up:")
+        for allocation in top_allocations[:10]:
+            print("  {:>+12d} bytes {:>+8d} blocks  {}".format(
+                allocation["sizeDiffBytes"], allocation["countDiff"], allocation["traceback"][-1]))
+    print("report written to", output)
+    if growing:
+        print("steady growth in: " + ", ".join(growing))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
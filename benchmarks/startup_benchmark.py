@@ -0,0 +1,170 @@
+"""Import of app.py and reid model start up time
+
+Every scenario runs in a fresh interpreter, --repeats times, and reports the median
+seconds of each step:
+    - torch: import torch and torchvision, paid by the app anyway
+    - torchreid: import of torchreid.utils.FeatureExtractor on top of torch
+    - extractor: FeatureExtractor construction with the configured reIdModel.modelType
+
+Scenarios:
+    - lazy: the lazy torchreid subpackages and model registry
+    - eager: also imports what torchreid used to import eagerly, every subpackage
+      (data pulls scipy, engine tensorboard) and every architecture module
+    - complexity: lazy, and FeatureExtractor counts params and flops with a forward pass
+    - app: import app.py, analytic pipelines are imported when a camera enables them
+    - app-eager: import app.py and every analytic pipeline module, as app.py used to
+
+Run from repo root, eg:
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --repeats 10
+    python -m benchmarks.startup_benchmark --scenarios app,app-eager
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import torch
+
+from benchmarks.e2e_benchmark import get_commit
+
+SCENARIO = """
+import json, sys, time
+start = time.perf_counter()
+import torch, torchvision, torchvision.transforms
+torch_seconds = time.perf_counter() - start
+sys.path.append("models/reid")
+start = time.perf_counter()
+from torchreid.utils import FeatureExtractor
+if {eager}:
+    import torchreid.data, torchreid.engine, torchreid.losses, torchreid.metrics, torchreid.optim
+    import importlib, torchreid.models
+    for module in torchreid.models.ARCHITECTURES:
+        importlib.import_module("torchreid.models." + module)
+torchreid_seconds = time.perf_counter() - start
+start = time.perf_counter()
+FeatureExtractor(model_name={model_type!r}, model_path={model_path!r}, device="cpu", model_complexity={complexity})
+extractor_seconds = time.perf_counter() - start
+architectures = sorted(name[len("torchreid.models."):] for name in sys.modules if name.startswith("torchreid.models."))
+print(json.dumps({{"torch": torch_seconds, "torchreid": torchreid_seconds, "extractor": extractor_seconds,
+                  "architectures": architectures}}))
+"""
+APP_SCENARIO = """
+import json, sys, time
+start = time.perf_counter()
+import app
+if {eager}:
+    import utils.video.video_downloader
+    from models import ANALYTIC_PLUGINS
+    for plugin in ANALYTIC_PLUGINS:
+        plugin.load_class()
+app_seconds = time.perf_counter() - start
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{"app": app_seconds, "modules": heavy}}))
+"""
+SCENARIOS = {
+    "lazy": {"eager": False, "complexity": False},
+    "eager": {"eager": True, "complexity": False},
+    "complexity": {"eager": False, "complexity": True},
+}
+APP_SCENARIOS = {
+    "app": {"eager": False},
+    "app-eager": {"eager": True},
+}
+STEPS = ("torch", "torchreid", "extractor")
+# imports worth seconds, reported when an app scenario loaded them
+HEAVY_MODULES = ("torch", "torchvision", "torchreid", "ultralytics", "boto3")
+
+
+def run_app_scenario(eager):
+    code = APP_SCENARIO.format(eager=eager, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_scenario(model_type, model_path, eager, complexity):
+    code = SCENARIO.format(eager=eager, complexity=complexity, model_type=model_type, model_path=model_path)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import of app.py and reid model start up time")
+    parser.add_argument("--config", default="config/config.json", help="main config file")
+    parser.add_argument("--scenarios", default="lazy,eager,complexity,app,app-eager", help="comma separated scenarios")
+    parser.add_argument("--repeats", type=int, default=5, help="fresh interpreters per scenario")
+    parser.add_argument("--output", default=None, help="results path, defaults to benchmark_results/startup_<commit>.json")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        main_config = json.load(f)
+    model_type = main_config["reIdModel"]["modelType"]
+    model_path = os.path.join(main_config["modelsDir"], main_config["reIdModel"]["modelName"])
+    workspace = None
+    names = args.scenarios.split(",")
+    if any(name in SCENARIOS for name in names) and not os.path.isfile(model_path):
+        # random weights, start up time doesn't depend on them
+        sys.path.append("models/reid")
+        from torchreid.models import build_model
+
+        workspace = tempfile.mkdtemp(prefix="startup_benchmark_")
+        model_path = os.path.join(workspace, "random_" + os.path.basename(model_path))
+        torch.save(build_model(model_type, num_classes=1, pretrained=False).state_dict(), model_path)
+
+    results = dict()
+    try:
+        for name in names:
+            if name in APP_SCENARIOS:
+                runs = [run_app_scenario(**APP_SCENARIOS[name]) for _ in range(args.repeats)]
+                results[name] = {"app": statistics.median(run["app"] for run in runs), "modules": runs[-1]["modules"]}
+                continue
+            runs = [run_scenario(model_type, model_path, **SCENARIOS[name]) for _ in range(args.repeats)]
+            results[name] = {step: statistics.median(run[step] for run in runs) for step in STEPS}
+            results[name]["architectures"] = runs[-1]["architectures"]
+    finally:
+        if workspace:
+            os.remove(model_path)
+            os.rmdir(workspace)
+
+    print("{} start up, median of {} interpreters".format(model_type, args.repeats))
+    if any(name in SCENARIOS for name in results):
+        print("{:<11} {:>8} {:>10} {:>10} {:>13}".format("scenario", "torch", "torchreid", "extractor", "architectures"))
+    for name, result in results.items():
+        if name in APP_SCENARIOS:
+            continue
+        print("{:<11} {torch:>7.3f}s {torchreid:>9.3f}s {extractor:>9.3f}s {count:>13}".format(
+            name, count=len(result["architectures"]), **result))
+    if "lazy" in results and "eager" in results:
+        print("lazy imports save {:.3f}s".format(results["eager"]["torchreid"] - results["lazy"]["torchreid"]))
+    if "lazy" in results and "complexity" in results:
+        print("skipping model complexity saves {:.3f}s".format(
+            results["complexity"]["extractor"] - results["lazy"]["extractor"]))
+    for name in APP_SCENARIOS:
+        if name in results:
+            print("{:<11} import app {:.3f}s, loaded: {}".format(
+                name, results[name]["app"], ", ".join(results[name]["modules"]) or "none of " + ", ".join(HEAVY_MODULES)))
+
+    commit = get_commit()
+    output = args.output or os.path.join("benchmark_results", "startup_{}.json".format(commit))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "modelType": model_type,
+                "args": vars(args),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print("results written to", output)
+
+
+if __name__ == "__main__":
+    main()
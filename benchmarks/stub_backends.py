@@ -0,0 +1,195 @@
+"""Deterministic stand-ins for the YOLO and osnet backends, and synthetic videos they agree with.
+
+The stubs return real ultralytics Results objects, so every model class of the repo
+runs its own post-processing unchanged, only the network forward pass is replaced by
+a sleep of configurable latency. Person boxes come from the same syntheticScene that
+drew the video, so tracking, reid, zones and drawing see realistic inputs.
+"""
+import hashlib
+import os
+import time
+
+import cv2
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+import models.fall_detection.fall_detection
+import models.firesmokedetection.firesmokedetection
+import models.garbage_detection.garbage_detection
+import models.person_detection.person_detection
+import models.ppe_detection.ppe_detection
+import models.reid.reid
+import models.spill_detection.spill_detection
+import models.trip_hazard_detection.triphazarddetection
+
+# config field of main config --> module that imports YOLO
+YOLO_MODULES = {
+    "PersonDetectionModel": models.person_detection.person_detection,
+    "ppeDetectionModel": models.ppe_detection.ppe_detection,
+    "bodyPartDetectionModel": models.ppe_detection.ppe_detection,
+    "fallDetectionModel": models.fall_detection.fall_detection,
+    "FireSmokeDetectionModel": models.firesmokedetection.firesmokedetection,
+    "garbageDetectionModel": models.garbage_detection.garbage_detection,
+    "triphazardDetectionModel": models.trip_hazard_detection.triphazarddetection,
+    "spillDetectionModel": models.spill_detection.spill_detection,
+}
+
+
+class syntheticScene:
+    """Rectangles of distinct colors ("workers") bouncing around a gray frame.
+    Positions are a pure function of the frame index, so the video and the stub
+    person detector always agree.
+    """
+
+    def __init__(self, num_persons, width=1280, height=720, seed=0):
+        self.width = width
+        self.height = height
+        rng = np.random.default_rng(seed)
+        self.sizes = rng.integers([40, 90], [90, 220], size=(num_persons, 2))
+        self.starts = rng.uniform([0, 0], [width - 90, height - 220], size=(num_persons, 2))
+        self.velocities = rng.uniform(-6, 6, size=(num_persons, 2))
+        self.colors = rng.integers(30, 255, size=(num_persons, 3))
+
+    def bounce(self, position, limit):
+        """Reflect positions into [0, limit]"""
+        period = 2 * limit
+        position = np.mod(position, period)
+        return np.where(position > limit, period - position, position)
+
+    def person_boxes(self, frame_index):
+        """
+        Returns:
+            np.array: (persons, 5) xmin, ymin, xmax, ymax, person id starting at 1
+        """
+        if not len(self.sizes):
+            return np.zeros((0, 5))
+        limits = np.array([self.width, self.height]) - self.sizes
+        top_left = self.bounce(self.starts + self.velocities * frame_index, limits)
+        boxes = np.hstack([top_left, top_left + self.sizes, np.arange(1, len(self.sizes) + 1)[:, None]])
+        return boxes.astype(np.float32)
+
+    def render(self, frame_index):
+        frame = np.full((self.height, self.width, 3), 90, dtype=np.uint8)
+        for (xmin, ymin, xmax, ymax, person_id), color in zip(self.person_boxes(frame_index), self.colors):
+            cv2.rectangle(frame, (int(xmin), int(ymin)), (int(xmax), int(ymax)), color.tolist(), -1)
+        return frame
+
+
+def write_synthetic_video(video_path, scene, num_frames, fps=25):
+    """Write num_frames of a scene into an mp4 video"""
+    os.makedirs(os.path.dirname(video_path) or ".", exist_ok=True)
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (scene.width, scene.height))
+    for frame_index in range(num_frames):
+        writer.write(scene.render(frame_index))
+    writer.release()
+
+
+def stub_sleep(backend_config, items):
+    """Sleep for the configured latency of one call with items images or crops"""
+    seconds = (backend_config.get("latencyMs", 0.0) + backend_config.get("perItemMs", 0.0) * items) / 1000.0
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def make_stub_yolo(main_config, stub_config, scene):
+    """Build a YOLO replacement class for one scene
+
+    Args:
+        main_config (dict): main config, model names identify which model is loaded
+        stub_config (dict): per main config field latencyMs, perItemMs and detections
+        scene (syntheticScene): scene of the video being processed
+
+    Returns:
+        class: with the YOLO interface used in this repo (__call__, predict, track)
+    """
+    model_fields = {
+        main_config[field]["modelName"]: field for field in YOLO_MODULES if field in main_config
+    }
+
+    class stubYOLO:
+        def __init__(self, model_path, *args, **kwargs):
+            self.field = model_fields.get(os.path.basename(model_path), "PersonDetectionModel")
+            self.backend = stub_config.get(self.field, {})
+            self.names = {
+                index: name
+                for index, name in enumerate(
+                    main_config.get(self.field, {}).get("orignalClassList")
+                    or main_config.get(self.field, {}).get("originalClassList")
+                    or ["object"]
+                )
+            }
+            # index of next frame for person tracking
+            self.frameIndex = 0
+
+        def detection_boxes(self, image, index):
+            """Deterministic boxes inside an image, spread on a grid"""
+            height, width = image.shape[:2]
+            count = self.backend.get("detections", 1)
+            rows = []
+            for i in range(count):
+                cell = (i + index) % 4
+                xmin = width * (0.1 + 0.2 * cell)
+                ymin = height * (0.1 + 0.2 * ((i // 4) % 4))
+                class_id = (i + 1) % max(1, len(self.names))
+                rows.append([xmin, ymin, xmin + width * 0.15, ymin + height * 0.15, 0.9, class_id])
+            return torch.tensor(rows, dtype=torch.float32).reshape(-1, 6)
+
+        def result(self, image, index):
+            if self.field == "fallDetectionModel":
+                # every 7th person is falling
+                probs = torch.tensor([0.9, 0.1]) if index % 7 == 0 else torch.tensor([0.1, 0.9])
+                return Results(image, path="stub", names=self.names, probs=probs)
+            return Results(image, path="stub", names=self.names, boxes=self.detection_boxes(image, index))
+
+        def __call__(self, source, **kwargs):
+            images = source if isinstance(source, list) else [source]
+            stub_sleep(self.backend, len(images))
+            return [self.result(image, index) for index, image in enumerate(images)]
+
+        predict = __call__
+
+        def track(self, source, **kwargs):
+            images = source if isinstance(source, list) else [source]
+            stub_sleep(self.backend, len(images))
+            results = []
+            for image in images:
+                boxes = scene.person_boxes(self.frameIndex)
+                self.frameIndex += 1
+                # xmin, ymin, xmax, ymax, track id, conf, class
+                data = np.hstack([boxes[:, :5], np.full((len(boxes), 1), 0.9), np.zeros((len(boxes), 1))])
+                results.append(Results(image, path="stub", names=self.names, boxes=torch.from_numpy(data).float()))
+            return results
+
+    return stubYOLO
+
+
+def make_stub_feature_extractor(stub_config):
+    """Build an osnet FeatureExtractor replacement, embeddings depend only on the crop colors"""
+    backend = stub_config.get("reIdModel", {})
+
+    class stubFeatureExtractor:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __call__(self, crops):
+            crops = crops if isinstance(crops, list) else [crops]
+            stub_sleep(backend, len(crops))
+            features = []
+            for crop in crops:
+                mean = np.round(crop.reshape(-1, 3).mean(axis=0) if crop.size else np.zeros(3))
+                seed = int(hashlib.sha1(mean.tobytes()).hexdigest()[:8], 16)
+                features.append(torch.from_numpy(np.random.default_rng(seed).standard_normal(512)).float())
+            return torch.stack(features)
+
+    return stubFeatureExtractor
+
+
+def install_stub_backends(main_config, stub_config, scene):
+    """Replace YOLO and FeatureExtractor in every model module for the given scene.
+    Models created after this call use the stubs.
+    """
+    stub_yolo = make_stub_yolo(main_config, stub_config, scene)
+    for module in YOLO_MODULES.values():
+        module.YOLO = stub_yolo
+    models.reid.reid.FeatureExtractor = make_stub_feature_extractor(stub_config)
@@ -1,10 +1,31 @@
-from .person_detection.person_detection import personDetectionModel
-from .ppe_detection.ppe_detection import ppeDetectionModel
-from .person_counting_in_zone.person_counting_in_zone import personCountInZone
-from .fall_detection.fall_detection import fallDetectionModel
-from .firesmokedetection.firesmokedetection import FireSmokeDetectionModel
-from .garbage_detection.garbage_detection import garbageDetectionModel
-from .trip_hazard_detection.triphazarddetection import triphazardDetectionModel
-from .spill_detection.spill_detection import spillDetectionModel
-from models.reid.reid import reID
+import importlib
 
+from .analytics.analytics import ANALYTIC_PLUGINS, analyticPlugin, enabled_plugins
+
+# pipeline classes are imported on first access, most of them import ultralytics or
+# torchreid, see models.analytics for loading only the analytics a camera enables
+_LAZY_EXPORTS = {
+    "personDetectionModel": "models.person_detection.person_detection",
+    "ppeDetectionModel": "models.ppe_detection.ppe_detection",
+    "personCountInZone": "models.person_counting_in_zone.person_counting_in_zone",
+    "fallDetectionModel": "models.fall_detection.fall_detection",
+    "FireSmokeDetectionModel": "models.firesmokedetection.firesmokedetection",
+    "garbageDetectionModel": "models.garbage_detection.garbage_detection",
+    "triphazardDetectionModel": "models.trip_hazard_detection.triphazarddetection",
+    "spillDetectionModel": "models.spill_detection.spill_detection",
+    "reID": "models.reid.reid",
+    "replayPersonDetectionModel": "models.replay.replay",
+    "replayReID": "models.replay.replay",
+    "replayPpeDetectionModel": "models.replay.replay",
+    "replayFallDetectionModel": "models.replay.replay",
+    "replayFireSmokeDetectionModel": "models.replay.replay",
+    "replayGarbageDetectionModel": "models.replay.replay",
+    "replayTriphazardDetectionModel": "models.replay.replay",
+    "replaySpillDetectionModel": "models.replay.replay",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        return getattr(importlib.import_module(_LAZY_EXPORTS[name]), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
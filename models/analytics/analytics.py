@@ -0,0 +1,191 @@
+import importlib
+
+
+class analyticPlugin:
+    """An analytic of the pipeline, declared without importing it. The module of its
+    pipeline class is imported the first time a camera config enables it, so a camera
+    that only counts persons in zones never imports the detection models of the other
+    analytics.
+
+    Attributes:
+        name (str): name of the analytic in metrics, eg: model load times
+        configKey (str): key of camera config "analytics" that enables it, None if the
+                         analytic always runs
+        attribute (str): VideoProcessor attribute holding its pipeline
+        pipelineClass (str): "module:class" of the pipeline
+        pipelineArgs (tuple): VideoProcessor attributes passed to the pipeline class
+        replayClass (str): "module:class" of the pipeline reading recorded detections
+                           instead of running the model, None if it has no model
+        replayArgs (tuple): VideoProcessor attributes passed to the replay class
+        modelConfigs (tuple): main config fields of the weights it loads
+        inputs (tuple): what it runs on, "frame", "personBboxes" (tracked persons of
+                        the frame) and/or "results" (results json of the frame)
+        required (str): pipeline attribute that must be truthy, or the pipeline is dropped
+        exclusiveLoad (bool): load and warm up the model while no other model runs. torch.fx
+                              tracing (reid batchnorm fusion and static quantization) patches
+                              torch.nn.Module for every thread of the process
+
+    Methods:
+        enabled: True if a camera config enables this analytic
+        load_class: import the pipeline or replay class
+        build: create the pipeline of a VideoProcessor
+    """
+
+    def __init__(
+        self,
+        name,
+        config_key,
+        attribute,
+        pipeline_class,
+        pipeline_args=("globalConfigInfo",),
+        replay_class=None,
+        replay_args=("globalConfigInfo", "detectionLogReader"),
+        model_configs=(),
+        inputs=("frame",),
+        required=None,
+        exclusive_load=False,
+    ):
+        self.name = name
+        self.configKey = config_key
+        self.attribute = attribute
+        self.pipelineClass = pipeline_class
+        self.pipelineArgs = pipeline_args
+        self.replayClass = replay_class
+        self.replayArgs = replay_args
+        self.modelConfigs = model_configs
+        self.inputs = inputs
+        self.required = required
+        self.exclusiveLoad = exclusive_load
+
+    @property
+    def hasModel(self):
+        return self.replayClass is not None
+
+    @property
+    def frameLevel(self):
+        """True if the analytic can find something on a frame without persons"""
+        return "personBboxes" not in self.inputs and "results" not in self.inputs
+
+    def enabled(self, camera_config):
+        """
+        Args:
+            camera_config (dict): camera config
+
+        Returns:
+            bool: True if the analytic runs for this camera, missing keys disable it
+        """
+        return self.configKey is None or bool(camera_config.get("analytics", {}).get(self.configKey, False))
+
+    def load_class(self, replay=False):
+        """Import the module of the pipeline, or of the replay pipeline, and return its class"""
+        module, name = (self.replayClass if replay else self.pipelineClass).split(":")
+        return getattr(importlib.import_module(module), name)
+
+    def build(self, processor, replay=False):
+        """
+        Args:
+            processor (VideoProcessor): source of the pipeline arguments
+            replay (bool): build the pipeline reading recorded detections
+
+        Returns:
+            object: pipeline
+        """
+        args = self.replayArgs if replay else self.pipelineArgs
+        return self.load_class(replay)(*[getattr(processor, arg) for arg in args])
+
+
+# in the order they are initialized
+ANALYTIC_PLUGINS = (
+    analyticPlugin(
+        "zoneCounting",
+        "personInZoneCounting",
+        "personInZoneCounting",
+        "models.person_counting_in_zone.person_counting_in_zone:personCountInZone",
+        pipeline_args=("cameraConfigInfo",),
+        inputs=("results",),
+        required="validZones",
+    ),
+    analyticPlugin(
+        "personDetection",
+        None,
+        "personDetectionPipeline",
+        "models.person_detection.person_detection:personDetectionModel",
+        replay_class="models.replay.replay:replayPersonDetectionModel",
+        model_configs=("PersonDetectionModel",),
+    ),
+    analyticPlugin(
+        "reid",
+        None,
+        "reidPipeline",
+        "models.reid.reid:reID",
+        pipeline_args=("cameraConfigInfo", "globalConfigInfo", "reidDatabaseName", "identityService"),
+        replay_class="models.replay.replay:replayReID",
+        replay_args=(),
+        model_configs=("reIdModel",),
+        inputs=("frame", "personBboxes"),
+        exclusive_load=True,
+    ),
+    analyticPlugin(
+        "ppeDetection",
+        "ppeDetection",
+        "ppeDetectionPipeline",
+        "models.ppe_detection.ppe_detection:ppeDetectionModel",
+        pipeline_args=("globalConfigInfo", "cameraConfigInfo"),
+        replay_class="models.replay.replay:replayPpeDetectionModel",
+        replay_args=("globalConfigInfo", "detectionLogReader", "cameraConfigInfo"),
+        model_configs=("ppeDetectionModel", "bodyPartDetectionModel"),
+        inputs=("frame", "personBboxes"),
+    ),
+    analyticPlugin(
+        "fallDetection",
+        "fallDetection",
+        "fallDetectionPipeline",
+        "models.fall_detection.fall_detection:fallDetectionModel",
+        replay_class="models.replay.replay:replayFallDetectionModel",
+        model_configs=("fallDetectionModel",),
+        inputs=("frame", "personBboxes"),
+    ),
+    analyticPlugin(
+        "garbageDetection",
+        "garbageDetection",
+        "garbageDetectionPipeline",
+        "models.garbage_detection.garbage_detection:garbageDetectionModel",
+        replay_class="models.replay.replay:replayGarbageDetectionModel",
+        model_configs=("garbageDetectionModel",),
+    ),
+    analyticPlugin(
+        "tripHazardDetection",
+        "tripHazardDetection",
+        "triphazardDetectionPipeline",
+        "models.trip_hazard_detection.triphazarddetection:triphazardDetectionModel",
+        replay_class="models.replay.replay:replayTriphazardDetectionModel",
+        model_configs=("triphazardDetectionModel",),
+    ),
+    analyticPlugin(
+        "spillDetection",
+        "spillDetection",
+        "spillDetectionPipeline",
+        "models.spill_detection.spill_detection:spillDetectionModel",
+        replay_class="models.replay.replay:replaySpillDetectionModel",
+        model_configs=("spillDetectionModel",),
+    ),
+    analyticPlugin(
+        "fireSmokeDetection",
+        "fire_smoke_detection",
+        "fireSmokeDetectionPipeline",
+        "models.firesmokedetection.firesmokedetection:FireSmokeDetectionModel",
+        replay_class="models.replay.replay:replayFireSmokeDetectionModel",
+        model_configs=("FireSmokeDetectionModel",),
+    ),
+)
+
+
+def enabled_plugins(camera_config):
+    """
+    Args:
+        camera_config (dict): camera config
+
+    Returns:
+        list: analyticPlugin of every analytic this camera runs
+    """
+    return [plugin for plugin in ANALYTIC_PLUGINS if plugin.enabled(camera_config)]
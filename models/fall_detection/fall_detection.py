@@ -1,9 +1,12 @@
 import logging
 import os
 import cv2
+import numpy as np
 
 from ultralytics import YOLO
 
+from utils.tracing.tracing import tracer
+
 
 class fallDetectionModel:
     """
@@ -18,6 +21,8 @@ class fallDetectionModel:
         device (str): Device to use for inference. One of: `'cpu' or 'cuda'`
         originalClassList: List of classes (in this case fall and notfall)
         fall_result : results obtained from the fall classifier
+        fall_probs : [top1 class, top1 confidence, track_id] of every person, kept
+                     so fall_confidence can be tuned later without running the model
     """
 
     def __init__(self, main_config):
@@ -31,18 +36,20 @@ class fallDetectionModel:
         self.device = main_config["fallDetectionModel"]["device"]
         self.orignalClassList = main_config["fallDetectionModel"]["originalClassList"]
         self.fall_result= (list())
+        self.fall_probs = (list())
         self.batchSize = main_config["fallDetectionModel"]["batchSize"]
         self.personCrops = (
             list()
         )  # store cropped person image into this list for batched inference
 
     def run_inference(self,image):
-        results = self.model(
-            image,
-            imgsz=self.imageSize,
-            classes=self.orignalClassList,
-            verbose=False
-        )
+        with tracer.span("fallModel", "model", {"crops": len(image)}):
+            results = self.model(
+                image,
+                imgsz=self.imageSize,
+                classes=self.orignalClassList,
+                verbose=False
+            )
         return results
     
     def validate_fall_conf(self, fall_result,person_bbox):
@@ -50,16 +57,11 @@ class fallDetectionModel:
         If fall detected, model sends output as 0
         If no fall detected, model sends output as 1
         """
-        validated_res = []
-        for i in range(len(fall_result)):
-            if fall_result[i].probs.top1 == 0:
-                if fall_result[i].probs.top1conf > self.fall_confidence:
-                    validated_res.append([1,person_bbox[i][4]])
-                else:
-                    validated_res.append([0,person_bbox[i][4]])
-            else:
-                validated_res.append([0,person_bbox[i][4]])
-        return validated_res
+        self.fall_probs = [
+            [fall_result[i].probs.top1, float(fall_result[i].probs.top1conf), person_bbox[i][4]]
+            for i in range(len(fall_result))
+        ]
+        return validate_fall_probs(self.fall_probs, self.fall_confidence)
     
     def final_fall_result(self,result, person_bbox):
         results= []
@@ -93,10 +95,32 @@ class fallDetectionModel:
             self.fall_result = self.validate_fall_conf(results, personBboxes)
             self.personCrops.clear()
     
+    def warm_up(self):
+        """Run the classifier once on self.batchSize blank person crops"""
+        self.run_inference([np.zeros((self.imageSize, self.imageSize, 3), dtype=np.uint8)] * self.batchSize)
+
     def __call__(self, frame, person_bboxes):
+        # results of the previous frame are never reported or recorded again
+        self.fall_result = list()
+        self.fall_probs = list()
         self.crop_and_infer_person_bbox(frame, person_bboxes)
 
 
+def validate_fall_probs(fall_probs, fall_confidence):
+    """Convert classifier outputs into fall results, usable without loading the model
 
+    Args:
+        fall_probs (list of list): [top1 class, top1 confidence, track_id] of every person,
+            class 0 is fall and class 1 is notfall
+        fall_confidence (float): minimum confidence for a valid fall
 
-    
\ No newline at end of file
+    Returns:
+        list of list: [1 if fall else 0, track_id]
+    """
+    validated_res = []
+    for top1, top1conf, track_id in fall_probs:
+        if top1 == 0 and top1conf > fall_confidence:
+            validated_res.append([1, track_id])
+        else:
+            validated_res.append([0, track_id])
+    return validated_res
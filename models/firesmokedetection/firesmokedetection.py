@@ -1,6 +1,9 @@
 import os
+import numpy as np
 from ultralytics import YOLO
 
+from utils.tracing.tracing import tracer
+
 
 
 class FireSmokeDetectionModel:
@@ -75,12 +78,50 @@ class FireSmokeDetectionModel:
                     self.smoke_bboxes.append([xmin, ymin, xmax, ymax, conf])
                     self.smoke_detected = True
 
-    def __call__(self, image):
+    def run_inference(self, image):
+        """
+        Runs YOLO on an image or a list of images.
+
+        Returns:
+            list: YOLO results, one per image
+        """
+        with tracer.span("fireSmokeModel", "model"):
+            return self.model.predict(
+                image,
+                conf=self.conf,
+                iou=self.iou,
+                imgsz=self.imageSize,
+                classes=self.predictionClasses,
+                device=self.device,
+                verbose=False,
+            )
+
+    def predict_batch(self, frames):
+        """
+        Runs inference on many frames, self.batchSize frames at a time.
+
+        Args:
+            frames (list of np.array): frames
+
+        Returns:
+            list: YOLO results, one per frame. Pass [result] to __call__ for that frame
+        """
+        results = []
+        for start in range(0, len(frames), self.batchSize):
+            results.extend(self.run_inference(frames[start : start + self.batchSize]))
+        return results
+
+    def warm_up(self):
+        """Run predict_batch once on self.batchSize blank frames at self.imageSize"""
+        self.predict_batch([np.zeros((self.imageSize, self.imageSize, 3), dtype=np.uint8)] * self.batchSize)
+
+    def __call__(self, image, results=None):
         """
         Runs inference on the input image.
 
         Args:
             image (np.array): Input image or batch of images.
+            results (list, optional): YOLO results already computed by predict_batch for this image
 
         Returns:
             dict or None: Result dictionary containing bounding boxes and detection flags,
@@ -93,16 +134,8 @@ class FireSmokeDetectionModel:
         self.fire_detected = False
         self.smoke_detected = False
         # Perform detection
-        results = self.model.predict(
-            image,
-            conf=self.conf,
-            iou=self.iou,
-            imgsz=self.imageSize,
-            classes=self.predictionClasses,
-            device=self.device,
-            verbose=False,
-        )
-        
+        if results is None:
+            results = self.run_inference(image)
 
         # Populate bounding box lists
         self.get_bbox_class_conf(results)
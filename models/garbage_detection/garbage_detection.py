@@ -1,4 +1,5 @@
 from ultralytics import YOLO
+import numpy as np
 import os
 
 class garbageDetectionModel:
@@ -18,6 +19,7 @@ class garbageDetectionModel:
         )
         self.confidence = main_config["garbageDetectionModel"]["confidence"]
         self.imageSize = main_config["garbageDetectionModel"]["imageSize"]
+        self.batchSize = main_config["garbageDetectionModel"]["batchSize"]
         self.device = main_config["garbageDetectionModel"]["device"]
         self.iou = main_config["garbageDetectionModel"]["iou"]
         self.orignalClassList = main_config["garbageDetectionModel"]["originalClassList"]
@@ -47,10 +49,34 @@ class garbageDetectionModel:
             xmin, ymin, xmax, ymax, conf, cls_id = garbage.boxes.data.tolist()[0]
             self.garbage_results.append([xmin,ymin,xmax, ymax, conf])
 
-    def __call__(self,frame):
+    def predict_batch(self, frames):
+        """
+        Inference garbage detection model on many frames, self.batchSize frames at a time.
+        Returns one result per frame.
+
+        """
+        results = []
+        for start in range(0, len(frames), self.batchSize):
+            results.extend(
+                self.model(
+                    frames[start : start + self.batchSize],
+                    imgsz=self.imageSize,
+                    conf=self.confidence,
+                    verbose=False
+                )
+            )
+        return results
+
+    def warm_up(self):
+        """Run predict_batch once on self.batchSize blank frames at self.imageSize"""
+        self.predict_batch([np.zeros((self.imageSize, self.imageSize, 3), dtype=np.uint8)] * self.batchSize)
+
+    def __call__(self,frame,result=None):
         """
         Callable method to perform garbage detection on a frame.
+        result can be the output of predict_batch for this frame.
         """
-        result = self.run_inference(frame)
+        if result is None:
+            result = self.run_inference(frame)
         self.extract_result(result)
         
@@ -2,8 +2,11 @@ import logging
 import os
 
 import cv2
+import numpy as np
 from ultralytics import YOLO
 
+from utils.tracing.tracing import tracer
+
 
 class personDetectionModel:
     """This class will handle person detection and tracking
@@ -16,7 +19,7 @@ class personDetectionModel:
         imageSize (int): Input image size for inference.
         device (str): Device to use for inference (e.g., 'cpu', 'cuda').
         iou (float): IOU (Intersection over Union) threshold for post-processing.
-        batchSize (int): Batch size for batched inference (currently not utilized).
+        batchSize (int): Batch size for batched inference, used by track_batch in offline mode.
         predictionClasses (list): List of classes to be predicted by the model.
         showBoxes (bool): Whether to display bounding boxes on detected objects.
         personBboxes (list): List to store detected person bounding boxes.
@@ -24,6 +27,7 @@ class personDetectionModel:
         Methods:
         get_bbox_track_id_conf(): extracts predictions results from predictd yolo results
         crop_person_boxes: Extract person crops from full image
+        warm_up: run the detector once so the first frame doesn't pay for its set up
     """
 
     def __init__(self, config):
@@ -84,25 +88,70 @@ class personDetectionModel:
                     )
                     continue
 
-    def __call__(self, image,):
+    def run_tracking(self, image):
+        """Run detection and tracking using YOLO
+
+        Args:
+            image (np.array or list): Input image or list of consecutive frames
+
+        Returns:
+            list: yolo results, one per frame
+        """
+        with tracer.span("personModel", "model"):
+            return self.model.track(
+                image,
+                conf=self.confidence,
+                iou=self.iou,
+                imgsz=self.imageSize,
+                classes=self.predictionClasses,
+                show_boxes=self.showBoxes,
+                persist=True,
+                verbose=False,
+            )
+
+    def track_batch(self, frames):
+        """Run detection and tracking on consecutive frames, self.batchSize frames per inference.
+        Detection runs batched while the tracker is still updated frame by frame in order,
+        so track ids are the same as calling this class on every frame.
+
+        Args:
+            frames (list of np.array): consecutive frames of one video
+
+        Returns:
+            list: yolo results, one per frame. Pass [result] to __call__ to extract the boxes
+        """
+        results = []
+        for start in range(0, len(frames), self.batchSize):
+            results.extend(self.run_tracking(frames[start : start + self.batchSize]))
+        return results
+
+    def warm_up(self):
+        """Run the detector on self.batchSize blank frames at self.imageSize. The yolo
+        predictor is set up and the model fused here instead of on the first frame, track()
+        reuses that predictor. The tracker is not updated.
+        """
+        frames = [np.zeros((self.imageSize, self.imageSize, 3), dtype=np.uint8)] * self.batchSize
+        with tracer.span("personModelWarmUp", "model"):
+            self.model.predict(
+                frames,
+                conf=self.confidence,
+                iou=self.iou,
+                imgsz=self.imageSize,
+                classes=self.predictionClasses,
+                verbose=False,
+            )
+
+    def __call__(self, image, results=None):
         """
         Run inference on the input image.
 
         Args:
             image (np.array): Input image or batch of images.
+            results (list, optional): yolo results already computed by track_batch for this image
         """
         # Perform detection and tracking using YOLO
-        # try:
-        results = self.model.track(
-            image,
-            conf=self.confidence,
-            iou=self.iou,
-            imgsz=self.imageSize,
-            classes=self.predictionClasses,
-            show_boxes=self.showBoxes,
-            persist=True,
-            verbose=False,
-        )
+        if results is None:
+            results = self.run_tracking(image)
         # Extract bounding boxes, class id, track_id and confidence
         self.get_bbox_track_id_conf(results)
 
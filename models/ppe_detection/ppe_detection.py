@@ -1,8 +1,12 @@
 import os
 import cv2
+import numpy as np
 from PIL import Image
 from ultralytics import YOLO
 
+from utils.camera_config.camera_config import compile_camera_config
+from utils.tracing.tracing import tracer
+
 class ppeDetectionModel:
     """
     This class will handle ppe detection .
@@ -34,6 +38,7 @@ class ppeDetectionModel:
 
         Args:
             main_config (dict): Config contents read though config.json which is main config
+            camera_config (cameraConfig or dict): camera config, gives the ppes to validate
         """
         self.ppe_model = YOLO(
             os.path.join(
@@ -41,6 +46,8 @@ class ppeDetectionModel:
             )
         )
         self.main_config =  main_config
+        # only ppes enabled by the camera are validated and reported
+        self.enabledPpe = compile_camera_config(camera_config).enabledPpe
         self.ppe_confidence = main_config["ppeDetectionModel"]["confidence"]
         self.ppe_imageSize = main_config["ppeDetectionModel"]["imageSize"]
         self.ppe_device = main_config["ppeDetectionModel"]["device"]
@@ -83,14 +90,15 @@ class ppeDetectionModel:
         Args:
             image (np.array): Array of images 
         """
-        results = self.ppe_model(
-            image,
-            conf=self.ppe_confidence,
-            iou=self.ppe_iou,
-            imgsz=self.ppe_imageSize,
-            verbose=False
-            # show_boxes = self.showBoxes,
-        )
+        with tracer.span("ppeModel", "model", {"crops": len(image)}):
+            results = self.ppe_model(
+                image,
+                conf=self.ppe_confidence,
+                iou=self.ppe_iou,
+                imgsz=self.ppe_imageSize,
+                verbose=False
+                # show_boxes = self.showBoxes,
+            )
         return results
     
     def run_bp_inference(
@@ -102,16 +110,22 @@ class ppeDetectionModel:
         Args:
             image (np.array): Array of images 
         """
-        results = self.bp_model(
-        image,
-        conf=self.bp_confidence,
-        iou=self.bp_iou,
-        imgsz=self.bp_imageSize,
-        verbose=False
-        # show_boxes = self.showBoxes,
-        )
+        with tracer.span("bodyPartModel", "model", {"crops": len(image)}):
+            results = self.bp_model(
+            image,
+            conf=self.bp_confidence,
+            iou=self.bp_iou,
+            imgsz=self.bp_imageSize,
+            verbose=False
+            # show_boxes = self.showBoxes,
+            )
         return results
 
+    def warm_up(self):
+        """Run the ppe and body part models once on self.batchSize blank person crops"""
+        self.run_ppe_inference([np.zeros((self.ppe_imageSize, self.ppe_imageSize, 3), dtype=np.uint8)] * self.batchSize)
+        self.run_bp_inference([np.zeros((self.bp_imageSize, self.bp_imageSize, 3), dtype=np.uint8)] * self.batchSize)
+
     def get_bbox_in_crop_img(self, results, croppedBboxList):
         """Extract the detection bbox information from the all results
 
@@ -185,57 +199,17 @@ class ppeDetectionModel:
         # Clear the list as we don't need this information now.
         cropList.clear()
 
-    def validate_ppe(self):
-        ppe_bboxes = self.finalPpeBboxList
-        bp_bboxes = self.finalBpBboxList
-        
-        # Initialize dictionaries for tracking PPE and body parts by track ID
-        ppe_dict = {}
-        bodypart_dict = {}
-
-        validationMapping = self.main_config["ppeDetectionModel"]["validationMapping"]
-        # Fill dictionaries with detected PPE and body parts by track ID
-        for bbox in ppe_bboxes:
-            track_id = bbox[6]
-            ppe_class = self.main_config["ppeDetectionModel"]["orignalClassList"][bbox[5]]
-            if track_id not in ppe_dict:
-                ppe_dict[track_id] = set()
-            ppe_dict[track_id].add(ppe_class)
-
-        for bbox in bp_bboxes:
-            track_id = bbox[6]
-            bp_class = self.main_config["bodyPartDetectionModel"]["orignalClassList"][bbox[5]]
-            if track_id not in bodypart_dict:
-                bodypart_dict[track_id] = set()
-            bodypart_dict[track_id].add(bp_class)
-
-        # Initialize result dictionary
-        result = {}
-
-        # Evaluate PPE presence for each track ID
-        for track_id in ppe_dict.keys() | bodypart_dict.keys():
-            result[track_id] = {}
-            ppe_present = ppe_dict.get(track_id, set())
-            bp_present = bodypart_dict.get(track_id, set())
-
-            for ppe, bodyparts in validationMapping.items():
-                # Ensure bodyparts is treated as a list for uniform handling
-                bodyparts = bodyparts if isinstance(bodyparts, list) else [bodyparts]
-                
-                # Determine if any required bodypart(s) are missing
-                bodypart_found = all(bp in bp_present for bp in bodyparts)
-
-                if ppe in ppe_present:
-                    result[track_id][ppe] = 1  # PPE is found
-                elif not bodypart_found:
-                    result[track_id][ppe] = -1  # Either PPE or at least one required body part is missing
-                else:
-                    result[track_id][ppe] = 0  # PPE is missing but all required body parts are present
-
-        self.validatedPpeResults = result
-        # Update final PPE bounding box list with validation results
-
+    def update_camera_config(self, camera_config):
+        """Validate the ppes enabled by an edited camera config, see VideoProcessor.apply_camera_config"""
+        self.enabledPpe = compile_camera_config(camera_config).enabledPpe
 
+    def validate_ppe(self):
+        """Validate ppe of every person with the body parts found on them,
+        see validate_ppe_detections
+        """
+        self.validatedPpeResults = validate_ppe_detections(
+            self.finalPpeBboxList, self.finalBpBboxList, self.main_config, self.enabledPpe
+        )
 
     def __call__(self, person_bbox, original_image, ):
         """Takes original image along with person bbox ([[xmin,ymin,xmax,ymax, track_id,confidence,class ],[xmin,ymin,xmax,ymax, track_id,confidence,class ]])
@@ -250,10 +224,78 @@ class ppeDetectionModel:
             original_image (np.array): Frame taken by cv2
             
         """
+        # Previous frame detections are kept till now so they can be recorded, clear them
+        self.finalBpBboxList.clear()
+        self.finalPpeBboxList.clear()
         # Crop the main image and infer it through ppe detection model
         self.crop_and_infer_person_bbox(original_image, person_bbox)
         self.add_final_list(self.croppedPpeBboxList,self.finalPpeBboxList,person_bbox)
         self.add_final_list(self.croppedBpBboxList,self.finalBpBboxList,person_bbox)
         self.validate_ppe()
-        self.finalBpBboxList.clear()
-        self.finalPpeBboxList.clear()
\ No newline at end of file
+
+
+
+def validate_ppe_detections(ppe_bboxes, bp_bboxes, main_config, enabled_ppe=None):
+    """Check every ppe of validationMapping for each track id.
+    1 means ppe found, 0 means ppe missing while required body parts are visible,
+    -1 means ppe missing and at least one required body part is not visible.
+    Kept outside the model class so detections can be validated without loading models.
+
+    Args:
+        ppe_bboxes (list of list): ppe detections in full image co-ords (ppeDetectionModel.finalPpeBboxList)
+        bp_bboxes (list of list): body part detections in full image co-ords (ppeDetectionModel.finalBpBboxList)
+        main_config (dict): main config, gives class lists and validationMapping
+        enabled_ppe (tuple, optional): only check these ppes, eg: cameraConfig.enabledPpe,
+                                       every ppe of validationMapping if None
+
+    Returns:
+        dict: track_id --> {ppe name: 1, 0 or -1}
+    """
+    # Initialize dictionaries for tracking PPE and body parts by track ID
+    ppe_dict = {}
+    bodypart_dict = {}
+
+    validationMapping = main_config["ppeDetectionModel"]["validationMapping"]
+    if enabled_ppe is not None:
+        validationMapping = {ppe: bodyparts for ppe, bodyparts in validationMapping.items() if ppe in enabled_ppe}
+    ppe_classes = main_config["ppeDetectionModel"]["orignalClassList"]
+    bp_classes = main_config["bodyPartDetectionModel"]["orignalClassList"]
+    # Fill dictionaries with detected PPE and body parts by track ID
+    for bbox in ppe_bboxes:
+        track_id = bbox[6]
+        ppe_class = ppe_classes[int(bbox[5])]
+        if track_id not in ppe_dict:
+            ppe_dict[track_id] = set()
+        ppe_dict[track_id].add(ppe_class)
+
+    for bbox in bp_bboxes:
+        track_id = bbox[6]
+        bp_class = bp_classes[int(bbox[5])]
+        if track_id not in bodypart_dict:
+            bodypart_dict[track_id] = set()
+        bodypart_dict[track_id].add(bp_class)
+
+    # Initialize result dictionary
+    result = {}
+
+    # Evaluate PPE presence for each track ID
+    for track_id in ppe_dict.keys() | bodypart_dict.keys():
+        result[track_id] = {}
+        ppe_present = ppe_dict.get(track_id, set())
+        bp_present = bodypart_dict.get(track_id, set())
+
+        for ppe, bodyparts in validationMapping.items():
+            # Ensure bodyparts is treated as a list for uniform handling
+            bodyparts = bodyparts if isinstance(bodyparts, list) else [bodyparts]
+
+            # Determine if any required bodypart(s) are missing
+            bodypart_found = all(bp in bp_present for bp in bodyparts)
+
+            if ppe in ppe_present:
+                result[track_id][ppe] = 1  # PPE is found
+            elif not bodypart_found:
+                result[track_id][ppe] = -1  # Either PPE or at least one required body part is missing
+            else:
+                result[track_id][ppe] = 0  # PPE is missing but all required body parts are present
+
+    return result
@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+
+
+def box_change(box_a, box_b):
+    """1 - IoU of two xmin, ymin, xmax, ymax boxes, 0 for the same box and 1 for disjoint boxes"""
+    inter_w = min(box_a[2], box_b[2]) - max(box_a[0], box_b[0])
+    inter_h = min(box_a[3], box_b[3]) - max(box_a[1], box_b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 1.0
+    inter = inter_w * inter_h
+    union = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1]) + (box_b[2] - box_b[0]) * (box_b[3] - box_b[1]) - inter
+    return 1.0 - inter / union if union > 0 else 1.0
+
+
+def select_diverse(embeddings, k):
+    """Greedy farthest point selection of k embeddings, starting from the latest one.
+    Every step adds the embedding with the largest cosine distance to the closest one
+    already selected, so near duplicates of consecutive frames are skipped.
+
+    Args:
+        embeddings (np.array): (n, dim) embeddings of one track, oldest first
+        k (int): embeddings to select
+
+    Returns:
+        np.array: (min(n, k), dim) selected embeddings, in their original order
+    """
+    if len(embeddings) <= k:
+        return embeddings
+    normalized = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    selected = [len(embeddings) - 1]
+    # cosine distance of every embedding to its closest selected one
+    min_distance = 1.0 - normalized @ normalized[-1]
+    for _ in range(k - 1):
+        min_distance[selected] = -1.0
+        index = int(np.argmax(min_distance))
+        selected.append(index)
+        min_distance = np.minimum(min_distance, 1.0 - normalized @ normalized[index])
+    return embeddings[sorted(selected)]
+
+
+class galleryUpdatePolicy:
+    """Decides which person crops are embedded and added to the reid gallery.
+
+    Consecutive frames of a track give nearly identical embeddings, so instead of every
+    person on every frame a track is updated when:
+        - it has no embedding yet, or
+        - everyKFrames frames passed since its last update, or
+        - its box changed by minBoxChange (1 - IoU) since its last update
+    and the crop is large (minCropArea) and sharp (minSharpness, variance of Laplacian)
+    enough. The first embedding of a track skips the crop checks, reid needs one.
+
+    With diversity, the gallery of a track used for matching is the noOfFrameFeatures
+    most diverse of its last diversityPoolSize embeddings instead of the latest ones.
+
+    Attributes:
+        everyKFrames (int): max frames between updates of a track, 1 updates every frame
+        minBoxChange (float): box change that triggers an update before everyKFrames, 0 to disable
+        minCropArea (int): min crop area in pixels, 0 to disable
+        minSharpness (float): min variance of Laplacian of the gray crop, 0 to disable
+        diversity (bool): select the most diverse embeddings of a track for matching
+        diversityPoolSize (int): last embeddings of a track the diverse ones are selected from
+        lastUpdates (dict): track id --> (frame id, box) of last update
+    """
+
+    def __init__(self, policy_config):
+        """
+        Args:
+            policy_config (dict): "galleryPolicy" field of "reIdModel" in main config
+        """
+        self.everyKFrames = max(1, policy_config.get("everyKFrames", 1))
+        self.minBoxChange = policy_config.get("minBoxChange", 0.0)
+        self.minCropArea = policy_config.get("minCropArea", 0)
+        self.minSharpness = policy_config.get("minSharpness", 0.0)
+        self.diversity = policy_config.get("diversity", False)
+        self.diversityPoolSize = policy_config.get("diversityPoolSize", 40)
+        self.lastUpdates = dict()
+
+    def crop_quality_ok(self, crop):
+        if self.minCropArea and crop.shape[0] * crop.shape[1] < self.minCropArea:
+            return False
+        if self.minSharpness:
+            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+            if cv2.Laplacian(gray, cv2.CV_64F).var() < self.minSharpness:
+                return False
+        return True
+
+    def should_update(self, track_id, person_box, crop, frame_id):
+        """
+        Args:
+            track_id (int): track id after reid
+            person_box (list): xmin, ymin, xmax, ymax, ...
+            crop (np.array): person crop
+            frame_id (int): frame counter of reid
+
+        Returns:
+            bool: True if the crop should be embedded and added to the gallery
+        """
+        if not crop.size:
+            return False
+        last_update = self.lastUpdates.get(track_id)
+        if last_update is None:
+            return True
+        last_frame, last_box = last_update
+        due = frame_id - last_frame >= self.everyKFrames
+        if not due and self.minBoxChange:
+            due = box_change(person_box, last_box) >= self.minBoxChange
+        return due and self.crop_quality_ok(crop)
+
+    def updated(self, track_id, person_box, frame_id):
+        """Record an update of the gallery of a track"""
+        self.lastUpdates[track_id] = (frame_id, tuple(person_box[:4]))
+
+    def forget(self, track_ids):
+        """Drop state of tracks evicted from the tracklets"""
+        for track_id in track_ids:
+            self.lastUpdates.pop(track_id, None)
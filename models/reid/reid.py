@@ -1,15 +1,25 @@
+import logging
 import os
-import pickle
-import sqlite3
 import sys
+import time
 
+import cv2
 import numpy as np
 import torch
 import torch.nn.functional as F
 
 sys.path.append("models/reid")
 from torchreid.utils import FeatureExtractor
+from torchreid.utils.quantization import list_calibration_images
 
+from models.reid.gallery_policy import galleryUpdatePolicy, select_diverse
+from utils.ann_index.ann_index import ivfIndex, normalize
+from utils.feature_store.feature_store import embeddingStore
+from utils.tracing.tracing import tracer
+from utils.track_store.track_store import trackArchive, trackStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 class reID:
@@ -21,8 +31,9 @@ class reID:
     We check new track_id's person's  crop and we calculate the cosine similarity with the last 'x' feature maps for every person ID.
     if we find confidence of match is greater than  threshold, this is not a valid new person
     The feature map that has the highest cosine similarity with the current crop will be considered as the match.
-    The previously extracted feature maps will be stored in a local database, which will be continually updated with newly
-    extracted feature maps from person crops."
+    The previously extracted feature maps will be stored in a memory-mapped embedding store, which will be continually updated
+    with newly extracted feature maps from person crops. The store is kept on disk (reIdModel.featureStore), so known
+    identities survive restarts and can be read by other processes."
 
     This class implements functionalities related to person re-identification,
     including feature extraction, database management, and re-identification process.
@@ -30,45 +41,76 @@ class reID:
     Attributes:
         device = cpu or cuda
         feature_extractor: Feature extraction model used for extracting image features.
-        local_database_name (str): Name of the local database used for storing feature maps.
+        local_database_name (str): directory of the embedding store of this camera
+        featureStore (embeddingStore): feature maps of every track id
+        trackIdOffset (int): added to tracker ids so ids of a new run don't collide with
+            identities already in a persistent store
         number_of_features_for_reid (int): Number of features used for re-identification.
         device(str) device at which we want to perform reid
         feature_extractor(FeatureExtractor object): run images through them to extract features
-        tracklets: track history of every person
+        tracklets (trackStore): last boxes of every person, tracks unseen for
+            trackStore.ttlFrames frames are evicted (and archived if configured)
+        frameId (int): frames seen by this reid, clock of the track store ttl
+        galleryPolicy (galleryUpdatePolicy): which crops are embedded and added to the gallery
+        galleryIndex (ivfIndex): mean normalized gallery feature map of every track id in the
+            store, its inner product with a normalized feature map is the average cosine
+            similarity with the gallery of the track. Searched exactly below
+            galleryIndex.exactThreshold tracks and approximately (ivf) above
+        indexedRows (int): store rows already in galleryIndex
+        trackIdMap (dict): tracker id --> reid track id it was matched to, so a matched track
+            is not re-identified again on every frame
+        identityService (identityService or identityClient): cross camera identities, None if disabled
+        globalIds (dict): track id --> global id given by identityService
         conf_threshold(float) = Confidence threshold for a valid old match
 
     Methods:
         init_feature_extractor():  method to init feature extraction model
-        init_database(): Placeholder method for initializing the local database.
+        init_database(): open the embedding store of this camera
         get_feature_maps_from_feature_extractor(): Placeholder method to get feature maps from the extractor.
+        warm_up: extract the feature map of a blank crop so the first person doesn't pay for
+            the lazy set up of the extractor
         add_feature_maps_to_database(): Placeholder method to add feature maps to the database.
         get_feature_maps_from_database(): Placeholder method to retrieve feature maps from the database.
+        get_track_gallery: feature maps of one track id used for matching
+        sync_gallery_index: update galleryIndex with tracks that got new feature maps
+        search_gallery_index: best matching track id of a feature map
         vstack_feature_maps_from_database: stack into tensor for faster calculation leveraging pytorch tensor
-        calculate_cosine_similarity: calculate cosine similarity between
+        get_track_embeddings: mean feature map of every track id, to match tracks across reid instances
+        match_global_ids: global ids of tracks from their new feature maps
+        calculate_cosine_similarity: calculate cosine similarity between, brute force over
+            every feature map, the exact reference of search_gallery_index
 
     Order of execution:
         1. __call__
         2. get_feature_maps_from_feature_extractor
-        3. get_feature_maps_from_database
-        4. vstack_feature_maps_from_database
+        3. sync_gallery_index
+        4. search_gallery_index
         5. add_feature_maps_to_database
-        6. calculate_cosine_similarity
 
 
     """
 
-    def __init__(self, camera_config, main_config):
+    def __init__(self, camera_config, main_config, local_database_name=None, identity_service=None):
         """
         Initialize a ReID (Person Re-Identification) system.
 
         Args:
             camera_config (dict): Configuration parameters for the camera.
             main_config (dict): Main configuration file
+            local_database_name (str, optional): store name inside featureStore.storeDir,
+                defaults to camID without extension. Workers processing chunks of the same
+                video need their own store
+            identity_service (identityService or identityClient, optional): gives tracks
+                of every camera global ids
 
         """
         self.device = main_config["reIdModel"]["device"]
 
-        self.local_database_name = os.path.splitext(camera_config["camID"])[0] + ".db"
+        self.featureStoreConfig = main_config["reIdModel"].get("featureStore", {})
+        self.local_database_name = os.path.join(
+            self.featureStoreConfig.get("storeDir", "reid_store"),
+            local_database_name or os.path.splitext(camera_config["camID"])[0],
+        )
         self.init_database()
         self.number_of_features_for_reid = main_config["reIdModel"]["noOfFrameFeatures"]
         self.feature_extractor = self.init_feature_extractor(
@@ -76,43 +118,91 @@ class reID:
             os.path.join(
                 main_config["modelsDir"], main_config["reIdModel"]["modelName"]
             ),
+            main_config["reIdModel"].get("backend", "torch"),
+            main_config["reIdModel"].get("optimize", False),
+            main_config["reIdModel"].get("quantization", {}),
+        )
+        store_config = main_config["reIdModel"].get("trackStore", {})
+        archive_dir = store_config.get("archiveDir")
+        self.tracklets = trackStore(
+            history_length=store_config.get("historyLength", 30),
+            ttl_frames=store_config.get("ttlFrames", 300),
+            archive_hook=trackArchive(archive_dir, camera_config["camID"]) if archive_dir else None,
         )
-        self.tracklets = dict()
+        self.frameId = 0
+        self.galleryPolicy = galleryUpdatePolicy(main_config["reIdModel"].get("galleryPolicy", {}))
+        self.galleryIndexConfig = main_config["reIdModel"].get("galleryIndex", {})
+        self.galleryIndex = None
+        self.indexedRows = 0
+        self.indexedGeneration = None
+        self.trackIdMap = dict()
+        self.camId = camera_config["camID"]
+        self.identityService = identity_service
+        self.globalIds = dict()
         self.conf_threshold = main_config["reIdModel"]["confidence"]
 
-    def init_feature_extractor(self, model_type, model_path):
+    def init_feature_extractor(
+        self, model_type, model_path, backend="torch", optimize=False, quantization_config=None
+    ):
         """
         Initialize the feature extractor for extraction person crops feature
         Args:
             model_type (str): Name of model we want to use for feature extractor
             model_path (str): Path of model weight path
+            backend (str): "torch", or "torchscript"/"onnx" to run an exported model
+                cached next to the weights
+            optimize (bool): fuse batchnorm, channels last and frozen graph, see
+                torchreid.utils.model_optimization
+            quantization_config (dict): reIdModel.quantization, int8 "mode" on cpu
+                and the person crops of "calibrationDir" for static mode
 
         """
+        quantization_config = quantization_config or {}
+        calibration = None
+        if quantization_config.get("calibrationDir"):
+            paths = list_calibration_images(
+                quantization_config["calibrationDir"], quantization_config.get("calibrationImages", 256)
+            )
+            # read like video frames, crops reach the extractor in BGR
+            calibration = [crop for crop in (cv2.imread(path) for path in paths) if crop is not None]
 
         return FeatureExtractor(
-            model_name=model_type, model_path=model_path, device=self.device
+            model_name=model_type,
+            model_path=model_path,
+            device=self.device,
+            backend=backend,
+            optimize=optimize,
+            quantize=quantization_config.get("mode"),
+            calibration=calibration,
         )
 
     def init_database(
         self,
     ):
         """
-        This function initializes the a local db to store the feature maps
-        given by self.feature_extractor
+        This function opens the embedding store of this camera which keeps the feature maps
+        given by self.feature_extractor. Tracker ids start again from 1 on every run, so
+        they are offset past the identities already in the store.
         """
-        conn = sqlite3.connect(self.local_database_name)
-        c = conn.cursor()
-
-        # Create a table for storing feature maps
-        c.execute(
-            """CREATE TABLE IF NOT EXISTS FeatureMaps
-                    (id INTEGER PRIMARY KEY,
-                    primary_key TEXT,
-                    feature_map BLOB)"""
+        self.featureStore = embeddingStore(
+            self.local_database_name,
+            dtype=self.featureStoreConfig.get("dtype", "float16"),
+            retention_seconds=self.featureStoreConfig.get("retentionSeconds"),
+            max_rows_per_track=self.featureStoreConfig.get("maxRowsPerTrack"),
+            compact_every_rows=self.featureStoreConfig.get("compactEveryRows", 50000),
         )
+        self.trackIdOffset = self.featureStore.max_track_id()
+
+    def close(self, delete=False):
+        """Close the embedding store
 
-        conn.commit()
-        conn.close()
+        Args:
+            delete (bool): also remove the store from disk
+        """
+        if delete:
+            self.featureStore.delete()
+        else:
+            self.featureStore.close()
 
     def get_feature_maps_from_feature_extractor(self, img_crop_list):
         """
@@ -126,82 +216,129 @@ class reID:
             torch.tensor: feature map in the form of tensor
 
         """
-        return self.feature_extractor(img_crop_list)
+        with tracer.span("reidFeatureExtractor", "model"):
+            return self.feature_extractor(img_crop_list)
+
+    def warm_up(self):
+        """Extract the feature map of a blank person crop, like every crop of __call__. Twice,
+        frozen and scripted extractors are optimized by torch on their second call.
+        """
+        crop = np.zeros((256, 128, 3), dtype=np.uint8)
+        for _ in range(2):
+            self.get_feature_maps_from_feature_extractor(crop)
 
     def add_feature_maps_to_database(self, feature_map, primary_key):
         """
-        Adds the feature map into our database
+        Adds the feature map into our store
         """
-        conn = sqlite3.connect(self.local_database_name)
-        c = conn.cursor()
+        with tracer.span("reidDbInsert", "reid"):
+            self.featureStore.append(int(primary_key), feature_map.detach().cpu().numpy())
 
-        # Serialize torch tensor to bytes using pickle
-        feature_map_bytes = pickle.dumps(feature_map)
+    def get_track_gallery(self, track_id):
+        """
+        Last x features of a track id, with galleryPolicy.diversity the x most diverse of
+        its last diversityPoolSize features
 
-        # Insert feature map into the database
-        c.execute(
-            """INSERT INTO FeatureMaps (primary_key, feature_map)
-                VALUES (?, ?)""",
-            (int(primary_key), feature_map_bytes),
+        Returns:
+            np.array: (x or less, 512) float32 feature maps
+        """
+        if not self.galleryPolicy.diversity:
+            return self.featureStore.get_track_rows(track_id, self.number_of_features_for_reid)
+        return select_diverse(
+            self.featureStore.get_track_rows(track_id, self.galleryPolicy.diversityPoolSize),
+            self.number_of_features_for_reid,
         )
 
-        conn.commit()
-        conn.close()
-
     def get_feature_maps_from_database(self):
         """
-        Retrive last x features from db for doing cosine similarity
+        Retrive the gallery of every track id from the store for doing cosine similarity.
 
+        Returns:
+            dict: track id --> (x or less, 512) float32 numpy array
         """
-        conn = sqlite3.connect(self.local_database_name)
-        c = conn.cursor()
-
-        # Retrieve last 10 feature maps for each primary key using a subquery
-        c.execute(
-            """SELECT id, primary_key, feature_map
-                    FROM (
-                        SELECT id, primary_key, feature_map,
-                                ROW_NUMBER() OVER (PARTITION BY primary_key ORDER BY id DESC) AS row_num
-                        FROM FeatureMaps
-                    ) AS numbered
-                    WHERE row_num <= ?""",
-            (self.number_of_features_for_reid,),
-        )
-
-        rows = c.fetchall()
-        result = {}
+        self.featureStore.flush()
+        self.featureStore.refresh()
+        return {track_id: self.get_track_gallery(track_id) for track_id in self.featureStore.rowsByTrack}
 
-        for row in rows:
-            primary_key = row[1]
-            feature_map_bytes = row[2]
-
-            # Deserialize feature map bytes back to torch tensor
-            feature_map = pickle.loads(feature_map_bytes)
-
-            if primary_key not in result:
-                result[primary_key] = []
+    def sync_gallery_index(self):
+        """
+        Update galleryIndex with the tracks that got feature maps since the last sync, from
+        this reid or any writer of the store. A compaction of the store rewrites its rows,
+        so the index is rebuilt from scratch after one.
+        """
+        store = self.featureStore
+        store.flush()
+        store.refresh()
+        if store.dim is None:
+            return
+        if self.galleryIndex is None or store.generation != self.indexedGeneration:
+            self.galleryIndex = ivfIndex(
+                store.dim,
+                nlist=self.galleryIndexConfig.get("nlist", 0),
+                nprobe=self.galleryIndexConfig.get("nprobe", 8),
+                exact_threshold=self.galleryIndexConfig.get("exactThreshold", 2048),
+            )
+            self.indexedRows = 0
+            self.indexedGeneration = store.generation
+        if store.rows <= self.indexedRows:
+            return
+        for track_id in dict.fromkeys(store.index["trackId"][self.indexedRows:store.rows].tolist()):
+            # mean of normalized feature maps, so inner product gives the average cosine similarity
+            self.galleryIndex.add(track_id, normalize(self.get_track_gallery(track_id)).mean(axis=0))
+        self.indexedRows = store.rows
+
+    def search_gallery_index(self, feature_map):
+        """
+        Args:
+            feature_map (torch.tensor): feature map of the new person crop
 
-            result[primary_key].append(feature_map)
+        Returns:
+            track id (int): track id of the best match, None for an empty gallery
+            average_similarity (float): average cosine similarity with the gallery of the match
+        """
+        query = normalize(feature_map.detach().cpu().numpy().reshape(-1))
+        track_ids, scores = self.galleryIndex.search(query, top_k=1)
+        if not track_ids:
+            return None, 0.0
+        return track_ids[0], float(scores[0])
 
-        conn.close()
+    def get_track_embeddings(self):
+        """
+        Mean of the last x feature maps of every track id in the store, used to
+        match tracks with other reid instances (eg: stitching chunks of a video)
 
-        return result
+        Returns:
+            dict: track id --> normalized embedding as float32 numpy array
+        """
+        return self.featureStore.get_track_embeddings(self.number_of_features_for_reid)
 
     def vstack_feature_maps_from_database(self, feature_maps):
         """
-        Perform vstacking of of feature maps from db for faster calculation.
-        Idea here is we query feature maps from database in form of dict and vstack
+        Perform vstacking of of feature maps from store for faster calculation.
+        Idea here is we query feature maps from store in form of dict and vstack
         all the values for every key.
         sample featuremaps = { key1: [t1,t2,t3],
-                                key2: [t1,t2,t3],}
+                                key2: [t1,t2],}
         output:[[t1,t2,t3],
-                [t1,t2,t3]]
-        """
-        tensors_by_key = [torch.stack(feature_maps[key]) for key in feature_maps]
-        output = torch.stack(tensors_by_key, dim=1)
-        return output.permute(1, 0, 2, 3)
+                [t1,t2,0]]
+        Tracks with less features are padded with zeros, counts tells how many are valid.
 
-    def calculate_cosine_similarity(self, new_tensor, old_tensor):
+        Returns:
+            torch.tensor: (ids, x, 1, 512) feature maps
+            torch.tensor: (ids,) valid feature maps of every id
+        """
+        if not feature_maps:
+            raise ValueError("no feature maps in store")
+        values = list(feature_maps.values())
+        counts = [len(value) for value in values]
+        padded = np.zeros((len(values), max(counts), values[0].shape[-1]), dtype=np.float32)
+        for index, value in enumerate(values):
+            padded[index, : len(value)] = value
+        # (ids, x, 512) --> (ids, x, 1, 512)
+        output = torch.from_numpy(padded).to(self.device).unsqueeze(2)
+        return output, torch.tensor(counts, device=self.device)
+
+    def calculate_cosine_similarity(self, new_tensor, old_tensor, gallery_track_ids=None, counts=None):
         """This will calaculate the cosine similarity with last x
             feature maps and current image feature maps. If you have value 10 for
             main_config["reIdModel"]["noOfFrameFeatures"] that means we take last 10 feature maps
@@ -211,9 +348,13 @@ class reID:
         Args:
             new_tensor (torch.tensor): New person feature map
             old_tensor (torch.tensor): last x feature maps from every person
+            gallery_track_ids (list, optional): track id of every person of old_tensor, in
+                the same order. Defaults to the tracks of self.tracklets
+            counts (torch.tensor, optional): valid feature maps of every person of old_tensor,
+                padding after them is left out of the average. Defaults to all valid
 
         Returns:
-            max index (int): Maximum index value
+            track id (int): track id of the best match
             average_similarity (float): maximim similarity score
         """
         # Reshape tensor 'new_tensor' to match the dimensions of 'old_tensor'
@@ -225,13 +366,18 @@ class reID:
         # Squeeze the output tensor to remove the singleton dimension
         cos_sim = cos_sim.squeeze(-1)
         # get avg of similarities
-        average_similarity = cos_sim.mean(dim=1)
+        if counts is None:
+            average_similarity = cos_sim.mean(dim=1)
+        else:
+            valid = torch.arange(cos_sim.shape[1], device=cos_sim.device)[None, :] < counts[:, None]
+            average_similarity = (cos_sim * valid).sum(dim=1) / counts
         # Max index of the highest similarity score
         max_index = torch.argmax(average_similarity, dim=0)
-        # get keys of tracklets
-        keys_of_tracklets = list(self.tracklets.keys())
-        # return index and value
-        return keys_of_tracklets[max_index.item()], average_similarity[max_index]
+        # rows of old_tensor follow the database, not the tracklets which may have evicted tracks
+        if gallery_track_ids is None:
+            gallery_track_ids = list(self.tracklets.keys())
+        # return track id and value
+        return gallery_track_ids[max_index.item()], average_similarity[max_index]
 
     def perform_reid(self, cropped_person, person_box, track_id):
         """Perform reid when a new track id is detected for the person
@@ -243,42 +389,57 @@ class reID:
 
         Returns:
             track_id (int): updated track id or orignal track id
+            feature map (torch.tensor): feature map of the crop, added to the gallery
         """
         # get feature map for current person crop and feature maps from db
         images_list_feature_maps = self.get_feature_maps_from_feature_extractor(
             cropped_person
         )
-        old_feature_maps_from_db = self.get_feature_maps_from_database()
+        with tracer.span("reidDbQuery", "reid"):
+            self.sync_gallery_index()
         # Sometime you will have very less number of feature (eg: first frame will not have any featured)
-        # so using try and except statement
-        try:
-            stacked_feature_maps = self.vstack_feature_maps_from_database(
-                old_feature_maps_from_db
-            )
-        except:
-            self.tracklets[track_id] = []
-            self.tracklets[track_id].append(
-                (person_box[0], person_box[1], person_box[2], person_box[3])
-            )
-            return track_id
+        if not self.galleryIndex:
+            self.tracklets.add(track_id, person_box, self.frameId)
+            return track_id, images_list_feature_maps
         # Calculate cosine similarity with new person crop and old person feature maps
-        updated_track_id, confidence = self.calculate_cosine_similarity(
-            images_list_feature_maps, stacked_feature_maps
-        )
+        with tracer.span("reidGalleryMatch", "reid", {"galleryTracks": len(self.galleryIndex)}):
+            updated_track_id, confidence = self.search_gallery_index(images_list_feature_maps)
         # if confidennce is greater than threshold, assign old track id predicted by reid model
+        # an evicted track matched again is added back to the tracklets
         if confidence >= self.conf_threshold:
             track_id = updated_track_id
-            self.tracklets[track_id].append(
-                (person_box[0], person_box[1], person_box[2], person_box[3])
-            )
-            return track_id
         # since confidence is less than predefined threshold, we assume this person is indeed a new person
-        else:
-            self.tracklets[track_id] = []
-            self.tracklets[track_id].append(
-                (person_box[0], person_box[1], person_box[2], person_box[3])
-            )
-        return track_id
+        self.tracklets.add(track_id, person_box, self.frameId)
+        return track_id, images_list_feature_maps
+
+    def forget_tracks(self, track_ids):
+        """Drop state of tracks evicted from the tracklets"""
+        if not track_ids:
+            return
+        self.galleryPolicy.forget(track_ids)
+        evicted = set(track_ids)
+        for tracker_id, track_id in list(self.trackIdMap.items()):
+            if track_id in evicted or tracker_id in evicted:
+                del self.trackIdMap[tracker_id]
+        for track_id in evicted:
+            self.globalIds.pop(track_id, None)
+
+    def match_global_ids(self, track_ids, feature_maps):
+        """Get global ids of tracks from identityService, an unreachable service is logged
+        and tracks keep their previous global id
+
+        Args:
+            track_ids (list): track ids with a new feature map on this frame
+            feature_maps (list): (1, 512) feature map of every track
+        """
+        embeddings = np.concatenate([feature_map.detach().cpu().numpy().reshape(1, -1) for feature_map in feature_maps])
+        with tracer.span("reidIdentityMatch", "reid", {"tracks": len(track_ids)}):
+            try:
+                global_ids = self.identityService.match(self.camId, track_ids, embeddings, time.time())
+            except (ConnectionError, RuntimeError) as e:
+                logger.error("Identity service match failed: %s", e)
+                return
+        self.globalIds.update(zip(track_ids, global_ids))
 
     def __call__(self, person_boxes, image):
         """
@@ -288,35 +449,63 @@ class reID:
             person_boxes(list of list): person detection results
             images (np.array): full image .
         """
+        self.frameId += 1
+        # tracks with a new feature map, matched with other cameras in one batch
+        new_track_ids, new_feature_maps = [], []
+        # forget tracks not seen for a while so memory stays flat on long streams
+        self.forget_tracks(self.tracklets.evict_expired(self.frameId))
         # iterate through all the person box
         for index, person_box in enumerate(person_boxes):
-            # get track ids
-            track_id = person_box[4]
+            # get track ids, past the identities of previous runs
+            # person detection gives the id as a 0-d tensor, which hashes by identity in tracklets
+            tracker_id = int(person_box[4]) + self.trackIdOffset
+            # tracker id already matched to an older track by reid
+            track_id = self.trackIdMap.get(tracker_id, tracker_id)
+            person_boxes[index][4] = track_id
             # crop the person image from big image
             cropped_person = image[
                 person_box[1] : person_box[3], person_box[0] : person_box[2]
             ]
 
+            images_list_feature_maps = None
             # Perform reid if new track id discovered
             if track_id not in self.tracklets:
-                updated_track_id = self.perform_reid(
+                updated_track_id, images_list_feature_maps = self.perform_reid(
                     cropped_person, person_box, track_id
                 )
+                if updated_track_id != tracker_id:
+                    self.trackIdMap[tracker_id] = updated_track_id
 
                 # Update the track_id of this person.
                 person_boxes[index][4] = updated_track_id
+                # the matched track may be due for an update, the gallery of a new one is empty
+                update_gallery = self.galleryPolicy.should_update(
+                    updated_track_id, person_box, cropped_person, self.frameId
+                )
             # since we did not not find any new track_id, we don't check for re-id
             else:
-                self.tracklets[track_id].append(
-                    (person_box[0], person_box[1], person_box[2], person_box[3])
+                self.tracklets.add(track_id, person_box, self.frameId)
+                update_gallery = self.galleryPolicy.should_update(
+                    track_id, person_box, cropped_person, self.frameId
                 )
+            if not update_gallery:
+                continue
 
-            # extract the feature maps to be stored in db
-            images_list_feature_maps = self.get_feature_maps_from_feature_extractor(
-                cropped_person
-            )
+            # extract the feature maps to be stored in db, reid already extracted them for new tracks
+            if images_list_feature_maps is None:
+                images_list_feature_maps = self.get_feature_maps_from_feature_extractor(
+                    cropped_person
+                )
             # store feature maps in db
 
             self.add_feature_maps_to_database(
                 images_list_feature_maps, person_boxes[index][4]
             )
+            self.galleryPolicy.updated(person_boxes[index][4], person_box, self.frameId)
+            if self.identityService is not None:
+                new_track_ids.append(int(person_boxes[index][4]))
+                new_feature_maps.append(images_list_feature_maps)
+        if new_track_ids:
+            self.match_global_ids(new_track_ids, new_feature_maps)
+        # make feature maps of this frame visible to other processes reading the store
+        self.featureStore.flush()
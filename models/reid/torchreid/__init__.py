@@ -1,9 +1,18 @@
 from __future__ import print_function, absolute_import
-
-from torchreid import data, optim, utils, engine, losses, models, metrics
+import importlib
 
 __version__ = "1.4.0"
 __author__ = "Kaiyang Zhou"
 __homepage__ = "https://kaiyangzhou.github.io/"
 __description__ = "Deep learning person re-identification in PyTorch"
 __url__ = "https://github.com/KaiyangZhou/deep-person-reid"
+
+# subpackages are imported on first access: feature extraction only needs utils
+# and models, while data (scipy) and engine (tensorboard) are slow to import
+__all__ = ["data", "optim", "utils", "engine", "losses", "models", "metrics"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
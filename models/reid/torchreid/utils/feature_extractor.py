@@ -10,6 +10,9 @@ from torchreid.utils import (
     compute_model_complexity,
 )
 from torchreid.models import build_model
+from torchreid.utils.inference_backend import load_inference_model
+from torchreid.utils.model_optimization import optimize_for_inference
+from torchreid.utils.quantization import load_quantized_model
 
 
 class FeatureExtractor(object):
@@ -35,6 +38,23 @@ class FeatureExtractor(object):
         pixel_norm (bool): whether to normalize pixels.
         device (str): 'cpu' or 'cuda' (could be specific gpu devices).
         verbose (bool): show model details.
+        model_complexity (bool): with verbose, count params and flops of the
+            model, which runs a forward pass hooked on every layer.
+        backend (str): inference runtime, 'torch' (eager), 'torchscript' or
+            'onnx'. The exported model is cached next to the weights, keyed by
+            their hash.
+        cache_dir (str, optional): directory of exported models, defaults to
+            the directory of the weights.
+        optimize (bool): run optimize_for_inference on the model: batchnorm
+            fused into convs, dropout removed, channels last memory format,
+            and a frozen graph with the 'torch' backend.
+        quantize (str, optional): int8 inference on cpu, 'dynamic' for linear
+            layers or 'static' for the whole network calibrated on person
+            crops. The quantized model is cached like exported models and
+            takes precedence over backend and optimize.
+        calibration (str or list, optional): directory of person crop images,
+            or a list of image paths or numpy.ndarray crops, to calibrate
+            static quantization.
 
     Examples::
 
@@ -68,6 +88,12 @@ class FeatureExtractor(object):
         pixel_norm=True,
         device="cuda",
         verbose=True,
+        model_complexity=False,
+        backend="torch",
+        cache_dir=None,
+        optimize=False,
+        quantize=None,
+        calibration=None,
     ):
         # Build model
         model = build_model(
@@ -79,10 +105,11 @@ class FeatureExtractor(object):
         model.eval()
 
         if verbose:
+            print("Model: {}".format(model_name))
+        if verbose and model_complexity:
             num_params, flops = compute_model_complexity(
                 model, (1, 3, image_size[0], image_size[1])
             )
-            print("Model: {}".format(model_name))
             print("- params: {:,}".format(num_params))
             print("- flops: {:,}".format(flops))
 
@@ -101,6 +128,21 @@ class FeatureExtractor(object):
 
         device = torch.device(device)
         model.to(device)
+        if quantize:
+            model = load_quantized_model(
+                model, model_name, model_path, quantize, image_size, device, cache_dir,
+                calibration=calibration, preprocess=preprocess, to_pil=to_pil
+            )
+        else:
+            if optimize:
+                # other backends freeze the graph when they export it
+                model = optimize_for_inference(
+                    model, freeze=backend == "torch", image_size=image_size, device=device
+                )
+            model = load_inference_model(
+                model, model_name, model_path, backend, image_size, device, cache_dir,
+                variant="optimized" if optimize else ""
+            )
 
         # Class attributes
         self.model = model
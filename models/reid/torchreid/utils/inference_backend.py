@@ -0,0 +1,183 @@
+from __future__ import absolute_import
+import os
+import hashlib
+import warnings
+import numpy as np
+import torch
+
+__all__ = ['BACKENDS', 'get_artifact_path', 'load_inference_model']
+
+# inference runtimes of FeatureExtractor, 'torch' runs the eager model
+BACKENDS = ('torch', 'torchscript', 'onnx')
+ARTIFACT_EXTENSIONS = {'torchscript': '.torchscript.pt', 'onnx': '.onnx'}
+
+
+def hash_file(path, chunk_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def get_artifact_path(model_name, model_path, backend, image_size, cache_dir=None, variant=''):
+    """Path of the exported model of a backend.
+
+    Artefacts are kept next to the weights, named after the hash of the weights,
+    model name, input size, variant and torch version, so new weights or a torch
+    upgrade export again and stale artefacts are never loaded.
+
+    Args:
+        model_name (str): model name, eg: osnet_x1_0.
+        model_path (str): path to model weights, empty for imagenet weights.
+        backend (str): 'torchscript' or 'onnx'.
+        image_size (sequence): image height and width.
+        cache_dir (str, optional): directory of the artefact, defaults to the
+            directory of the weights or the torch hub checkpoints.
+        variant (str): transformations of the exported model, eg: 'optimized'.
+    """
+    key = '{}|{}|{}x{}|{}|{}'.format(
+        model_name,
+        hash_file(model_path) if model_path and os.path.isfile(model_path) else 'imagenet',
+        image_size[0], image_size[1], variant, torch.__version__
+    )
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    if cache_dir is None:
+        if model_path:
+            cache_dir = os.path.dirname(os.path.abspath(model_path))
+        else:
+            cache_dir = os.path.join(torch.hub.get_dir(), 'checkpoints')
+    stem = os.path.splitext(os.path.basename(model_path))[0] if model_path else model_name
+    return os.path.join(
+        cache_dir, '{}.{}.{}{}'.format(stem, model_name, digest, ARTIFACT_EXTENSIONS[backend])
+    )
+
+
+def export_torchscript(model, path, image_size, device):
+    """Trace, freeze and save a model, the batch dimension stays dynamic."""
+    example = torch.randn(2, 3, image_size[0], image_size[1], device=device)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        frozen = torch.jit.freeze(traced)
+    # written aside and renamed, a concurrent loader never sees a partial file
+    frozen.save(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def export_onnx(model, path, image_size):
+    """Export a model to onnx with a dynamic batch dimension."""
+    example = torch.randn(2, 3, image_size[0], image_size[1])
+    torch.onnx.export(
+        model.cpu(),
+        example,
+        path + '.tmp',
+        input_names=['images'],
+        output_names=['features'],
+        dynamic_axes={'images': {0: 'batch'}, 'features': {0: 'batch'}},
+        opset_version=17,
+        dynamo=False,
+    )
+    os.replace(path + '.tmp', path)
+
+
+class OnnxRuntimeModel(object):
+    """Callable of an onnx model running in onnxruntime, takes and returns
+    torch tensors like the eager model.
+
+    Args:
+        path (str): onnx file.
+        device (torch.device): device of the returned features, cuda uses
+            the CUDA execution provider if onnxruntime has it.
+        num_threads (int, optional): intra op threads, defaults to onnxruntime's.
+    """
+
+    def __init__(self, path, device, num_threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        providers = ['CPUExecutionProvider']
+        if device.type == 'cuda' and 'CUDAExecutionProvider' in onnxruntime.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = onnxruntime.InferenceSession(path, options, providers=providers)
+        self.device = device
+
+    def __call__(self, images):
+        images = np.ascontiguousarray(images.detach().cpu().numpy(), dtype=np.float32)
+        features = self.session.run(['features'], {'images': images})[0]
+        return torch.from_numpy(features).to(self.device)
+
+    def eval(self):
+        return self
+
+
+def load_torchscript(path, image_size, device):
+    """Load a frozen model with the graph rewrites of optimize_for_inference,
+    which can't be saved, they are dropped if the rewritten graph fails to run.
+    Raises if the traced graph fails on another batch size than the trace's."""
+    model = torch.jit.load(path, map_location=device)
+    example = torch.randn(3, 3, image_size[0], image_size[1], device=device)
+    with torch.no_grad():
+        model(example)
+    try:
+        optimized = torch.jit.optimize_for_inference(model)
+        with torch.no_grad():
+            optimized(example)
+        return optimized
+    except Exception:
+        return torch.jit.load(path, map_location=device)
+
+
+def load_inference_model(
+    model, model_name, model_path, backend, image_size, device, cache_dir=None,
+    variant=''
+):
+    """Model running on an inference backend, exported and cached on first use.
+
+    Missing onnx or onnxruntime packages fall back to torchscript, a failed
+    export falls back to the eager model, both with a warning.
+
+    Args:
+        model (nn.Module): eager model in eval mode with its weights loaded.
+        model_name (str): model name.
+        model_path (str): path to model weights.
+        backend (str): one of BACKENDS.
+        image_size (sequence): image height and width.
+        device (torch.device): device of the model.
+        cache_dir (str, optional): directory of the artefacts.
+        variant (str): transformations already applied to model, part of the
+            artefact key.
+
+    Returns:
+        callable: takes a (B, C, H, W) tensor, returns (B, D) features.
+    """
+    if backend not in BACKENDS:
+        raise ValueError('Unknown backend {}, expected one of {}'.format(backend, BACKENDS))
+    if backend == 'onnx':
+        try:
+            import onnx  # noqa: F401
+            import onnxruntime  # noqa: F401
+        except ImportError:
+            warnings.warn('onnx or onnxruntime is not installed, using torchscript backend')
+            backend = 'torchscript'
+    if backend == 'torch':
+        return model
+
+    path = get_artifact_path(model_name, model_path, backend, image_size, cache_dir, variant)
+    try:
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if backend == 'torchscript':
+                export_torchscript(model, path, image_size, device)
+            else:
+                export_onnx(model, path, image_size)
+                model.to(device)
+            print('Exported {} {} model to "{}"'.format(model_name, backend, path))
+        if backend == 'torchscript':
+            return load_torchscript(path, image_size, device)
+        return OnnxRuntimeModel(path, device)
+    except Exception as e:
+        warnings.warn('Could not use {} backend ({}), using the eager model'.format(backend, e))
+        return model
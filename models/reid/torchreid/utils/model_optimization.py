@@ -0,0 +1,172 @@
+from __future__ import absolute_import
+import warnings
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval, fuse_linear_bn_eval
+
+__all__ = [
+    'find_fusable_pairs', 'fuse_batchnorm', 'to_channels_last', 'optimize_for_inference'
+]
+
+# layer followed by a batchnorm that can be folded into it
+FUSABLE = (
+    (nn.Conv2d, nn.BatchNorm2d, fuse_conv_bn_eval),
+    (nn.Conv1d, nn.BatchNorm1d, fuse_conv_bn_eval),
+    (nn.Linear, nn.BatchNorm1d, fuse_linear_bn_eval),
+)
+
+
+def get_fuse_fn(layer, bn):
+    for layer_type, bn_type, fuse_fn in FUSABLE:
+        if type(layer) is layer_type and type(bn) is bn_type:
+            return fuse_fn
+    return None
+
+
+def find_fusable_pairs(module, prefix=''):
+    """Find (layer, batchnorm) module pairs where the output of the layer only
+    goes to the batchnorm, from the graph traced by torch.fx. Modules that can't
+    be traced as a whole (data dependent control flow) are traced child by child.
+
+    Args:
+        module (nn.Module): module to search.
+        prefix (str): qualified name of module in the model.
+
+    Returns:
+        list: (layer name, batchnorm name) qualified names.
+    """
+    try:
+        graph = torch.fx.symbolic_trace(module).graph
+    except Exception:
+        pairs = []
+        for name, child in module.named_children():
+            pairs += find_fusable_pairs(child, prefix + name + '.')
+        return pairs
+
+    modules = dict(module.named_modules())
+    # a module called more than once shares its weights between calls
+    calls = dict()
+    for node in graph.nodes:
+        if node.op == 'call_module':
+            calls[node.target] = calls.get(node.target, 0) + 1
+    pairs = []
+    for node in graph.nodes:
+        if node.op != 'call_module' or not node.args:
+            continue
+        layer_node = node.args[0]
+        if not isinstance(layer_node, torch.fx.Node) or layer_node.op != 'call_module':
+            continue
+        if len(layer_node.users) != 1 or calls[layer_node.target] != 1 or calls[node.target] != 1:
+            continue
+        layer, bn = modules[layer_node.target], modules[node.target]
+        if get_fuse_fn(layer, bn) is None or not bn.track_running_stats:
+            continue
+        pairs.append((prefix + layer_node.target, prefix + node.target))
+    return pairs
+
+
+def set_submodule(model, name, module):
+    parent_name, _, child_name = name.rpartition('.')
+    parent = model.get_submodule(parent_name) if parent_name else model
+    setattr(parent, child_name, module)
+
+
+def fuse_batchnorm(model):
+    """Fold every batchnorm that directly follows a conv or linear layer into the
+    layer, the batchnorm is replaced by nn.Identity so forward code is unchanged.
+
+    Args:
+        model (nn.Module): model in eval mode.
+
+    Returns:
+        int: number of fused batchnorms.
+    """
+    if model.training:
+        raise ValueError('Batchnorm can only be fused in eval mode')
+    pairs = find_fusable_pairs(model)
+    for layer_name, bn_name in pairs:
+        layer, bn = model.get_submodule(layer_name), model.get_submodule(bn_name)
+        set_submodule(model, layer_name, get_fuse_fn(layer, bn)(layer, bn))
+        set_submodule(model, bn_name, nn.Identity())
+    return len(pairs)
+
+
+def remove_dropout(model):
+    """Replace dropout layers, no-ops in eval mode, by nn.Identity."""
+    names = [
+        name for name, module in model.named_modules()
+        if isinstance(module, (nn.Dropout, nn.Dropout2d, nn.AlphaDropout))
+    ]
+    for name in names:
+        set_submodule(model, name, nn.Identity())
+    return len(names)
+
+
+def to_channels_last(model, example):
+    """Convert a model to channels last memory format if its forward supports
+    it, views of non contiguous activations (eg: pcb) keep the model contiguous.
+
+    Returns:
+        bool: True if the model was converted.
+    """
+    model.to(memory_format=torch.channels_last)
+    try:
+        with torch.no_grad():
+            model(example)
+        return True
+    except RuntimeError:
+        model.to(memory_format=torch.contiguous_format)
+        return False
+
+
+def optimize_for_inference(
+    model, channels_last=True, freeze=False, image_size=(256, 128), device=None
+):
+    """Turn a training form torchreid model into an inference one:
+        - batchnorm folded into the conv or linear layer before it
+        - dropout removed
+        - channels last memory format for conv weights
+        - optionally traced and frozen by TorchScript, which also fuses
+          conv + relu and prepacks weights for the cpu kernels
+
+    Features match the unoptimized model up to float rounding.
+
+    Args:
+        model (nn.Module): model with its weights loaded.
+        channels_last (bool): convert to channels last memory format, activations
+            follow the conv weights so inputs need no conversion.
+        freeze (bool): return a frozen TorchScript module, the fused eager
+            model is returned if the traced graph fails or depends on the
+            batch size.
+        image_size (sequence): image height and width, used to trace.
+        device (torch.device, optional): device of the trace input.
+
+    Returns:
+        nn.Module or torch.jit.ScriptModule: optimized model.
+    """
+    model.eval()
+    fuse_batchnorm(model)
+    remove_dropout(model)
+    example = torch.randn(2, 3, image_size[0], image_size[1], device=device)
+    if channels_last:
+        to_channels_last(model, example)
+    if not freeze:
+        return model
+    # traces that record the batch size (eg: shufflenet channel shuffle) fail on another
+    check = torch.randn(3, 3, image_size[0], image_size[1], device=device)
+    try:
+        with torch.no_grad():
+            frozen = torch.jit.freeze(torch.jit.trace(model, example))
+            frozen(check)
+    except Exception as e:
+        warnings.warn('Could not freeze {} ({}), using the fused eager model'.format(
+            type(model).__name__, str(e).strip().splitlines()[-1]))
+        return model
+    try:
+        # some rewritten ops only fail when run, eg: mkldnn adaptive pooling
+        optimized = torch.jit.optimize_for_inference(frozen)
+        with torch.no_grad():
+            optimized(check)
+        return optimized
+    except Exception:
+        return frozen
@@ -0,0 +1,175 @@
+from __future__ import absolute_import
+import os
+import hashlib
+import warnings
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from torchreid.utils.inference_backend import export_torchscript, get_artifact_path
+
+__all__ = [
+    'QUANTIZATION_MODES', 'list_calibration_images', 'quantize_dynamic_model',
+    'quantize_static_model', 'load_quantized_model'
+]
+
+# 'dynamic' quantizes linear weights, activations at run time, 'static' quantizes
+# convs and linears with activation ranges observed on calibration crops
+QUANTIZATION_MODES = ('dynamic', 'static')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FeatureModel(nn.Module):
+    """Forward of a torchreid model with its keyword arguments left to their
+    defaults, so torch.fx traces a graph without control flow on them."""
+
+    def __init__(self, model):
+        super(FeatureModel, self).__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x)
+
+
+def list_calibration_images(calibration, num_images=256):
+    """Calibration crops evenly sampled from a directory or a list.
+
+    Args:
+        calibration (str or list): directory of person crop images, or a list
+            of image paths or numpy.ndarray crops.
+        num_images (int): max number of crops.
+
+    Returns:
+        list: image paths or numpy.ndarray crops.
+    """
+    if isinstance(calibration, str):
+        calibration = sorted(
+            os.path.join(calibration, name) for name in os.listdir(calibration)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    calibration = list(calibration)
+    if len(calibration) > num_images:
+        indices = np.linspace(0, len(calibration) - 1, num_images).round().astype(int)
+        calibration = [calibration[i] for i in indices]
+    return calibration
+
+
+def calibration_key(images):
+    """Short hash of calibration crops, part of the quantized artefact key."""
+    sha1 = hashlib.sha1()
+    for image in images:
+        if isinstance(image, str):
+            sha1.update(os.path.abspath(image).encode('utf-8'))
+        else:
+            sha1.update(np.ascontiguousarray(image).tobytes())
+    return sha1.hexdigest()[:8]
+
+
+def iter_calibration_batches(images, preprocess, to_pil, batch_size):
+    for start in range(0, len(images), batch_size):
+        batch = []
+        for image in images[start:start + batch_size]:
+            if isinstance(image, str):
+                image = Image.open(image).convert('RGB')
+            else:
+                image = to_pil(image)
+            batch.append(preprocess(image))
+        yield torch.stack(batch, dim=0)
+
+
+def quantize_dynamic_model(model):
+    """Linear layers with int8 weights, activations quantized on the fly."""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static_model(model, batches, image_size, engine=None):
+    """Post training static quantization with torch.fx graph mode: convs and
+    linears (batchnorm and relu fused in) run in int8 with activation scales
+    observed on calibration batches.
+
+    Args:
+        model (nn.Module): model in eval mode on cpu.
+        batches (iterable): calibration image batches, preprocessed like the
+            extractor inputs.
+        image_size (sequence): image height and width.
+        engine (str, optional): quantized cpu kernels, eg: 'x86' or 'qnnpack'
+            (arm), defaults to torch.backends.quantized.engine.
+
+    Returns:
+        torch.fx.GraphModule: quantized model.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    if engine is None:
+        engine = torch.backends.quantized.engine
+    torch.backends.quantized.engine = engine
+    example = torch.randn(2, 3, image_size[0], image_size[1])
+    prepared = prepare_fx(FeatureModel(model).eval(), get_default_qconfig_mapping(engine), (example, ))
+    with torch.no_grad():
+        for batch in batches:
+            prepared(batch)
+    return convert_fx(prepared).eval()
+
+
+def load_quantized_model(
+    model, model_name, model_path, mode, image_size, device, cache_dir=None,
+    calibration=None, preprocess=None, to_pil=None, num_images=256, batch_size=32
+):
+    """Int8 model for cpu inference, quantized and cached as a frozen
+    TorchScript model on first use.
+
+    Static quantization without calibration crops falls back to dynamic, any
+    other failure to the float model, both with a warning.
+
+    Args:
+        model (nn.Module): float model in eval mode with its weights loaded.
+        model_name (str): model name.
+        model_path (str): path to model weights.
+        mode (str): one of QUANTIZATION_MODES.
+        image_size (sequence): image height and width.
+        device (torch.device): device of the extractor, must be cpu.
+        cache_dir (str, optional): directory of the artefacts.
+        calibration (str or list, optional): calibration crops of static mode,
+            see list_calibration_images.
+        preprocess (callable): transform of a PIL image to an input tensor.
+        to_pil (callable): transform of a numpy.ndarray crop to a PIL image.
+        num_images (int): max number of calibration crops.
+        batch_size (int): calibration batch size.
+
+    Returns:
+        callable: takes a (B, C, H, W) tensor, returns (B, D) features.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError('Unknown quantization {}, expected one of {}'.format(mode, QUANTIZATION_MODES))
+    if device.type != 'cpu':
+        warnings.warn('Quantized models run on cpu only, using the float model on {}'.format(device))
+        return model
+    images = list_calibration_images(calibration, num_images) if calibration is not None else []
+    if mode == 'static' and not images:
+        warnings.warn('No calibration crops for static quantization, using dynamic quantization')
+        mode = 'dynamic'
+
+    variant = 'int8-{}'.format(mode)
+    if mode == 'static':
+        variant += '-{}-{}'.format(torch.backends.quantized.engine, calibration_key(images))
+    path = get_artifact_path(model_name, model_path, 'torchscript', image_size, cache_dir, variant)
+    try:
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if mode == 'static':
+                batches = iter_calibration_batches(images, preprocess, to_pil, batch_size)
+                quantized = quantize_static_model(model, batches, image_size)
+            else:
+                quantized = quantize_dynamic_model(model)
+            export_torchscript(quantized, path, image_size, device)
+            print('Exported {} {} int8 model to "{}"'.format(model_name, mode, path))
+        quantized = torch.jit.load(path, map_location=device)
+        # traced with a batch of 2, fails here if the graph kept that size
+        with torch.no_grad():
+            quantized(torch.randn(3, 3, image_size[0], image_size[1]))
+        return quantized
+    except Exception as e:
+        warnings.warn('Could not quantize {} ({}), using the float model'.format(model_name, e))
+        return model
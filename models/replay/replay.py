@@ -0,0 +1,152 @@
+import logging
+
+from models.fall_detection.fall_detection import validate_fall_probs
+from models.ppe_detection.ppe_detection import validate_ppe_detections
+from utils.camera_config.camera_config import compile_camera_config
+from utils.detection_log import detection_log
+
+logging.basicConfig(level=logging.INFO)
+
+
+class replayPersonDetectionModel:
+    """Drop-in for personDetectionModel that reads person tracks from a detection log.
+    Tracks were recorded after reid so replayReID does nothing.
+    Confidence is re-applied so it can only be raised compared to the recorded run.
+    """
+
+    def __init__(self, main_config, log_reader):
+        self.logReader = log_reader
+        self.confidence = main_config["PersonDetectionModel"]["confidence"]
+        self.personBboxes = list()
+
+    def __call__(self, image, results=None):
+        for row in self.logReader.get(detection_log.PERSON):
+            if row[5] < self.confidence:
+                continue
+            self.personBboxes.append(
+                [int(row[0]), int(row[1]), int(row[2]), int(row[3]), float(row[4]), float(row[5]), float(row[6])]
+            )
+
+
+class replayReID:
+    """Drop-in for reID, recorded person tracks already have their reid track ids"""
+
+    def __init__(self):
+        self.tracklets = dict()
+
+    def __call__(self, person_boxes, image):
+        return
+
+
+class replayPpeDetectionModel:
+    """Drop-in for ppeDetectionModel, reads ppe and body part boxes from a detection log
+    and runs the ppe validation with current validationMapping, confidences and ppes
+    enabled by the camera.
+    """
+
+    def __init__(self, main_config, log_reader, camera_config=None):
+        self.main_config = main_config
+        self.enabledPpe = None if camera_config is None else compile_camera_config(camera_config).enabledPpe
+        self.logReader = log_reader
+        self.ppe_confidence = main_config["ppeDetectionModel"]["confidence"]
+        self.bp_confidence = main_config["bodyPartDetectionModel"]["confidence"]
+        self.finalPpeBboxList = list()
+        self.finalBpBboxList = list()
+        self.validatedPpeResults = {}
+
+    def update_camera_config(self, camera_config):
+        """Validate the ppes enabled by an edited camera config"""
+        self.enabledPpe = compile_camera_config(camera_config).enabledPpe
+
+    def __call__(self, person_bbox, original_image):
+        self.finalPpeBboxList = [
+            row.tolist() for row in self.logReader.get(detection_log.PPE) if row[4] >= self.ppe_confidence
+        ]
+        self.finalBpBboxList = [
+            row.tolist() for row in self.logReader.get(detection_log.BODYPART) if row[4] >= self.bp_confidence
+        ]
+        self.validatedPpeResults = validate_ppe_detections(
+            self.finalPpeBboxList, self.finalBpBboxList, self.main_config, self.enabledPpe
+        )
+
+
+class replayFallDetectionModel:
+    """Drop-in for fallDetectionModel, re-applies fall_confidence on recorded classifier outputs"""
+
+    def __init__(self, main_config, log_reader):
+        self.logReader = log_reader
+        self.fall_confidence = main_config["fallDetectionModel"]["fall_confidence"]
+        self.fall_result = list()
+        self.fall_probs = list()
+
+    def __call__(self, frame, person_bboxes):
+        self.fall_probs = self.logReader.get(detection_log.FALL).tolist()
+        self.fall_result = validate_fall_probs(self.fall_probs, self.fall_confidence)
+
+
+class replayFireSmokeDetectionModel:
+    """Drop-in for FireSmokeDetectionModel, reads fire and smoke boxes from a detection log"""
+
+    def __init__(self, main_config, log_reader):
+        self.logReader = log_reader
+        self.conf = main_config["FireSmokeDetectionModel"]["confidence"]
+        self.fire_bboxes = []
+        self.smoke_bboxes = []
+        self.fire_detected = False
+        self.smoke_detected = False
+
+    def __call__(self, image, results=None):
+        self.fire_bboxes = [
+            [int(row[0]), int(row[1]), int(row[2]), int(row[3]), float(row[4])]
+            for row in self.logReader.get(detection_log.FIRE)
+            if row[4] >= self.conf
+        ]
+        self.smoke_bboxes = [
+            [int(row[0]), int(row[1]), int(row[2]), int(row[3]), float(row[4])]
+            for row in self.logReader.get(detection_log.SMOKE)
+            if row[4] >= self.conf
+        ]
+        self.fire_detected = bool(self.fire_bboxes)
+        self.smoke_detected = bool(self.smoke_bboxes)
+
+
+class replayGarbageDetectionModel:
+    """Drop-in for garbageDetectionModel, reads garbage boxes from a detection log"""
+
+    def __init__(self, main_config, log_reader):
+        self.logReader = log_reader
+        self.confidence = main_config["garbageDetectionModel"]["confidence"]
+        self.garbage_results = []
+
+    def __call__(self, frame, result=None):
+        for row in self.logReader.get(detection_log.GARBAGE):
+            if row[4] >= self.confidence:
+                self.garbage_results.append(row.tolist())
+
+
+class replayTriphazardDetectionModel:
+    """Drop-in for triphazardDetectionModel, reads object boxes from a detection log"""
+
+    def __init__(self, main_config, log_reader):
+        self.logReader = log_reader
+        self.confidence = main_config["triphazardDetectionModel"]["confidence"]
+        self.detection_results = []
+
+    def __call__(self, frame, result=None):
+        for row in self.logReader.get(detection_log.TRIPHAZARD):
+            if row[4] >= self.confidence:
+                self.detection_results.append(row.tolist())
+
+
+class replaySpillDetectionModel:
+    """Drop-in for spillDetectionModel, reads spill boxes from a detection log"""
+
+    def __init__(self, main_config, log_reader):
+        self.logReader = log_reader
+        self.confidence = main_config["spillDetectionModel"]["confidence"]
+        self.spill_results = []
+
+    def __call__(self, frame, result=None):
+        for row in self.logReader.get(detection_log.SPILL):
+            if row[4] >= self.confidence:
+                self.spill_results.append(row.tolist())
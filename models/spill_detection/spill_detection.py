@@ -1,4 +1,5 @@
 from ultralytics import YOLO
+import numpy as np
 import os
 
 class spillDetectionModel:
@@ -11,6 +12,7 @@ class spillDetectionModel:
         )
         self.confidence = main_config["spillDetectionModel"]["confidence"]
         self.imageSize = main_config["spillDetectionModel"]["imageSize"]
+        self.batchSize = main_config["spillDetectionModel"]["batchSize"]
         self.device = main_config["spillDetectionModel"]["device"]
         self.orignalClassList = main_config["spillDetectionModel"]["originalClassList"]
         self.spill_results = []
@@ -30,7 +32,25 @@ class spillDetectionModel:
             xmin, ymin, xmax, ymax, conf, cls_id = spill.boxes.data.tolist()[0]
             self.spill_results.append([xmin,ymin,xmax, ymax, conf])
 
-    def __call__(self,frame):
+    def predict_batch(self, frames):
+        results = []
+        for start in range(0, len(frames), self.batchSize):
+            results.extend(
+                self.model(
+                    frames[start : start + self.batchSize],
+                    imgsz=self.imageSize,
+                    conf = self.confidence,
+                    verbose=False
+                )
+            )
+        return results
+
+    def warm_up(self):
+        """Run predict_batch once on self.batchSize blank frames at self.imageSize"""
+        self.predict_batch([np.zeros((self.imageSize, self.imageSize, 3), dtype=np.uint8)] * self.batchSize)
+
+    def __call__(self,frame,result=None):
         
-        result = self.run_inference(frame)
+        if result is None:
+            result = self.run_inference(frame)
         self.extract_result(result)
@@ -1,4 +1,5 @@
 from ultralytics import YOLO
+import numpy as np
 import os
 
 class triphazardDetectionModel:
@@ -18,6 +19,7 @@ class triphazardDetectionModel:
         )
         self.confidence = main_config["triphazardDetectionModel"]["confidence"]
         self.imageSize = main_config["triphazardDetectionModel"]["imageSize"]
+        self.batchSize = main_config["triphazardDetectionModel"]["batchSize"]
         self.device = main_config["triphazardDetectionModel"]["device"]
         self.iou = main_config["triphazardDetectionModel"]["iou"]
         self.originalClassList = main_config["triphazardDetectionModel"]["originalClassList"]
@@ -47,9 +49,33 @@ class triphazardDetectionModel:
             xmin, ymin, xmax, ymax, conf, cls_id = obj.boxes.data.tolist()[0]
             self.detection_results.append([xmin, ymin, xmax, ymax, conf, cls_id])
 
-    def __call__(self, frame):
+    def predict_batch(self, frames):
+        """
+        Inference object detection model on many frames, self.batchSize frames at a time.
+        Returns one result per frame.
+
+        """
+        results = []
+        for start in range(0, len(frames), self.batchSize):
+            results.extend(
+                self.model(
+                    frames[start : start + self.batchSize],
+                    imgsz=self.imageSize,
+                    conf=self.confidence,
+                    verbose=False
+                )
+            )
+        return results
+
+    def warm_up(self):
+        """Run predict_batch once on self.batchSize blank frames at self.imageSize"""
+        self.predict_batch([np.zeros((self.imageSize, self.imageSize, 3), dtype=np.uint8)] * self.batchSize)
+
+    def __call__(self, frame, result=None):
         """
         Callable method to perform object detection on a frame.
+        result can be the output of predict_batch for this frame.
         """
-        result = self.run_inference(frame)
+        if result is None:
+            result = self.run_inference(frame)
         self.extract_result(result)
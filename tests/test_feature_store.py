@@ -0,0 +1,46 @@
+import numpy as np
+
+from utils.feature_store.feature_store import embeddingStore
+
+
+def crash(store):
+    """Writer dying between append and flush: embedding bytes are on disk, index rows are not"""
+    store.embeddingsFile.close()
+    store.indexFile.close()
+    store.lockFile.close()
+
+
+def test_reopen_after_crash_keeps_rows_aligned(tmp_path):
+    store_dir = str(tmp_path / "store")
+    store = embeddingStore(store_dir, dtype="float32")
+    store.append(1, np.full(4, 1.0))
+    store.append(2, np.full(4, 2.0))
+    store.flush()
+    store.append(9, np.full(4, 9.0))
+    crash(store)
+
+    store = embeddingStore(store_dir, dtype="float32")
+    store.append(3, np.full(4, 3.0))
+    store.flush()
+    assert store.track_ids() == [1, 2, 3]
+    assert np.asarray(store.embeddings[:, 0]).tolist() == [1.0, 2.0, 3.0]
+    store.close()
+
+
+def test_reopen_after_partial_index_row(tmp_path):
+    store_dir = str(tmp_path / "store")
+    store = embeddingStore(store_dir, dtype="float32")
+    store.append(1, np.full(4, 1.0))
+    store.flush()
+    store.append(2, np.full(4, 2.0))
+    store.embeddingsFile.flush()
+    store.indexFile.write(b"\x02\x00\x00")
+    crash(store)
+
+    store = embeddingStore(store_dir, dtype="float32")
+    assert store.rows == 1
+    store.append(3, np.full(4, 3.0))
+    store.flush()
+    assert store.track_ids() == [1, 3]
+    assert store.get_track_rows(3, 1).tolist() == [[3.0] * 4]
+    store.close()
@@ -1,4 +1,27 @@
+import importlib
+
 from .configs.config import jsonConfigParser
+from .camera_config.camera_config import (cameraConfig, cameraConfigWatcher, compile_camera_config,
+                                             load_camera_config)
 from .draw.draw import drawOnFrames
 from .results.results import jsonResultsManager
-from .video.video_downloader import S3VideoDownloader
+from .results_index.results_index import resultsIndex
+from .events.events import violationEventEngine
+from .result_cache.result_cache import resultReplayCache
+from .detection_log import detection_log
+from .detection_log.detection_log import detectionLogReader, detectionLogWriter
+from .track_stitching.track_stitching import trackStitcher, split_into_chunks
+from .profiler.profiler import stageProfiler
+from .tracing.tracing import tracer
+from .metrics.metrics import pipelineMetrics, metricsServer
+from .track_store.track_store import trackStore, trackArchive
+from .feature_store.feature_store import embeddingStore
+from .ann_index.ann_index import ivfIndex
+from .identity_service.identity_service import identityService, identityServer, identityClient, init_identity_service
+
+
+def __getattr__(name):
+    # imports boto3, only needed when videos are downloaded
+    if name == "S3VideoDownloader":
+        return importlib.import_module(".video.video_downloader", __name__).S3VideoDownloader
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
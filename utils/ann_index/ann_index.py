@@ -0,0 +1,241 @@
+import logging
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def kmeans(vectors, clusters, iterations=10, seed=0):
+    """Spherical k-means, centroids are normalized and vectors assigned by inner product
+
+    Args:
+        vectors (np.array): (n, dim) normalized float32 vectors
+        clusters (int): number of centroids
+        iterations (int): lloyd iterations
+
+    Returns:
+        np.array: (clusters, dim) normalized centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=clusters)
+        # empty clusters restart from a random vector
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+class ivfIndex:
+    """Inverted file index for maximum inner product search over reid galleries.
+
+    Vectors live in inverted lists, every list keeps its vectors in one contiguous array
+    grown by doubling, so a list is scored with a single matrix product and no copy.
+    Until exactThreshold vectors are stored there is one list, searched exactly. Then a
+    spherical k-means coarse quantiser of nlist centroids is trained and every vector is
+    moved to the list of its closest centroid, a search scores only the nprobe lists
+    closest to the query. The quantiser is retrained when the index grew retrainFactor
+    times since training. Insert and delete are O(1) besides the centroid assignment,
+    a deleted vector is replaced by the last one of its list.
+
+    Scores are exact inner products of returned vectors, only the candidate set is approximate.
+
+    Usage:
+        index = ivfIndex(512)
+        index.add(track_id, vector)
+        track_ids, scores = index.search(query, top_k=5)
+        index.remove(track_id)
+
+    Attributes:
+        dim (int): vector width
+        nlist (int): coarse centroids, 0 for sqrt(vectors) at training
+        nprobe (int): lists scored per search
+        exactThreshold (int): indexes smaller than this are searched exactly
+        retrainFactor (float): growth since last training that triggers a retraining
+        centroids (np.array): (nlist, dim) coarse centroids, None while untrained
+        listVectors (list): (capacity, dim) vectors of every list
+        listIds (list): (capacity,) ids of every list
+        listSizes (list): vectors in every list
+        positions (dict): id --> (list, position in list)
+
+    Methods:
+        add: add or replace the vector of an id
+        remove: remove the vector of an id
+        get: stored vector of an id
+        search: top k ids and scores of a query
+        search_batch: top k ids and scores of many queries
+        train: train the coarse quantiser on the stored vectors
+    """
+
+    def __init__(self, dim, nlist=0, nprobe=16, exact_threshold=2048, retrain_factor=4.0, initial_capacity=64):
+        """
+        Args:
+            dim (int): vector width
+            nlist (int): coarse centroids, 0 for sqrt(vectors) at training
+            nprobe (int): lists scored per search
+            exact_threshold (int): indexes smaller than this are searched exactly
+            retrain_factor (float): growth since last training that triggers a retraining
+            initial_capacity (int): vectors that fit in a list before it grows
+        """
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.exactThreshold = exact_threshold
+        self.retrainFactor = retrain_factor
+        self.initialCapacity = initial_capacity
+        self.centroids = None
+        self.trainedSize = 0
+        self.positions = dict()
+        self.reset_lists(1)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, vector_id):
+        return vector_id in self.positions
+
+    def reset_lists(self, lists):
+        self.listVectors = [np.zeros((self.initialCapacity, self.dim), dtype=np.float32) for _ in range(lists)]
+        self.listIds = [np.zeros(self.initialCapacity, dtype=np.int64) for _ in range(lists)]
+        self.listSizes = [0] * lists
+        self.positions = dict()
+
+    def append_to_list(self, list_id, vector_id, vector):
+        size = self.listSizes[list_id]
+        if size == len(self.listIds[list_id]):
+            self.listVectors[list_id] = np.concatenate([self.listVectors[list_id], np.zeros_like(self.listVectors[list_id])])
+            self.listIds[list_id] = np.concatenate([self.listIds[list_id], np.zeros_like(self.listIds[list_id])])
+        self.listVectors[list_id][size] = vector
+        self.listIds[list_id][size] = vector_id
+        self.listSizes[list_id] = size + 1
+        self.positions[vector_id] = (list_id, size)
+
+    def add(self, vector_id, vector):
+        """Add the vector of an id, replacing its previous vector
+
+        Args:
+            vector_id (int): id returned by search, eg: track id
+            vector (np.array): (dim,) vector
+        """
+        self.remove(vector_id)
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        list_id = 0 if self.centroids is None else int(np.argmax(self.centroids @ vector))
+        self.append_to_list(list_id, vector_id, vector)
+        if self.centroids is None:
+            if len(self.positions) >= self.exactThreshold:
+                self.train()
+        elif len(self.positions) >= self.retrainFactor * self.trainedSize:
+            self.train()
+
+    def remove(self, vector_id):
+        """Remove the vector of an id, the last vector of its list takes its place"""
+        position = self.positions.pop(vector_id, None)
+        if position is None:
+            return
+        list_id, index = position
+        last = self.listSizes[list_id] - 1
+        if index != last:
+            moved_id = int(self.listIds[list_id][last])
+            self.listVectors[list_id][index] = self.listVectors[list_id][last]
+            self.listIds[list_id][index] = moved_id
+            self.positions[moved_id] = (list_id, index)
+        self.listSizes[list_id] = last
+
+    def get(self, vector_id):
+        """
+        Returns:
+            np.array: (dim,) copy of the vector of an id, None if not stored
+        """
+        position = self.positions.get(vector_id)
+        if position is None:
+            return None
+        return self.listVectors[position[0]][position[1]].copy()
+
+    def get_vectors(self):
+        """
+        Returns:
+            np.array: (vectors, dim) stored vectors
+            np.array: (vectors,) their ids
+        """
+        if len(self.listSizes) == 1:
+            # untrained index, no copy
+            return self.listVectors[0][: self.listSizes[0]], self.listIds[0][: self.listSizes[0]]
+        vectors = np.concatenate([vectors[:size] for vectors, size in zip(self.listVectors, self.listSizes)])
+        ids = np.concatenate([ids[:size] for ids, size in zip(self.listIds, self.listSizes)])
+        return vectors, ids
+
+    def train(self):
+        """Train the coarse quantiser on the stored vectors and rebuild the lists"""
+        vectors, ids = self.get_vectors()
+        nlist = self.nlist or int(np.sqrt(len(ids)))
+        nlist = max(1, min(nlist, len(ids)))
+        self.centroids = kmeans(normalize(vectors), nlist)
+        self.trainedSize = len(ids)
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        self.reset_lists(nlist)
+        for vector_id, vector, list_id in zip(ids.tolist(), vectors, assignment.tolist()):
+            self.append_to_list(list_id, vector_id, vector)
+        logger.info("Trained ivf index of %d vectors with %d lists", len(ids), nlist)
+
+    def search(self, query, top_k=1, exact=False):
+        """
+        Args:
+            query (np.array): (dim,) query vector
+            top_k (int): results returned
+            exact (bool): score every vector, eg: to measure recall
+
+        Returns:
+            (list, np.array): ids and inner product scores, best first
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if exact or self.centroids is None:
+            probes = range(len(self.listSizes))
+        else:
+            probes = np.argsort(-(self.centroids @ query))[: self.nprobe].tolist()
+        probes = [list_id for list_id in probes if self.listSizes[list_id]]
+        if not probes:
+            return [], np.zeros(0, dtype=np.float32)
+        scores = np.concatenate([self.listVectors[list_id][: self.listSizes[list_id]] @ query for list_id in probes])
+        ids = np.concatenate([self.listIds[list_id][: self.listSizes[list_id]] for list_id in probes])
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return ids[best].tolist(), scores[best]
+
+    def search_batch(self, queries, top_k=1, exact=False):
+        """Search many queries at once, an exact search scores all of them with one matrix product
+
+        Args:
+            queries (np.array): (queries, dim) query vectors
+            top_k (int): results returned per query
+            exact (bool): score every vector
+
+        Returns:
+            list of (list, np.array): ids and scores of every query, best first
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if not (exact or self.centroids is None):
+            return [self.search(query, top_k) for query in queries]
+        vectors, ids = self.get_vectors()
+        if not len(ids):
+            return [([], np.zeros(0, dtype=np.float32)) for _ in queries]
+        scores = queries @ vectors.T
+        top_k = min(top_k, len(ids))
+        best = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        return [(ids[row].tolist(), row_scores) for row, row_scores in zip(best, best_scores)]
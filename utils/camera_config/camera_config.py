@@ -0,0 +1,418 @@
+import copy
+import logging
+import os
+import time
+import types
+
+import cv2
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+from utils.configs.config import jsonConfigParser
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# keys of camera config "analytics", a missing key disables the analytic
+ANALYTICS_KEYS = (
+    "personDetectionCounting",
+    "personInZoneCounting",
+    "ppeDetection",
+    "fallDetection",
+    "fire_smoke_detection",
+    "garbageDetection",
+    "tripHazardDetection",
+    "spillDetection",
+)
+
+
+def _freeze(value):
+    """Read only copy of a json value, dicts become mappingproxy and lists tuples"""
+    if isinstance(value, dict):
+        return types.MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class cameraZone:
+    """A zone of the camera config with its geometry built once, instead of a shapely
+    Polygon per person per frame.
+
+    Attributes:
+        key (str): key of the zone in camera config "zones" or "tripzones"
+        name (str): name of the zone, key of personCountInZone results
+        id (int): id of the zone
+        zonePoints (tuple): (x, y) points of the zone, empty if the zone is not drawn
+        polygon (shapely.Polygon): prepared polygon of zonePoints, None without points
+        bounds (tuple): (xmin, ymin, xmax, ymax) of the polygon, None without points
+
+    Methods:
+        contains: True for points strictly inside the zone, same as shapely Point.within
+        overlay: raster of the zone on a frame of a given size, used for drawing
+    """
+
+    __slots__ = ("key", "name", "id", "zonePoints", "polygon", "bounds", "_overlays")
+
+    def __init__(self, key, name, zone_id, zone_points):
+        self.key = key
+        self.name = name
+        self.id = zone_id
+        self.zonePoints = tuple(tuple(point) for point in zone_points)
+        self.polygon = None
+        self.bounds = None
+        if self.zonePoints:
+            self.polygon = Polygon(self.zonePoints)
+            shapely.prepare(self.polygon)
+            self.bounds = self.polygon.bounds
+        self._overlays = dict()
+
+    def contains(self, x, y):
+        """
+        Args:
+            x (float or np.array): x co-ord(s) of the points
+            y (float or np.array): y co-ord(s) of the points
+
+        Returns:
+            bool or np.array: True for points inside the zone, points on its border are outside
+        """
+        if self.polygon is None:
+            return np.zeros(np.shape(x), dtype=bool) if np.ndim(x) else False
+        return shapely.contains_xy(self.polygon, x, y)
+
+    def overlay(self, height, width, color):
+        """Raster of the zone filled with color, cropped to the part of the frame it covers.
+        Points are clamped to the frame size like drawOnFrames.clamp_point. Rasters are
+        cached per frame size and color.
+
+        Args:
+            height (int): frame height
+            width (int): frame width
+            color (tuple): BGR color of the zone
+
+        Returns:
+            tuple or None: (row slice, column slice, raster) of the frame, None if the zone
+                           has no points or does not cover any pixel of the frame
+        """
+        key = (height, width, tuple(color))
+        if key not in self._overlays:
+            self._overlays[key] = self._rasterize(height, width, color)
+        return self._overlays[key]
+
+    def _rasterize(self, height, width, color):
+        if not self.zonePoints:
+            return None
+        mask = np.zeros((height, width), dtype=np.uint8)
+        points = np.array([[min(x, width), min(y, height)] for x, y in self.zonePoints], dtype=np.int32)
+        cv2.fillPoly(mask, [points], color=255)
+        rows = np.flatnonzero(mask.any(axis=1))
+        columns = np.flatnonzero(mask.any(axis=0))
+        if not len(rows):
+            return None
+        rows = slice(rows[0], rows[-1] + 1)
+        columns = slice(columns[0], columns[-1] + 1)
+        raster = np.zeros(mask[rows, columns].shape + (3,), dtype=np.uint8)
+        raster[mask[rows, columns] > 0] = color[:3]
+        return rows, columns, raster
+
+
+class cameraConfig:
+    """Camera config validated and compiled once when it is loaded. What stages used to
+    derive from the raw dict on every frame (enabled ppes, zone polygons, zone names of the
+    results templates) is computed here and shared by all of them. It is read only,
+    config["key"] and config.get("key") still give the config as read, with missing
+    analytics filled in.
+
+    Attributes:
+        source (str): where the config was read from, used in errors
+        camID (str): camera id
+        description (str): description of the camera
+        analytics (mappingproxy): every key of ANALYTICS_KEYS --> bool
+        visualizeAnalytics (bool): draw the results
+        enabledPpe (tuple): names of ppes set to true in "ppeDetection", in config order
+        zones (tuple): cameraZone of every zone in "zones"
+        zonesByName (mappingproxy): zone name --> cameraZone
+        zoneNames (tuple): names of zones, keys of personCountInZone results
+        tripzones (tuple): cameraZone of every zone in "tripzones"
+        tripZoneIds (tuple): str ids of trip zones, keys of triphazardDetection results
+
+    Methods:
+        enabled: True if the camera enables an analytic
+        as_dict: copy of the config as read, eg: to hash it
+    """
+
+    __slots__ = (
+        "source", "camID", "description", "analytics", "visualizeAnalytics", "enabledPpe",
+        "zones", "zonesByName", "zoneNames", "tripzones", "tripZoneIds", "_raw", "_frozen",
+    )
+
+    def __init__(self, camera_config, source="camera config"):
+        """
+        Args:
+            camera_config (dict): validated camera config, see compile_camera_config
+            source (str): where the config was read from
+        """
+        set_attribute = super().__setattr__
+        analytics = dict(camera_config.get("analytics", {}))
+        for key in ANALYTICS_KEYS:
+            analytics.setdefault(key, False)
+        zones = tuple(
+            cameraZone(key, zone["name"], zone["id"], zone.get("zonePoints", []))
+            for key, zone in camera_config.get("zones", {}).items()
+        )
+        tripzones = tuple(
+            cameraZone(key, zone.get("name", key), zone["id"], zone.get("zonePoints", []))
+            for key, zone in camera_config.get("tripzones", {}).items()
+        )
+        set_attribute("source", source)
+        set_attribute("camID", camera_config["camID"])
+        set_attribute("description", camera_config.get("description", ""))
+        set_attribute("analytics", types.MappingProxyType(analytics))
+        set_attribute("visualizeAnalytics", camera_config.get("visualizeAnalytics", True))
+        set_attribute("enabledPpe", tuple(ppe for ppe, status in camera_config.get("ppeDetection", {}).items() if status))
+        set_attribute("zones", zones)
+        set_attribute("zonesByName", types.MappingProxyType({zone.name: zone for zone in zones}))
+        set_attribute("zoneNames", tuple(zone.name for zone in zones))
+        set_attribute("tripzones", tripzones)
+        set_attribute("tripZoneIds", tuple(str(zone.id) for zone in tripzones))
+        set_attribute("_raw", copy.deepcopy(camera_config))
+        set_attribute("_frozen", _freeze(dict(camera_config, analytics=analytics)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("camera config {} is read only".format(self.source))
+
+    def __getitem__(self, key):
+        return self._frozen[key]
+
+    def __contains__(self, key):
+        return key in self._frozen
+
+    def get(self, key, default=None):
+        return self._frozen.get(key, default)
+
+    def enabled(self, analytic):
+        """
+        Args:
+            analytic (str): key of "analytics", eg: "fallDetection"
+
+        Returns:
+            bool: True if the analytic runs for this camera
+        """
+        return self.analytics.get(analytic, False)
+
+    def as_dict(self):
+        """
+        Returns:
+            dict: deep copy of the config as read, result cache keys hash it
+        """
+        return copy.deepcopy(self._raw)
+
+
+def _zone_errors(zones, section, require_name):
+    """Schema errors of "zones" or "tripzones" of a camera config"""
+    errors = []
+    if not isinstance(zones, dict):
+        return ["{} must be an object of zones, got {!r}".format(section, zones)]
+    names, ids = dict(), dict()
+    for key, zone in zones.items():
+        path = "{}.{}".format(section, key)
+        if not isinstance(zone, dict):
+            errors.append("{} must be an object, got {!r}".format(path, zone))
+            continue
+        name = zone.get("name")
+        if require_name or "name" in zone:
+            if not isinstance(name, str) or not name:
+                errors.append("{}.name must be a non empty string, got {!r}".format(path, name))
+            elif name in names:
+                errors.append("{}.name {!r} is also the name of {}.{}".format(path, name, section, names[name]))
+            else:
+                names[name] = key
+        zone_id = zone.get("id")
+        if not isinstance(zone_id, int) or isinstance(zone_id, bool):
+            errors.append("{}.id must be an integer, got {!r}".format(path, zone_id))
+        elif not require_name and zone_id in ids:
+            # trip hazard results are keyed by zone id
+            errors.append("{}.id {} is also the id of {}.{}".format(path, zone_id, section, ids[zone_id]))
+        else:
+            ids[zone_id] = key
+        points = zone.get("zonePoints", [])
+        if not isinstance(points, list) or not all(
+            isinstance(point, list) and len(point) == 2 and all(_is_number(value) for value in point)
+            for point in points
+        ):
+            errors.append("{}.zonePoints must be a list of [x, y] numbers, got {!r}".format(path, points))
+        elif 0 < len(points) < 3:
+            errors.append("{}.zonePoints needs at least 3 points for a polygon, got {}".format(path, len(points)))
+    return errors
+
+
+def validate_camera_config(camera_config, main_config=None, source="camera config"):
+    """Check the schema of a camera config, every problem is reported at once.
+    Unknown analytics are only logged, eg: a typo in a key disables an analytic
+    like it always did.
+
+    Args:
+        camera_config (dict): camera config as read from json
+        main_config (dict, optional): main config, ppe names are checked against its
+                                      ppeDetectionModel validationMapping when given
+        source (str): where the config was read from, used in errors
+
+    Raises:
+        ValueError: listing every schema error of the config
+    """
+    if not isinstance(camera_config, dict):
+        raise ValueError("invalid camera config {}: must be a json object, got {!r}".format(source, camera_config))
+    errors = []
+    cam_id = camera_config.get("camID")
+    if not isinstance(cam_id, str) or not cam_id:
+        errors.append("camID must be a non empty string, got {!r}".format(cam_id))
+    if not isinstance(camera_config.get("description", ""), str):
+        errors.append("description must be a string, got {!r}".format(camera_config["description"]))
+    if not isinstance(camera_config.get("visualizeAnalytics", True), bool):
+        errors.append("visualizeAnalytics must be true or false, got {!r}".format(camera_config["visualizeAnalytics"]))
+
+    analytics = camera_config.get("analytics")
+    if not isinstance(analytics, dict):
+        errors.append("analytics must be an object of analytic --> true/false, got {!r}".format(analytics))
+        analytics = dict()
+    for key, status in analytics.items():
+        if not isinstance(status, bool):
+            errors.append("analytics.{} must be true or false, got {!r}".format(key, status))
+        if key not in ANALYTICS_KEYS:
+            logger.warning("%s: unknown analytic %r is ignored, known analytics are %s", source, key, ", ".join(ANALYTICS_KEYS))
+
+    ppe_detection = camera_config.get("ppeDetection", {})
+    if not isinstance(ppe_detection, dict):
+        errors.append("ppeDetection must be an object of ppe --> true/false, got {!r}".format(ppe_detection))
+        ppe_detection = dict()
+    known_ppe = None
+    if main_config is not None:
+        known_ppe = main_config.get("ppeDetectionModel", {}).get("validationMapping")
+    for ppe, status in ppe_detection.items():
+        if not isinstance(status, bool):
+            errors.append("ppeDetection.{} must be true or false, got {!r}".format(ppe, status))
+        if known_ppe is not None and ppe not in known_ppe:
+            errors.append("ppeDetection.{} is not a ppe of the main config, known ppes are {}".format(ppe, ", ".join(known_ppe)))
+    if analytics.get("ppeDetection") is True and not any(status is True for status in ppe_detection.values()):
+        logger.warning(
+            "%s: analytics-->ppeDetection is true but all ppes from ppeDetection are false. Please double check", source
+        )
+
+    for section, analytic, require_name in (("zones", "personInZoneCounting", True), ("tripzones", "tripHazardDetection", False)):
+        if section in camera_config:
+            errors.extend(_zone_errors(camera_config[section], section, require_name))
+        elif analytics.get(analytic) is True:
+            errors.append("{} is missing, analytics.{} needs it".format(section, analytic))
+
+    if errors:
+        raise ValueError("invalid camera config {}:\n    {}".format(source, "\n    ".join(errors)))
+
+
+def compile_camera_config(camera_config, main_config=None, source="camera config"):
+    """Validate and compile a camera config, compiled configs are returned as they are
+
+    Args:
+        camera_config (dict or cameraConfig): camera config
+        main_config (dict, optional): main config, see validate_camera_config
+        source (str): where the config was read from, used in errors
+
+    Returns:
+        cameraConfig: compiled camera config
+
+    Raises:
+        ValueError: if the config does not match the schema
+    """
+    if isinstance(camera_config, cameraConfig):
+        return camera_config
+    validate_camera_config(camera_config, main_config, source)
+    return cameraConfig(camera_config, source)
+
+
+def load_camera_config(config_file, main_config=None):
+    """Read and compile a camera config file
+
+    Args:
+        config_file (str): path of camera config json
+        main_config (dict, optional): main config, see validate_camera_config
+
+    Returns:
+        cameraConfig or None: compiled config, None if the file can not be read
+
+    Raises:
+        ValueError: if the config does not match the schema
+    """
+    camera_config = jsonConfigParser(config_file).config
+    if not camera_config:
+        return None
+    return compile_camera_config(camera_config, main_config, config_file)
+
+
+class cameraConfigWatcher:
+    """Watches the camera config file of the running video, so zones and analytics can be
+    edited without a restart. The file is stat-ed at most every pollInterval seconds, on
+    the thread processing frames, and only re-read when its mtime or size changed.
+
+    Attributes:
+        configFile (str): path of camera config json
+        mainConfig (dict): main config, see validate_camera_config
+        pollInterval (float): minimum seconds between two stats of the file
+        cameraConfig (cameraConfig): last valid config of the file
+        lastPoll (float): time.monotonic of the last stat
+        signature (tuple): (mtime ns, size) of the file at the last stat, None if missing
+
+    Methods:
+        poll: compiled config if the file changed since the last valid config
+    """
+
+    def __init__(self, config_file, camera_config, main_config=None, poll_interval=1.0):
+        """
+        Args:
+            config_file (str): path of camera config json
+            camera_config (cameraConfig): config currently used for this file
+            main_config (dict, optional): main config, see validate_camera_config
+            poll_interval (float): minimum seconds between two stats of the file
+        """
+        self.configFile = config_file
+        self.mainConfig = main_config
+        self.pollInterval = poll_interval
+        self.cameraConfig = camera_config
+        self.lastPoll = time.monotonic()
+        self.signature = self.file_signature()
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.configFile)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self):
+        """Call between frames. A config that can not be read or is not valid is logged
+        and the current config is kept, it is read again on its next change.
+
+        Returns:
+            cameraConfig or None: new config, None if the file did not change
+        """
+        now = time.monotonic()
+        if now - self.lastPoll < self.pollInterval:
+            return None
+        self.lastPoll = now
+        signature = self.file_signature()
+        if signature is None or signature == self.signature:
+            return None
+        self.signature = signature
+        try:
+            camera_config = load_camera_config(self.configFile, self.mainConfig)
+        except ValueError as e:
+            logger.error("%s changed but is not valid, keeping the current config: %s", self.configFile, e)
+            return None
+        # half written files do not parse, their next write is picked up
+        if camera_config is None or camera_config.as_dict() == self.cameraConfig.as_dict():
+            return None
+        self.cameraConfig = camera_config
+        return camera_config
@@ -0,0 +1,156 @@
+import logging
+import os
+import struct
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Magic bytes and version at the start of every detection log
+LOG_MAGIC = b"WSDL"
+LOG_VERSION = 1
+
+# Kinds of detections stored in the log and the columns of their rows
+PERSON = 0  # xmin, ymin, xmax, ymax, track_id, confidence, class (after reid)
+PPE = 1  # xmin, ymin, xmax, ymax, confidence, class, track_id (full image co-ords)
+BODYPART = 2  # xmin, ymin, xmax, ymax, confidence, class, track_id (full image co-ords)
+FALL = 3  # top1 class, top1 confidence, track_id
+FIRE = 4  # xmin, ymin, xmax, ymax, confidence
+SMOKE = 5  # xmin, ymin, xmax, ymax, confidence
+GARBAGE = 6  # xmin, ymin, xmax, ymax, confidence
+TRIPHAZARD = 7  # xmin, ymin, xmax, ymax, confidence, class
+SPILL = 8  # xmin, ymin, xmax, ymax, confidence
+
+# column of the track id in rows of kinds that refer to a person track
+TRACK_ID_COLUMN = {PERSON: 4, PPE: 6, BODYPART: 6, FALL: 2}
+
+_frame_header = struct.Struct("<IH")  # frame id, number of blocks
+_block_header = struct.Struct("<BHH")  # kind, rows, columns
+
+
+class detectionLogWriter:
+    """Writes the raw detections of every model for every frame of one video into
+    a compact binary log, so analytics (zones, ppe validation, thresholds, drawing)
+    can be re-run later without running any model.
+
+    Layout: magic and version, then for every frame a (frame id, number of blocks)
+    header followed by blocks of (kind, rows, columns) header and float32 rows.
+    Only kinds that were produced by a model are stored for a frame.
+
+    Methods:
+        begin_frame: start a new frame record
+        add: add rows of one kind to current frame
+        end_frame: write current frame record to file
+        close: close the log file
+    """
+
+    def __init__(self, log_path):
+        log_dir = os.path.dirname(log_path)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        self.logPath = log_path
+        self.logFile = open(log_path, "wb")
+        self.logFile.write(LOG_MAGIC + struct.pack("<H", LOG_VERSION))
+        self.frameId = None
+        self.blocks = dict()
+
+    def begin_frame(self, frame_id):
+        self.frameId = frame_id
+        self.blocks.clear()
+
+    def add(self, kind, rows):
+        """Add detections of one kind for current frame
+
+        Args:
+            kind (int): one of the kinds defined in this module, eg: PERSON
+            rows (list of list): detections, each row must have the columns of that kind
+        """
+        self.blocks[kind] = np.asarray(rows, dtype=np.float32)
+
+    def end_frame(self):
+        """Write the record of current frame"""
+        if self.frameId is None:
+            return
+        self.logFile.write(_frame_header.pack(self.frameId, len(self.blocks)))
+        for kind, rows in self.blocks.items():
+            # an empty list becomes a 1d array, store it as 0 rows and 0 columns
+            n_rows = rows.shape[0]
+            n_cols = rows.shape[1] if rows.ndim == 2 else 0
+            self.logFile.write(_block_header.pack(kind, n_rows, n_cols))
+            self.logFile.write(rows.tobytes())
+        self.frameId = None
+        self.blocks.clear()
+
+    def close(self):
+        self.end_frame()
+        self.logFile.close()
+
+
+class detectionLogReader:
+    """Reads a detection log written by detectionLogWriter frame by frame
+
+    Attributes:
+        frameId (int): frame id of last read record
+        recordBlocks (dict): kind --> float32 array of rows of last read record
+        blocks (dict): blocks of the frame we advanced to, empty if it has no record
+
+    Methods:
+        advance: move to the record of a frame id
+        get: rows of one kind in current record
+    """
+
+    def __init__(self, log_path):
+        self.logPath = log_path
+        self.logFile = open(log_path, "rb")
+        magic = self.logFile.read(len(LOG_MAGIC))
+        (version,) = struct.unpack("<H", self.logFile.read(2))
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            raise ValueError("{} is not a detection log of version {}".format(log_path, LOG_VERSION))
+        self.frameId = None
+        self.recordBlocks = dict()
+        self.blocks = dict()
+
+    def read_record(self):
+        """Read the next frame record
+
+        Returns:
+            bool: False at end of file
+        """
+        header = self.logFile.read(_frame_header.size)
+        if len(header) < _frame_header.size:
+            return False
+        self.frameId, n_blocks = _frame_header.unpack(header)
+        self.recordBlocks = dict()
+        for _ in range(n_blocks):
+            kind, n_rows, n_cols = _block_header.unpack(self.logFile.read(_block_header.size))
+            data = self.logFile.read(n_rows * n_cols * 4)
+            self.recordBlocks[kind] = np.frombuffer(data, dtype=np.float32).reshape(n_rows, n_cols)
+        return True
+
+    def advance(self, frame_id):
+        """Move to the record of frame_id. Records are read in order, frames
+        missing from the log have no detections.
+
+        Args:
+            frame_id (int): frame id that is going to be processed
+
+        Returns:
+            bool: True if frame_id was found in the log
+        """
+        while self.frameId is None or self.frameId < frame_id:
+            if not self.read_record():
+                self.blocks = dict()
+                return False
+        self.blocks = self.recordBlocks if self.frameId == frame_id else dict()
+        return self.frameId == frame_id
+
+    def get(self, kind):
+        """Rows of one kind for current frame, empty (0, 0) array if not recorded"""
+        return self.blocks.get(kind, np.zeros((0, 0), dtype=np.float32))
+
+    def has(self, kind):
+        return kind in self.blocks
+
+    def close(self):
+        self.logFile.close()
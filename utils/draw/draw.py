@@ -2,11 +2,13 @@ import cv2
 import os
 import numpy as np
 
+from utils.camera_config.camera_config import compile_camera_config
+
 
 class drawOnFrames:
     
     def __init__(self, main_config_info,camera_config_info):
-        self.cameraConfig = camera_config_info
+        self.cameraConfig = compile_camera_config(camera_config_info)
         self.globalConfig = main_config_info
         #color coding (www.colorhexa.com)
         self.personColor = (7,129,22)
@@ -57,7 +59,8 @@ class drawOnFrames:
             if "triphazardDetection" in results and results["triphazardDetection"]:
                 image = self.draw_triphazard(image, results)
         
-            if results["spillDetection"]:
+            #Check if spill detection results exist in the results
+            if "spillDetection" in results and results["spillDetection"]:
                 image = self.draw_spill(image, results)
         
         return image     
@@ -138,6 +141,23 @@ class drawOnFrames:
             drawn_image = cv2.addWeighted(drawn_image, 1.0, mask, alpha, 0)
 
         return drawn_image
+
+    def blend_zone(self, image, zone, zone_color, alpha=0.5):
+        """Same drawing as draw_zone_on_image but in place and with the raster of the
+        zone computed once, only the part of the image covered by the zone is blended
+
+        Args:
+            image (np.array): Image on which we will draw
+            zone (cameraZone): zone of the camera config
+            zone_color (tuple): Color for zone (self.zoneColor or self.zoneViolationColor)
+            alpha (float, optional): Used to add transparency. Defaults to 0.5.
+        """
+        height, width = image.shape[:2]
+        overlay = zone.overlay(height, width, zone_color)
+        if overlay is None:
+            return
+        rows, columns, raster = overlay
+        image[rows, columns] = cv2.addWeighted(image[rows, columns], 1.0, raster, alpha, 0)
         
     def draw_person_with_zone_information(self, image,one_person_results,already_drawn_flag):
         """Draw person with self.personViolationColor if this person is inside 
@@ -236,15 +256,21 @@ class drawOnFrames:
 
         #check if we have "personCountInZone" information inside of results
         if  "personCountInZone" in results: 
+            if results["personCountInZone"]:
+                # zones are blended in place, keep the frame that was read untouched
+                image = np.copy(image)
             #iterate through all the zones in results            
-            for zones_name in results["personCountInZone"]:
+            for zones_name, person_count in results["personCountInZone"].items():
+                zone = self.cameraConfig.zonesByName.get(zones_name)
+                if zone is None:
+                    continue
                 #draw zones as self.zoneViolationColor if we have  person this zone           
-                if results["personCountInZone"][zones_name]>0:
-                    self.personInZone+=results["personCountInZone"][zones_name]
-                    image = self.draw_zone_on_image(image,self.cameraConfig["zones"][zones_name]["zonePoints"],self.zoneViolationColor )
+                if person_count>0:
+                    self.personInZone+=person_count
+                    self.blend_zone(image,zone,self.zoneViolationColor)
                 #draw zones as self.zoneColor if we have no person this zone        
                 else:
-                    image = self.draw_zone_on_image(image,self.cameraConfig["zones"][zones_name]["zonePoints"],self.zoneColor )
+                    self.blend_zone(image,zone,self.zoneColor)
         return image
                 
     def draw_person(self, image,results):
@@ -350,6 +376,21 @@ class drawOnFrames:
         return image
 
  
+    def draw_spill(self, image, fullImageResults):
+        """
+            This function will handle drawing for spill detections.
+        """
+
+        spills = fullImageResults["spillDetection"]["spill"]
+
+        for spill in spills:
+            [xmin, ymin, xmax,ymax]= map(int,[spill["xmin"], spill["ymin"], spill["xmax"], spill["ymax"]])
+
+            image = cv2.rectangle(image, (xmin, ymin), (xmax,ymax), self.spillColor, 3)
+            image = cv2.putText(image, f"Spill", (xmin,ymin - 10),self.font,self.fontScale, self.spillColor, 3)
+
+        return image
+
     def draw_triphazard(self, image, fullImageResults):
         """
         Handles drawing for trip hazard detections.
@@ -374,21 +415,22 @@ class drawOnFrames:
         Draws all zones on the image. Zones are always drawn, but the color depends on 
         whether a hazard is detected.
         """
+        # zones are blended in place, keep the frame that was read untouched
+        if any(zone.zonePoints for zone in self.cameraConfig.tripzones):
+            image = np.copy(image)
         # Iterate over all zones in the camera configuration
-        for zone_key, zone_config in self.cameraConfig["tripzones"].items():
-            zone_points = zone_config.get("zonePoints", [])
-
-            if not zone_points:
+        for zone in self.cameraConfig.tripzones:
+            if not zone.zonePoints:
                 continue
 
             # Check if the zone has a hazard directly
-            zone_id = str(zone_config["id"])  
+            zone_id = str(zone.id)  
             if results.get("triphazardDetection", {}).get(zone_id, {}).get("status", False):
                 # Hazard detected, draw with violation color
-                image = self.draw_zone_on_image(image, zone_points, self.zoneViolationColor)
+                self.blend_zone(image, zone, self.zoneViolationColor)
             else:
                 # No hazard, draw with regular zone color
-                image = self.draw_zone_on_image(image, zone_points, self.zoneColor)
+                self.blend_zone(image, zone, self.zoneColor)
 
         return image
 
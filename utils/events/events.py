@@ -0,0 +1,167 @@
+import logging
+
+from utils.results.results import extract_violations
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class violationEventEngine:
+    """Turns the per frame results of jsonResultsManager into compact violation events.
+    Every condition (a ppe missing on a track, a fall, a person inside a zone, fire,
+    an occupied zone ...) gets its own small state machine, and an event is only
+    emitted when the state machine changes state, so a 10 second fall at 30 fps is
+    two events instead of 300 full result dicts.
+
+    States of one condition:
+        pending: condition seen but for less than minDurationFrames, nothing emitted.
+                 Going inactive here drops the condition silently (debounce).
+        active: "start" is emitted when entering. While active an "update" is emitted
+                when the value changes (eg: person count in a zone) or every
+                updateIntervalFrames if that is set.
+        cooldown: condition not seen since lastActiveFrame. Seeing it again goes back
+                  to active without a new "start", staying unseen for cooldownFrames
+                  emits "end".
+
+    Conditions are keyed by (type, detail, trackId), so per track conditions end on
+    their own when the track leaves the frame.
+
+    Attributes:
+        camId (str): camera id added to every event
+        minDurationFrames (int): frames a condition must last before "start"
+        cooldownFrames (int): frames a condition must be absent before "end"
+        updateIntervalFrames (int): periodic "update" interval, 0 disables it
+        overrides (dict): per type overrides of the three values above
+        states (dict): condition key --> state dict
+
+    Methods:
+        __call__: feed one fullImageResults, get list of events
+        get_active_conditions: extract condition key --> value from one results dict
+        flush: end every open condition, used at end of video
+    """
+
+    def __init__(self, camera_config, event_config):
+        """
+        Args:
+            camera_config (dict): camera config
+            event_config (dict): "eventEngine" field of main config
+        """
+        self.camId = camera_config["camID"]
+        self.minDurationFrames = event_config["minDurationFrames"]
+        self.cooldownFrames = event_config["cooldownFrames"]
+        self.updateIntervalFrames = event_config.get("updateIntervalFrames", 0)
+        self.overrides = event_config.get("overrides", {})
+        self.states = dict()
+
+    def get_setting(self, condition_type, name):
+        """Get a setting for the condition type, falls back to the engine wide value"""
+        return self.overrides.get(condition_type, {}).get(name, getattr(self, name))
+
+    def get_active_conditions(self, full_image_results):
+        """Extract all the conditions that are true in this frame
+
+        Args:
+            full_image_results (dict): results of one frame from jsonResultsManager
+
+        Returns:
+            dict: (type, detail, trackId) --> value of the condition
+        """
+        conditions = dict()
+        for violation_type, detail, track_id, zone_name in extract_violations(full_image_results):
+            conditions[(violation_type, detail, track_id)] = None
+        # zone occupancy is a per zone condition, value is the number of person inside
+        for zone_name, count in full_image_results.get("personCountInZone", {}).items():
+            if count > 0:
+                conditions[("zoneOccupancy", zone_name, None)] = count
+        return conditions
+
+    def make_event(self, event_name, key, state, frame_id):
+        """Build one compact event dict"""
+        return {
+            "camId": self.camId,
+            "event": event_name,
+            "type": key[0],
+            "detail": key[1],
+            "trackId": key[2],
+            "value": state["value"],
+            "startFrame": state["startFrame"],
+            "frameID": frame_id,
+            "durationFrames": state["lastActiveFrame"] - state["startFrame"] + 1,
+        }
+
+    def __call__(self, full_image_results):
+        """Advance all state machines by one frame
+
+        Args:
+            full_image_results (dict): results of one frame from jsonResultsManager
+
+        Returns:
+            list of dict: events emitted in this frame, mostly empty
+        """
+        frame_id = full_image_results["frameID"]
+        conditions = self.get_active_conditions(full_image_results)
+        events = []
+
+        # conditions seen in this frame
+        for key, value in conditions.items():
+            state = self.states.get(key)
+            if state is None:
+                state = {
+                    "status": "pending",
+                    "startFrame": frame_id,
+                    "lastActiveFrame": frame_id,
+                    "lastEventFrame": frame_id,
+                    "value": value,
+                }
+                self.states[key] = state
+            else:
+                value_changed = state["value"] != value
+                state["lastActiveFrame"] = frame_id
+                state["value"] = value
+                if state["status"] == "cooldown":
+                    state["status"] = "active"
+                if state["status"] == "active":
+                    update_interval = self.get_setting(key[0], "updateIntervalFrames")
+                    if value_changed or (
+                        update_interval and frame_id - state["lastEventFrame"] >= update_interval
+                    ):
+                        state["lastEventFrame"] = frame_id
+                        events.append(self.make_event("update", key, state, frame_id))
+
+            if (
+                state["status"] == "pending"
+                and frame_id - state["startFrame"] + 1 >= self.get_setting(key[0], "minDurationFrames")
+            ):
+                state["status"] = "active"
+                state["lastEventFrame"] = frame_id
+                events.append(self.make_event("start", key, state, frame_id))
+
+        # conditions not seen in this frame
+        for key in [key for key in self.states if key not in conditions]:
+            state = self.states[key]
+            if state["status"] == "pending":
+                del self.states[key]
+                continue
+            state["status"] = "cooldown"
+            if frame_id - state["lastActiveFrame"] >= self.get_setting(key[0], "cooldownFrames"):
+                events.append(self.make_event("end", key, state, frame_id))
+                del self.states[key]
+
+        return events
+
+    def flush(self, frame_id):
+        """End every open condition, pending ones are dropped
+
+        Args:
+            frame_id (int): last frame id of the video
+
+        Returns:
+            list of dict: "end" events
+        """
+        events = [
+            self.make_event("end", key, state, frame_id)
+            for key, state in self.states.items()
+            if state["status"] != "pending"
+        ]
+        self.states.clear()
+        return events
@@ -0,0 +1,349 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# one row of the index file, a row is visible once its index row is written
+INDEX_DTYPE = np.dtype([("trackId", "<i8"), ("timestamp", "<f8")])
+# rows copied at once while compacting
+COMPACT_CHUNK_ROWS = 65536
+
+
+class embeddingStore:
+    """Append-only, memory-mapped store of reid embeddings, replaces pickled tensors in SQLite.
+
+    A store is a directory holding:
+        embeddings.<generation>.bin: fixed width rows of float16 or float32 embeddings
+        index.<generation>.bin: one (track id, timestamp) row per embedding row
+        meta.json: embedding dim, dtype and current generation
+        writer.lock: held by the only process allowed to append
+
+    The writer appends the embedding row first and its index row after, readers only see
+    rows whose index row is complete, so any number of processes can read a store while
+    it is written, without locks and without copying the files (np.memmap). Stores are
+    kept on disk, so identities survive restarts.
+
+    Retention drops rows older than retentionSeconds and keeps at most maxRowsPerTrack
+    rows per track. It is applied by compact, which writes the kept rows into the next
+    generation of files and switches meta.json atomically. Readers switch on their next
+    refresh, files of the old generation stay readable by mappings still open on them.
+
+    Attributes:
+        storeDir (str): directory of the store
+        readonly (bool): readers never append or compact
+        dtype (np.dtype): dtype of stored embeddings
+        dim (int): embedding width, set by the first append of a new store
+        generation (int): generation of the files in use
+        rows (int): visible rows
+        rowsByTrack (dict): track id --> row numbers in append order
+        retentionSeconds (float): max age of rows kept by compact, None to keep all
+        maxRowsPerTrack (int): rows kept per track by compact, None to keep all
+        compactEveryRows (int): appended rows between automatic compactions, 0 to disable
+
+    Methods:
+        append: add an embedding of a track (writer)
+        flush: make appended rows visible to readers (writer)
+        refresh: map rows appended by the writer since the last refresh
+        get_last_rows: last k embeddings of every track
+        get_track_rows: last k embeddings of one track
+        get_track_embeddings: mean normalized embedding of every track
+        compact: apply retention and rewrite the files (writer)
+        close: flush and release the writer lock
+        delete: close and remove the store
+    """
+
+    def __init__(self, store_dir, dtype="float16", readonly=False, retention_seconds=None,
+                 max_rows_per_track=None, compact_every_rows=50000):
+        """
+        Args:
+            store_dir (str): directory of the store, created if needed
+            dtype (str): "float16" or "float32", only used for a new store
+            readonly (bool): open as a reader
+            retention_seconds (float, optional): max age of rows kept by compact
+            max_rows_per_track (int, optional): rows kept per track by compact
+            compact_every_rows (int): appended rows between automatic compactions, 0 to disable
+        """
+        self.storeDir = store_dir
+        self.readonly = readonly
+        self.retentionSeconds = retention_seconds
+        self.maxRowsPerTrack = max_rows_per_track
+        self.compactEveryRows = compact_every_rows
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self.generation = 0
+        self.rows = 0
+        self.rowsByTrack = dict()
+        self.embeddings = None
+        self.index = None
+        self.pendingIndex = []
+        self.rowsSinceCompaction = 0
+        self.embeddingsFile = None
+        self.indexFile = None
+        self.lockFile = None
+
+        if not readonly:
+            os.makedirs(store_dir, exist_ok=True)
+            self.lockFile = open(os.path.join(store_dir, "writer.lock"), "w")
+            try:
+                fcntl.flock(self.lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.lockFile.close()
+                raise RuntimeError("Embedding store {} is already opened by another writer".format(store_dir))
+        self.read_meta()
+        if not readonly:
+            self.open_files()
+        self.refresh()
+
+    @property
+    def metaPath(self):
+        return os.path.join(self.storeDir, "meta.json")
+
+    def get_paths(self, generation):
+        """
+        Returns:
+            (str, str): embeddings and index files of a generation
+        """
+        return (
+            os.path.join(self.storeDir, "embeddings.{}.bin".format(generation)),
+            os.path.join(self.storeDir, "index.{}.bin".format(generation)),
+        )
+
+    def read_meta(self):
+        """Load meta.json
+
+        Returns:
+            bool: True if the generation changed
+        """
+        if not os.path.exists(self.metaPath):
+            return False
+        with open(self.metaPath) as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+        changed = meta["generation"] != self.generation
+        self.generation = meta["generation"]
+        return changed
+
+    def write_meta(self):
+        """Write meta.json atomically, readers never see a partial file"""
+        with open(self.metaPath + ".tmp", "w") as f:
+            json.dump({"dim": self.dim, "dtype": self.dtype.name, "generation": self.generation}, f)
+        os.replace(self.metaPath + ".tmp", self.metaPath)
+
+    def open_files(self):
+        """Open the files of the current generation for appending. Rows left by a writer
+        that died between append and flush are cut first: the index to whole rows, then the
+        embeddings to the rows of the index, so new rows stay aligned with their index rows.
+        """
+        embeddings_path, index_path = self.get_paths(self.generation)
+        self.embeddingsFile = open(embeddings_path, "ab")
+        self.indexFile = open(index_path, "ab")
+        rows = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+        row_bytes = self.dim * self.dtype.itemsize if self.dim else 0
+        if row_bytes:
+            rows = min(rows, os.path.getsize(embeddings_path) // row_bytes)
+        else:
+            rows = 0
+        if os.path.getsize(index_path) != rows * INDEX_DTYPE.itemsize or \
+                os.path.getsize(embeddings_path) != rows * row_bytes:
+            logger.warning("Embedding store %s was not flushed, truncating it to %d rows", self.storeDir, rows)
+            self.indexFile.truncate(rows * INDEX_DTYPE.itemsize)
+            self.embeddingsFile.truncate(rows * row_bytes)
+
+    def close_files(self):
+        for f in (self.embeddingsFile, self.indexFile):
+            if f:
+                f.close()
+        self.embeddingsFile = self.indexFile = None
+
+    def reset_mappings(self):
+        self.rows = 0
+        self.rowsByTrack = dict()
+        self.embeddings = None
+        self.index = None
+
+    def refresh(self):
+        """Map rows made visible by the writer since the last refresh, and switch to the
+        files of a new generation after a compaction by the writer
+
+        Returns:
+            int: visible rows
+        """
+        if self.readonly and self.read_meta():
+            self.reset_mappings()
+        if self.dim is None:
+            return 0
+        embeddings_path, index_path = self.get_paths(self.generation)
+        try:
+            row_bytes = self.dim * self.dtype.itemsize
+            rows = min(os.path.getsize(index_path) // INDEX_DTYPE.itemsize, os.path.getsize(embeddings_path) // row_bytes)
+        except FileNotFoundError:
+            # a reader racing a compaction, next refresh picks up the new generation
+            return self.rows
+        if rows <= self.rows:
+            return self.rows
+        self.embeddings = np.memmap(embeddings_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+        self.index = np.memmap(index_path, dtype=INDEX_DTYPE, mode="r", shape=(rows,))
+        for row, track_id in enumerate(self.index["trackId"][self.rows:rows].tolist(), start=self.rows):
+            rows_of_track = self.rowsByTrack.get(track_id)
+            if rows_of_track is None:
+                rows_of_track = self.rowsByTrack[track_id] = []
+            rows_of_track.append(row)
+        self.rows = rows
+        return rows
+
+    def append(self, track_id, embedding, timestamp=None):
+        """Append one embedding, visible to readers after flush
+
+        Args:
+            track_id (int): track id of the person
+            embedding (np.array): embedding, any shape with dim values
+            timestamp (float, optional): unix time, defaults to now
+        """
+        embedding = np.asarray(embedding, dtype=self.dtype).reshape(-1)
+        if self.dim is None:
+            self.dim = embedding.size
+            self.write_meta()
+        elif embedding.size != self.dim:
+            raise ValueError("Embedding of size {} in store of dim {}".format(embedding.size, self.dim))
+        self.embeddingsFile.write(embedding.tobytes())
+        self.pendingIndex.append((int(track_id), time.time() if timestamp is None else timestamp))
+
+    def flush(self):
+        """Write pending index rows after their embeddings, then compact if it is time to"""
+        if not self.pendingIndex:
+            return
+        self.embeddingsFile.flush()
+        self.indexFile.write(np.array(self.pendingIndex, dtype=INDEX_DTYPE).tobytes())
+        self.indexFile.flush()
+        self.rowsSinceCompaction += len(self.pendingIndex)
+        self.pendingIndex = []
+        if self.compactEveryRows and self.rowsSinceCompaction >= self.compactEveryRows:
+            self.compact()
+
+    def track_ids(self):
+        self.refresh()
+        return list(self.rowsByTrack)
+
+    def max_track_id(self):
+        self.refresh()
+        return max(self.rowsByTrack, default=0)
+
+    def get_last_rows(self, k):
+        """
+        Args:
+            k (int): embeddings per track
+
+        Returns:
+            dict: track id --> (min(k, rows of track), dim) float32 array, tracks in first seen order
+        """
+        if not self.readonly:
+            self.flush()
+        self.refresh()
+        return {
+            track_id: np.asarray(self.embeddings[rows[-k:]], dtype=np.float32)
+            for track_id, rows in self.rowsByTrack.items()
+        }
+
+    def get_track_rows(self, track_id, k):
+        """
+        Args:
+            track_id (int): track id
+            k (int): embeddings returned
+
+        Returns:
+            np.array: (min(k, rows of track), dim) float32 array, oldest first
+        """
+        return np.asarray(self.embeddings[self.rowsByTrack[track_id][-k:]], dtype=np.float32)
+
+    def get_track_embeddings(self, k):
+        """
+        Args:
+            k (int): last embeddings of a track averaged
+
+        Returns:
+            dict: track id --> normalized mean embedding as float32 array
+        """
+        embeddings = dict()
+        for track_id, rows in self.get_last_rows(k).items():
+            mean = rows.mean(axis=0)
+            embeddings[track_id] = mean / max(np.linalg.norm(mean), 1e-12)
+        return embeddings
+
+    def get_keep_mask(self, now=None):
+        """Rows kept by the retention policies"""
+        keep = np.ones(self.rows, dtype=bool)
+        if self.retentionSeconds:
+            keep &= self.index["timestamp"] >= (time.time() if now is None else now) - self.retentionSeconds
+        if self.maxRowsPerTrack:
+            for rows in self.rowsByTrack.values():
+                if len(rows) > self.maxRowsPerTrack:
+                    keep[rows[: -self.maxRowsPerTrack]] = False
+        return keep
+
+    def compact(self, now=None):
+        """Drop rows outside the retention policies by writing the kept rows into a new
+        generation of files
+
+        Returns:
+            int: rows removed
+        """
+        if self.readonly:
+            raise RuntimeError("Readonly embedding store can't be compacted")
+        self.flush()
+        self.rowsSinceCompaction = 0
+        self.refresh()
+        if not self.rows:
+            return 0
+        keep = self.get_keep_mask(now)
+        removed = int(self.rows - keep.sum())
+        if not removed:
+            return 0
+        old_paths = self.get_paths(self.generation)
+        new_paths = self.get_paths(self.generation + 1)
+        with open(new_paths[0], "wb") as embeddings_file, open(new_paths[1], "wb") as index_file:
+            for start in range(0, self.rows, COMPACT_CHUNK_ROWS):
+                chunk_keep = keep[start:start + COMPACT_CHUNK_ROWS]
+                embeddings_file.write(np.ascontiguousarray(self.embeddings[start:start + COMPACT_CHUNK_ROWS][chunk_keep]).tobytes())
+                index_file.write(np.ascontiguousarray(self.index[start:start + COMPACT_CHUNK_ROWS][chunk_keep]).tobytes())
+            embeddings_file.flush()
+            os.fsync(embeddings_file.fileno())
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        self.close_files()
+        self.generation += 1
+        self.write_meta()
+        self.reset_mappings()
+        self.open_files()
+        for path in old_paths:
+            os.remove(path)
+        self.refresh()
+        logger.info("Compacted embedding store %s, removed %d rows, kept %d", self.storeDir, removed, self.rows)
+        return removed
+
+    def size_bytes(self):
+        return sum(
+            os.path.getsize(os.path.join(self.storeDir, name)) for name in os.listdir(self.storeDir)
+        ) if os.path.isdir(self.storeDir) else 0
+
+    def close(self):
+        """Flush and release the writer lock"""
+        if not self.readonly:
+            self.flush()
+            self.close_files()
+            if self.lockFile:
+                self.lockFile.close()
+                self.lockFile = None
+        self.reset_mappings()
+
+    def delete(self):
+        """Close and remove the store, eg: stores of chunk workers once stitched"""
+        self.close()
+        shutil.rmtree(self.storeDir, ignore_errors=True)
@@ -0,0 +1,389 @@
+"""Cross camera identity service
+
+Every camera has its own reID, so the same worker gets unrelated track ids on different
+cameras. identityService matches the reid embeddings of all cameras against one gallery
+of global identities and gives every (camera, track id) a global id. It runs inside the
+VideoProcessor, or in its own process shared by the VideoProcessors of many streams:
+    python -m utils.identity_service.identity_service --config config/config.json
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from utils.ann_index.ann_index import ivfIndex, normalize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_address(address):
+    """"host:port" for tcp, else a unix socket path"""
+    if ":" in address:
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address
+
+
+class identityService:
+    """Gallery of global identities shared by the reid of every camera.
+
+    Each global identity is one entry of an ivfIndex: the running mean of the normalized
+    embeddings matched to it, so inner product with a normalized embedding is the
+    average cosine similarity. A (camera, track id) is matched once, when its first
+    embedding arrives, later embeddings of the track only update its identity.
+
+    Matching is batched, match takes all new embeddings of a frame of a camera. A
+    candidate identity is rejected if:
+        - its score is below confidence
+        - it was last seen more than timeWindowSeconds ago
+        - it was seen on the same camera by another track within activeSeconds, a person
+          is not two tracks of one camera at the same time
+        - a better scoring track of the same batch already took it
+    Tracks without a valid candidate get a new global id. Identities not seen for
+    identityTtlSeconds are forgotten.
+
+    All methods are thread safe, one lock serializes calls of every client.
+
+    Attributes:
+        confidence (float): min average cosine similarity of a match
+        topK (int): candidates checked per embedding
+        timeWindowSeconds (float): max seconds since an identity was seen to match it, 0 to disable
+        activeSeconds (float): seconds a track keeps its identity exclusive on its camera
+        identityTtlSeconds (float): identities not seen for this long are forgotten, 0 to keep all
+        maxEmbeddingsPerIdentity (int): embeddings averaged per identity, older ones fade out
+        index (ivfIndex): mean embedding of every global id
+        trackIdentities (dict): (camera, track id) --> global id
+        lastSightings (dict): global id --> (camera, track id, timestamp)
+        embeddingCounts (dict): global id --> embeddings averaged
+        nextGlobalId (int): id of the next new identity
+
+    Methods:
+        match: global ids of tracks of a camera from their embeddings
+        forget_camera: drop track ids of a camera, eg: at end of video when the tracker restarts
+        evict_expired: forget identities not seen for identityTtlSeconds
+        stats: counters of the service
+    """
+
+    def __init__(self, service_config):
+        """
+        Args:
+            service_config (dict): "identityService" field of main config
+        """
+        self.confidence = service_config.get("confidence", 0.75)
+        self.topK = service_config.get("topK", 10)
+        self.timeWindowSeconds = service_config.get("timeWindowSeconds", 0)
+        self.activeSeconds = service_config.get("activeSeconds", 5.0)
+        self.identityTtlSeconds = service_config.get("identityTtlSeconds", 0)
+        self.maxEmbeddingsPerIdentity = service_config.get("maxEmbeddingsPerIdentity", 50)
+        self.indexConfig = service_config.get("galleryIndex", {})
+        self.index = None
+        self.trackIdentities = dict()
+        self.identityTracks = dict()
+        self.lastSightings = dict()
+        self.embeddingCounts = dict()
+        self.nextGlobalId = 1
+        self.lastEviction = 0.0
+        self.matchCalls = 0
+        self.embeddingsMatched = 0
+        self.lock = threading.Lock()
+
+    def init_index(self, dim):
+        self.index = ivfIndex(
+            dim,
+            nlist=self.indexConfig.get("nlist", 0),
+            nprobe=self.indexConfig.get("nprobe", 16),
+            exact_threshold=self.indexConfig.get("exactThreshold", 2048),
+        )
+
+    def is_candidate(self, global_id, cam_id, track_id, timestamp):
+        sighting_cam_id, sighting_track_id, seen = self.lastSightings[global_id]
+        if self.timeWindowSeconds and timestamp - seen > self.timeWindowSeconds:
+            return False
+        if sighting_cam_id == cam_id and sighting_track_id != track_id and timestamp - seen < self.activeSeconds:
+            return False
+        return True
+
+    def match(self, cam_id, track_ids, embeddings, timestamp=None):
+        """
+        Args:
+            cam_id (str): camera of the tracks
+            track_ids (list): reid track ids of the camera
+            embeddings (np.array): (tracks, dim) reid embedding of every track
+            timestamp (float, optional): unix time of the frame, defaults to now
+
+        Returns:
+            list: global id of every track
+        """
+        if not len(track_ids):
+            return []
+        timestamp = time.time() if timestamp is None else timestamp
+        embeddings = normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(track_ids), -1))
+        with self.lock:
+            if self.index is None:
+                self.init_index(embeddings.shape[1])
+            self.evict_expired(timestamp)
+            global_ids = [self.trackIdentities.get((cam_id, track_id)) for track_id in track_ids]
+            pending = [position for position, global_id in enumerate(global_ids) if global_id is None]
+            if pending and len(self.index):
+                # every (score, embedding, identity) pair of the batch, best first
+                pairs = []
+                for position, (ids, scores) in zip(pending, self.index.search_batch(embeddings[pending], self.topK)):
+                    pairs.extend((float(score), position, global_id) for global_id, score in zip(ids, scores))
+                pairs.sort(key=lambda pair: -pair[0])
+                # identities of tracks already matched in this batch
+                taken = {global_id for global_id in global_ids if global_id is not None}
+                for score, position, global_id in pairs:
+                    if score < self.confidence:
+                        break
+                    if global_ids[position] is not None or global_id in taken:
+                        continue
+                    if not self.is_candidate(global_id, cam_id, track_ids[position], timestamp):
+                        continue
+                    global_ids[position] = global_id
+                    taken.add(global_id)
+            for position, track_id in enumerate(track_ids):
+                if global_ids[position] is None:
+                    global_ids[position] = self.nextGlobalId
+                    self.nextGlobalId += 1
+                self.update_identity(global_ids[position], cam_id, track_id, embeddings[position], timestamp)
+            self.matchCalls += 1
+            self.embeddingsMatched += len(track_ids)
+        return global_ids
+
+    def update_identity(self, global_id, cam_id, track_id, embedding, timestamp):
+        """Add an embedding to the running mean of an identity"""
+        count = min(self.embeddingCounts.get(global_id, 0) + 1, self.maxEmbeddingsPerIdentity)
+        mean = self.index.get(global_id)
+        mean = embedding if mean is None else mean + (embedding - mean) / count
+        self.index.add(global_id, mean)
+        self.embeddingCounts[global_id] = count
+        self.lastSightings[global_id] = (cam_id, track_id, timestamp)
+        key = (cam_id, track_id)
+        if key not in self.trackIdentities:
+            self.trackIdentities[key] = global_id
+            self.identityTracks.setdefault(global_id, set()).add(key)
+
+    def forget_camera(self, cam_id):
+        """Drop the track ids of a camera, its identities stay in the gallery
+
+        Returns:
+            int: tracks dropped
+        """
+        with self.lock:
+            keys = [key for key in self.trackIdentities if key[0] == cam_id]
+            for key in keys:
+                global_id = self.trackIdentities.pop(key)
+                self.identityTracks[global_id].discard(key)
+        return len(keys)
+
+    def evict_expired(self, timestamp):
+        """Forget identities not seen for identityTtlSeconds, checked at most once a second.
+        Called with the lock held.
+
+        Returns:
+            int: identities forgotten
+        """
+        if not self.identityTtlSeconds or timestamp - self.lastEviction < 1.0:
+            return 0
+        self.lastEviction = timestamp
+        expired = [
+            global_id for global_id, (_, _, seen) in self.lastSightings.items()
+            if timestamp - seen > self.identityTtlSeconds
+        ]
+        for global_id in expired:
+            self.index.remove(global_id)
+            del self.lastSightings[global_id]
+            del self.embeddingCounts[global_id]
+            for key in self.identityTracks.pop(global_id, ()):
+                self.trackIdentities.pop(key, None)
+        return len(expired)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "identities": len(self.lastSightings),
+                "tracks": len(self.trackIdentities),
+                "matchCalls": self.matchCalls,
+                "embeddingsMatched": self.embeddingsMatched,
+            }
+
+
+class identityServer:
+    """Serves an identityService to identityClients of other processes over a local tcp or
+    unix socket, one daemon thread per connected client.
+
+    Attributes:
+        service (identityService): served service
+        address (str): "host:port" or unix socket path
+        listener (Listener): None if the server could not start
+
+    Methods:
+        start: bind and accept clients on a background thread
+        stop: close the listener
+    """
+
+    # requests a client may send
+    METHODS = ("match", "forget_camera", "stats")
+
+    def __init__(self, service, service_config):
+        """
+        Args:
+            service (identityService): service to serve
+            service_config (dict): "identityService" field of main config
+        """
+        self.service = service
+        self.address = service_config.get("address", "127.0.0.1:6010")
+        self.authkey = service_config.get("authkey", "identity").encode("utf-8")
+        self.listener = None
+        self.thread = None
+
+    def start(self):
+        """
+        Returns:
+            bool: True if the server is running
+        """
+        try:
+            self.listener = Listener(parse_address(self.address), authkey=self.authkey)
+        except OSError as e:
+            logger.error("Identity server could not bind %s, %s", self.address, e)
+            return False
+        self.thread = threading.Thread(target=self.accept_clients, name="identityServer", daemon=True)
+        self.thread.start()
+        logger.info("Identity server listening on %s", self.address)
+        return True
+
+    def accept_clients(self):
+        while self.listener:
+            try:
+                connection = self.listener.accept()
+            except Exception as e:
+                if self.listener:
+                    logger.error("Identity server could not accept a client, %s", e)
+                    continue
+                return
+            threading.Thread(target=self.serve_client, args=(connection,), name="identityClient", daemon=True).start()
+
+    def serve_client(self, connection):
+        with connection:
+            while True:
+                try:
+                    method, args = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if method not in self.METHODS:
+                        raise ValueError("Unknown identity service method {}".format(method))
+                    connection.send((True, getattr(self.service, method)(*args)))
+                except Exception as e:
+                    logger.error("Identity service %s failed, %s", method, e)
+                    connection.send((False, str(e)))
+
+    def stop(self):
+        listener, self.listener = self.listener, None
+        if listener:
+            listener.close()
+
+
+class identityClient:
+    """identityService of an identityServer in another process, with the same methods.
+    A lost connection is retried on the next call after retrySeconds, calls made while
+    the server is unreachable raise ConnectionError.
+
+    Attributes:
+        address (str): "host:port" or unix socket path of the server
+        retrySeconds (float): min seconds between reconnection attempts
+    """
+
+    def __init__(self, service_config):
+        """
+        Args:
+            service_config (dict): "identityService" field of main config
+        """
+        self.address = service_config.get("address", "127.0.0.1:6010")
+        self.authkey = service_config.get("authkey", "identity").encode("utf-8")
+        self.retrySeconds = service_config.get("retrySeconds", 5.0)
+        self.connection = None
+        self.lastAttempt = 0.0
+        self.lock = threading.Lock()
+
+    def connect(self):
+        now = time.monotonic()
+        if now - self.lastAttempt < self.retrySeconds:
+            raise ConnectionError("Identity server {} unreachable".format(self.address))
+        self.lastAttempt = now
+        try:
+            self.connection = Client(parse_address(self.address), authkey=self.authkey)
+        except OSError as e:
+            raise ConnectionError("Identity server {} unreachable, {}".format(self.address, e))
+
+    def call(self, method, *args):
+        with self.lock:
+            if self.connection is None:
+                self.connect()
+            try:
+                self.connection.send((method, args))
+                ok, result = self.connection.recv()
+            except (EOFError, OSError) as e:
+                self.close_connection()
+                raise ConnectionError("Identity server {} lost, {}".format(self.address, e))
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+    def match(self, cam_id, track_ids, embeddings, timestamp=None):
+        return self.call("match", cam_id, list(track_ids), np.asarray(embeddings, dtype=np.float32), timestamp)
+
+    def forget_camera(self, cam_id):
+        return self.call("forget_camera", cam_id)
+
+    def stats(self):
+        return self.call("stats")
+
+    def close_connection(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def close(self):
+        with self.lock:
+            self.close_connection()
+
+
+def init_identity_service(main_config):
+    """Identity service of the "identityService" field of main config
+
+    Returns:
+        identityService, identityClient or None: None if disabled
+    """
+    service_config = main_config.get("identityService", {})
+    if not service_config.get("enabled", False):
+        return None
+    if service_config.get("mode", "inProcess") == "client":
+        return identityClient(service_config)
+    return identityService(service_config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the cross camera identity service")
+    parser.add_argument("--config", default="config/config.json", help="main config file")
+    args = parser.parse_args()
+    with open(args.config) as f:
+        service_config = json.load(f).get("identityService", {})
+    server = identityServer(identityService(service_config), service_config)
+    if not server.start():
+        raise SystemExit(1)
+    try:
+        while True:
+            time.sleep(60)
+            logger.info("Identity service %s", server.service.stats())
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
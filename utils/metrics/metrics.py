@@ -0,0 +1,315 @@
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# prefix of every exported metric
+METRIC_PREFIX = "worker_safety"
+
+
+def get_rss_bytes():
+    """Resident set size of this process, falls back to peak rss where /proc is missing"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class pipelineMetrics:
+    """Live state of the pipeline read by the metrics server. Updated by VideoProcessor from
+    the processing thread and read from the server thread, updates are plain assignments
+    and reads work on copies so no lock is needed on the hot path.
+
+    Attributes:
+        profiler (stageProfiler): per stage latencies, exported as summaries
+        fpsWindow (float): seconds over which fps is measured
+        healthDeadline (float): a camera with no frame for this many seconds is unhealthy
+        cameras (dict): camera id --> dict of frames, droppedFrames, fps, lastFrameTime,
+                        galleryTracks, queueDepth and active
+        modelLoadSeconds (dict): model name --> seconds taken to load it
+        modelWarmupSeconds (dict): model name --> seconds taken by its warm-up inferences
+        ready (bool): True once the models of the current camera are loaded and warmed up
+
+    Methods:
+        start_camera: mark a camera as being processed
+        stop_camera: mark a camera as done, it is no longer checked by the health check
+        frame_processed: count one processed frame
+        frame_dropped: count one frame that could not be processed
+        time_model_load: context manager recording the load time of a model
+        time_model_warmup: context manager recording the warm-up time of a model
+        set_ready: mark the pipeline ready, or not while models are loading
+        render_prometheus: metrics in prometheus text format
+        health: health of every active camera
+        readiness: readiness and load and warm-up times of every model
+    """
+
+    def __init__(self, profiler, metrics_config):
+        """
+        Args:
+            profiler (stageProfiler): profiler of the pipeline
+            metrics_config (dict): "metricsServer" field of main config
+        """
+        self.profiler = profiler
+        self.fpsWindow = metrics_config.get("fpsWindowSec", 5.0)
+        self.healthDeadline = metrics_config.get("healthDeadlineSec", 10.0)
+        self.cameras = dict()
+        self.modelLoadSeconds = dict()
+        self.modelWarmupSeconds = dict()
+        self.ready = False
+
+    def get_camera(self, cam_id):
+        camera = self.cameras.get(cam_id)
+        if camera is None:
+            now = time.monotonic()
+            camera = self.cameras[cam_id] = {
+                "frames": 0,
+                "droppedFrames": 0,
+                "fps": 0.0,
+                "windowStart": now,
+                "windowFrames": 0,
+                "lastFrameTime": now,
+                "galleryTracks": 0,
+                "queueDepth": 0,
+                "active": False,
+            }
+        return camera
+
+    def start_camera(self, cam_id):
+        camera = self.get_camera(cam_id)
+        camera["active"] = True
+        # the deadline starts when processing starts, not at the last frame of the previous loop
+        camera["lastFrameTime"] = camera["windowStart"] = time.monotonic()
+        camera["windowFrames"] = 0
+
+    def stop_camera(self, cam_id):
+        self.get_camera(cam_id)["active"] = False
+
+    def frame_processed(self, cam_id, gallery_tracks=None, queue_depth=None):
+        """Count one processed frame
+
+        Args:
+            cam_id (str): camera id
+            gallery_tracks (int, optional): number of tracks known by reid
+            queue_depth (int, optional): frames decoded and waiting to be processed
+        """
+        camera = self.get_camera(cam_id)
+        now = time.monotonic()
+        camera["frames"] += 1
+        camera["windowFrames"] += 1
+        camera["lastFrameTime"] = now
+        elapsed = now - camera["windowStart"]
+        if elapsed >= self.fpsWindow:
+            camera["fps"] = camera["windowFrames"] / elapsed
+            camera["windowStart"] = now
+            camera["windowFrames"] = 0
+        if gallery_tracks is not None:
+            camera["galleryTracks"] = gallery_tracks
+        if queue_depth is not None:
+            camera["queueDepth"] = queue_depth
+
+    def frame_dropped(self, cam_id):
+        self.get_camera(cam_id)["droppedFrames"] += 1
+
+    def record_model_load(self, model_name, seconds):
+        self.modelLoadSeconds[model_name] = seconds
+
+    def time_model_load(self, model_name):
+        """Context manager recording how long loading a model took"""
+        return _modelTimer(self.modelLoadSeconds, model_name)
+
+    def time_model_warmup(self, model_name):
+        """Context manager recording how long the warm-up inferences of a model took"""
+        return _modelTimer(self.modelWarmupSeconds, model_name)
+
+    def set_ready(self, ready):
+        self.ready = ready
+
+    def readiness(self):
+        """
+        Returns:
+            (bool, dict): readiness and per model load and warm-up seconds
+        """
+        models = {
+            name: {"loadSeconds": round(seconds, 3), "warmupSeconds": round(self.modelWarmupSeconds.get(name, 0.0), 3)}
+            for name, seconds in list(self.modelLoadSeconds.items())
+        }
+        return self.ready, models
+
+    def health(self):
+        """
+        Returns:
+            (bool, dict): overall health and per active camera age of last frame and health
+        """
+        now = time.monotonic()
+        cameras = dict()
+        for cam_id, camera in list(self.cameras.items()):
+            if not camera["active"]:
+                continue
+            age = now - camera["lastFrameTime"]
+            cameras[cam_id] = {"lastFrameAgeSec": round(age, 3), "healthy": age <= self.healthDeadline}
+        return all(camera["healthy"] for camera in cameras.values()), cameras
+
+    def render_prometheus(self):
+        """
+        Returns:
+            str: all metrics in prometheus text exposition format
+        """
+        lines = []
+
+        def add_metric(name, metric_type, help_text, samples):
+            lines.append("# HELP {}_{} {}".format(METRIC_PREFIX, name, help_text))
+            lines.append("# TYPE {}_{} {}".format(METRIC_PREFIX, name, metric_type))
+            for labels, value in samples:
+                label_text = ",".join('{}="{}"'.format(key, escape_label(val)) for key, val in labels.items())
+                lines.append("{}_{}{} {}".format(METRIC_PREFIX, name, "{" + label_text + "}" if label_text else "", value))
+
+        cameras = list(self.cameras.items())
+        add_metric("fps", "gauge", "Frames processed per second",
+                   [({"camera": cam_id}, camera["fps"]) for cam_id, camera in cameras])
+        add_metric("frames_total", "counter", "Frames processed",
+                   [({"camera": cam_id}, camera["frames"]) for cam_id, camera in cameras])
+        add_metric("dropped_frames_total", "counter", "Frames that could not be decoded or processed",
+                   [({"camera": cam_id}, camera["droppedFrames"]) for cam_id, camera in cameras])
+        add_metric("queue_depth", "gauge", "Decoded frames waiting to be processed",
+                   [({"camera": cam_id}, camera["queueDepth"]) for cam_id, camera in cameras])
+        add_metric("reid_gallery_tracks", "gauge", "Tracks known by reid",
+                   [({"camera": cam_id}, camera["galleryTracks"]) for cam_id, camera in cameras])
+        add_metric("last_frame_age_seconds", "gauge", "Seconds since last processed frame",
+                   [({"camera": cam_id}, time.monotonic() - camera["lastFrameTime"]) for cam_id, camera in cameras])
+        add_metric("model_load_seconds", "gauge", "Time taken to load a model",
+                   [({"model": name}, seconds) for name, seconds in list(self.modelLoadSeconds.items())])
+        add_metric("model_warmup_seconds", "gauge", "Time taken by the warm-up inferences of a model",
+                   [({"model": name}, seconds) for name, seconds in list(self.modelWarmupSeconds.items())])
+        add_metric("ready", "gauge", "1 once the models of the current camera are loaded and warmed up",
+                   [({}, int(self.ready))])
+        add_metric("resident_memory_bytes", "gauge", "Resident set size of the process", [({}, get_rss_bytes())])
+
+        # stage latencies from the profiler as a prometheus summary
+        stage_lines = []
+        for cam_id, camera_stats in list(self.profiler.stats.items()):
+            for stage_name, stats in list(camera_stats.items()):
+                labels = 'camera="{}",stage="{}"'.format(escape_label(cam_id), escape_label(stage_name))
+                for quantile in (0.5, 0.95, 0.99):
+                    stage_lines.append('{}_stage_latency_seconds{{{},quantile="{}"}} {}'.format(
+                        METRIC_PREFIX, labels, quantile, stats.percentile(quantile)))
+                stage_lines.append("{}_stage_latency_seconds_sum{{{}}} {}".format(METRIC_PREFIX, labels, stats.totalSeconds))
+                stage_lines.append("{}_stage_latency_seconds_count{{{}}} {}".format(METRIC_PREFIX, labels, stats.calls))
+        lines.append("# HELP {}_stage_latency_seconds Latency of a pipeline stage".format(METRIC_PREFIX))
+        lines.append("# TYPE {}_stage_latency_seconds summary".format(METRIC_PREFIX))
+        lines.extend(stage_lines)
+        return "\n".join(lines) + "\n"
+
+
+class _modelTimer:
+    __slots__ = ("seconds", "modelName", "start")
+
+    def __init__(self, seconds, model_name):
+        """
+        Args:
+            seconds (dict): model name --> seconds, where the time is recorded
+            model_name (str): name of the model
+        """
+        self.seconds = seconds
+        self.modelName = model_name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds[self.modelName] = time.perf_counter() - self.start
+        return False
+
+
+class metricsServer:
+    """Embedded http server on a daemon thread serving
+        /metrics: prometheus text format metrics of pipelineMetrics
+        /healthz: 200 if every active camera processed a frame within healthDeadlineSec, else 503
+        /readyz: 200 once the models of the current camera are loaded and warmed up, else 503
+
+    Attributes:
+        metrics (pipelineMetrics): state that is served
+        host (str): bind address
+        port (int): bind port, 80 is the port exposed by the Dockerfile
+        httpServer (ThreadingHTTPServer): None if the server could not start
+
+    Methods:
+        start: bind and serve on a background thread
+        stop: shutdown the server
+    """
+
+    def __init__(self, metrics, metrics_config):
+        """
+        Args:
+            metrics (pipelineMetrics): state to serve
+            metrics_config (dict): "metricsServer" field of main config
+        """
+        self.metrics = metrics
+        self.host = metrics_config.get("host", "0.0.0.0")
+        self.port = metrics_config.get("port", 80)
+        self.httpServer = None
+        self.thread = None
+
+    def start(self):
+        """Start serving, a port that can't be bound is logged and the pipeline keeps running
+
+        Returns:
+            bool: True if the server is running
+        """
+        metrics = self.metrics
+
+        class handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] == "/metrics":
+                    self.send_body(200, "text/plain; version=0.0.4; charset=utf-8", metrics.render_prometheus())
+                elif self.path.split("?")[0] == "/healthz":
+                    healthy, cameras = metrics.health()
+                    body = json.dumps({"status": "ok" if healthy else "unhealthy", "cameras": cameras})
+                    self.send_body(200 if healthy else 503, "application/json", body)
+                elif self.path.split("?")[0] == "/readyz":
+                    ready, models = metrics.readiness()
+                    body = json.dumps({"status": "ready" if ready else "loading", "models": models})
+                    self.send_body(200 if ready else 503, "application/json", body)
+                else:
+                    self.send_body(404, "text/plain", "not found\n")
+
+            def send_body(self, status, content_type, body):
+                body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # scrapes every few seconds would flood the log
+                return
+
+        try:
+            self.httpServer = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            logger.error("Metrics server could not bind %s:%s, %s", self.host, self.port, e)
+            return False
+        self.httpServer.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpServer.serve_forever, name="metricsServer", daemon=True)
+        self.thread.start()
+        logger.info("Metrics server listening on %s:%s", self.host, self.httpServer.server_address[1])
+        return True
+
+    def stop(self):
+        if self.httpServer:
+            self.httpServer.shutdown()
+            self.httpServer.server_close()
+            self.httpServer = None
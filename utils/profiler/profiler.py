@@ -0,0 +1,247 @@
+import json
+import logging
+import math
+import os
+import time
+
+from utils.tracing.tracing import tracer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# histogram buckets are log spaced, 4 per doubling from 10us to ~170s
+MIN_BUCKET_SECONDS = 1e-5
+BUCKETS_PER_DOUBLING = 4
+NUM_BUCKETS = 96
+_log_bucket_width = math.log(2) / BUCKETS_PER_DOUBLING
+
+
+def bucket_upper_bound(bucket):
+    """Upper bound in seconds of a histogram bucket"""
+    return MIN_BUCKET_SECONDS * math.exp((bucket + 1) * _log_bucket_width)
+
+
+class stageStats:
+    """Latency histogram, call count and items per call of one stage of one camera"""
+
+    __slots__ = ("calls", "totalSeconds", "maxSeconds", "items", "maxItems", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.totalSeconds = 0.0
+        self.maxSeconds = 0.0
+        self.items = 0
+        self.maxItems = 0
+        self.histogram = [0] * NUM_BUCKETS
+
+    def add(self, seconds, items=None):
+        self.calls += 1
+        self.totalSeconds += seconds
+        if seconds > self.maxSeconds:
+            self.maxSeconds = seconds
+        if items is not None:
+            self.items += items
+            if items > self.maxItems:
+                self.maxItems = items
+        if seconds <= MIN_BUCKET_SECONDS:
+            bucket = 0
+        else:
+            bucket = min(int(math.log(seconds / MIN_BUCKET_SECONDS) / _log_bucket_width), NUM_BUCKETS - 1)
+        self.histogram[bucket] += 1
+
+    def percentile(self, fraction):
+        """Approximate percentile in seconds, upper bound of the bucket holding it"""
+        if not self.calls:
+            return 0.0
+        rank = fraction * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper_bound(bucket), self.maxSeconds)
+        return self.maxSeconds
+
+    def summary(self):
+        return {
+            "calls": self.calls,
+            "totalMs": self.totalSeconds * 1000,
+            "meanMs": self.totalSeconds * 1000 / self.calls if self.calls else 0.0,
+            "p50Ms": self.percentile(0.50) * 1000,
+            "p95Ms": self.percentile(0.95) * 1000,
+            "p99Ms": self.percentile(0.99) * 1000,
+            "maxMs": self.maxSeconds * 1000,
+            "itemsPerCall": self.items / self.calls if self.calls else 0.0,
+            "maxItems": self.maxItems,
+        }
+
+
+class _stageTimer:
+    """Context manager timing one call of a stage, also a span of the trace if tracing is on"""
+
+    __slots__ = ("stats", "items", "name", "start")
+
+    def __init__(self, stats, items, name):
+        self.stats = stats
+        self.items = items
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.start
+        self.stats.add(duration, self.items)
+        if tracer.enabled:
+            tracer.add_span(self.name, "stage", self.start, duration, None if self.items is None else {"items": self.items})
+        return False
+
+
+class _noopTimer:
+    """Shared context manager used while profiling is disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_noop_timer = _noopTimer()
+
+
+class stageProfiler:
+    """Low overhead instrumentation of the stages of the pipeline.
+    Every stage of every camera has a log bucketed latency histogram, so p50/p95/p99
+    are available at any time without keeping samples. A timed call costs two
+    perf_counter calls and one histogram increment, the measured cost per call is
+    reported as overheadPercent of the wall time in the summary.
+
+    Usage:
+        profiler.set_camera(cam_id)
+        with profiler.stage("ppe", items=len(person_bboxes)):
+            ...
+        profiler.record("queueWait", seconds)
+
+    Attributes:
+        enabled (bool): if False stage() returns a shared no-op context manager
+        reportInterval (float): seconds between summaries in the log and dump file
+        dumpPath (str): json file with the latest summary, None to disable
+        camId (str): camera of the stages being timed
+        stats (dict): camera id --> stage name --> stageStats
+
+    Methods:
+        stage: context manager timing one call of a stage
+        record: add an already measured duration, eg: queue waits
+        maybe_report: log and dump summary if reportInterval has passed
+        summary: machine readable summary of all stages
+        dump: write summary to dumpPath
+    """
+
+    def __init__(self, profiler_config):
+        """
+        Args:
+            profiler_config (dict): "profiler" field of main config
+        """
+        self.enabled = profiler_config.get("enabled", False)
+        self.reportInterval = profiler_config.get("reportIntervalSec", 60)
+        self.dumpPath = profiler_config.get("dumpPath")
+        self.camId = None
+        self.stats = dict()
+        self.startTime = time.perf_counter()
+        self.lastReportTime = time.monotonic()
+        self.timerCost = self.measure_timer_cost() if self.enabled else 0.0
+
+    def measure_timer_cost(self, calls=2000):
+        """Seconds spent by one timed call on an empty stage, used for overhead reporting"""
+        stats = stageStats()
+        # calibration calls are not spans of the trace
+        trace_enabled, tracer.enabled = tracer.enabled, False
+        start = time.perf_counter()
+        for _ in range(calls):
+            with _stageTimer(stats, 1, "calibration"):
+                pass
+        cost = (time.perf_counter() - start) / calls
+        tracer.enabled = trace_enabled
+        return cost
+
+    def set_camera(self, cam_id):
+        self.camId = cam_id
+
+    def get_stats(self, stage_name):
+        camera_stats = self.stats.get(self.camId)
+        if camera_stats is None:
+            camera_stats = self.stats[self.camId] = dict()
+        stats = camera_stats.get(stage_name)
+        if stats is None:
+            stats = camera_stats[stage_name] = stageStats()
+        return stats
+
+    def stage(self, stage_name, items=None):
+        """Time one call of a stage of current camera
+
+        Args:
+            stage_name (str): eg: "personDetection"
+            items (int, optional): items handled by this call, eg: number of person crops
+        """
+        if not self.enabled:
+            if tracer.enabled:
+                return tracer.span(stage_name, "stage", None if items is None else {"items": items})
+            return _noop_timer
+        return _stageTimer(self.get_stats(stage_name), items, stage_name)
+
+    def record(self, stage_name, seconds, items=None):
+        """Add a duration measured outside a with block, eg: time a frame waited in a batch"""
+        if self.enabled:
+            self.get_stats(stage_name).add(seconds, items)
+
+    def summary(self):
+        """
+        Returns:
+            dict: wallSeconds, overheadPercent and per camera per stage stats
+        """
+        wall_seconds = time.perf_counter() - self.startTime
+        calls = sum(stats.calls for camera_stats in self.stats.values() for stats in camera_stats.values())
+        return {
+            "wallSeconds": wall_seconds,
+            "overheadPercent": 100.0 * calls * self.timerCost / wall_seconds if wall_seconds else 0.0,
+            "cameras": {
+                cam_id: {stage_name: stats.summary() for stage_name, stats in camera_stats.items()}
+                for cam_id, camera_stats in self.stats.items()
+            },
+        }
+
+    def maybe_report(self):
+        """Log and dump the summary every reportInterval seconds, cheap to call every frame"""
+        if not self.enabled or time.monotonic() - self.lastReportTime < self.reportInterval:
+            return
+        self.report()
+
+    def report(self):
+        """Log a one line summary per stage and dump the full summary"""
+        self.lastReportTime = time.monotonic()
+        summary = self.summary()
+        for cam_id, camera_stats in summary["cameras"].items():
+            for stage_name, stats in camera_stats.items():
+                logger.info(
+                    "%s %s: calls %d p50 %.2fms p95 %.2fms p99 %.2fms items/call %.1f",
+                    cam_id, stage_name, stats["calls"], stats["p50Ms"], stats["p95Ms"], stats["p99Ms"],
+                    stats["itemsPerCall"],
+                )
+        logger.info("profiler overhead %.3f%% of wall time", summary["overheadPercent"])
+        self.dump(summary)
+
+    def dump(self, summary=None):
+        """Write summary as json to dumpPath, atomically so readers never see a partial file"""
+        if not self.enabled or not self.dumpPath:
+            return
+        if summary is None:
+            summary = self.summary()
+        dump_dir = os.path.dirname(self.dumpPath)
+        if dump_dir:
+            os.makedirs(dump_dir, exist_ok=True)
+        with open(self.dumpPath + ".tmp", "w") as f:
+            json.dump(summary, f, indent=2)
+        os.replace(self.dumpPath + ".tmp", self.dumpPath)
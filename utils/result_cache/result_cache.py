@@ -0,0 +1,207 @@
+import glob
+import hashlib
+import json
+import logging
+import mmap
+import os
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# hash of a file is reused while its size and mtime don't change, so looping over
+# the same videos only hashes them once per process
+_file_hash_memo = dict()
+
+
+def hash_file(file_path, chunk_size=1 << 20):
+    """sha1 of the file content, memoized on (path, size, mtime)
+
+    Args:
+        file_path (str): path of file
+        chunk_size (int): read size
+
+    Returns:
+        str: hex digest
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _file_hash_memo:
+        return _file_hash_memo[memo_key]
+    sha = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    _file_hash_memo[memo_key] = sha.hexdigest()
+    return _file_hash_memo[memo_key]
+
+
+def hash_config(config):
+    """sha1 of a json serializable config, independent of key order"""
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class resultCacheWriter:
+    """Writes the results of every frame of one video into the cache.
+    The data file is a concatenation of json blobs, the index file is a
+    (number of frames, 2) int64 array of (offset, length) per frame id.
+    Length -1 means the frame had nothing to draw (process_frame returned early).
+    The index is written last with an atomic rename, so a video that was not
+    processed till the end never produces a usable cache entry.
+    """
+
+    def __init__(self, data_path, index_path):
+        self.dataPath = data_path
+        self.indexPath = index_path
+        self.dataFile = open(data_path + ".tmp", "wb")
+        self.offset = 0
+        self.index = []
+
+    def add(self, frame_id, results):
+        """Append results of one frame
+
+        Args:
+            frame_id (int): frame id, must be consecutive from 0
+            results (dict or None): fullImageResults or None if nothing to draw
+        """
+        if frame_id != len(self.index):
+            raise ValueError(
+                "frames must be cached in order, expected {} got {}".format(len(self.index), frame_id)
+            )
+        if results is None:
+            self.index.append((self.offset, -1))
+            return
+        # numpy values from the models are converted to python numbers
+        blob = json.dumps(results, default=lambda value: value.item()).encode("utf-8")
+        self.dataFile.write(blob)
+        self.index.append((self.offset, len(blob)))
+        self.offset += len(blob)
+
+    def finalize(self):
+        """Close data file and write the index, this marks the entry as complete"""
+        self.dataFile.close()
+        os.replace(self.dataPath + ".tmp", self.dataPath)
+        index = np.array(self.index, dtype=np.int64).reshape(-1, 2)
+        with open(self.indexPath + ".tmp", "wb") as f:
+            np.save(f, index)
+        os.replace(self.indexPath + ".tmp", self.indexPath)
+
+    def abort(self):
+        """Drop a partially written entry"""
+        self.dataFile.close()
+        if os.path.exists(self.dataPath + ".tmp"):
+            os.remove(self.dataPath + ".tmp")
+
+
+class resultCacheReader:
+    """Serves the cached results of one video from a memory mapped data file.
+    Only the pages of the frames being read are loaded, the index is memory mapped too.
+    """
+
+    def __init__(self, data_path, index_path):
+        self.index = np.load(index_path, mmap_mode="r")
+        self.dataFile = open(data_path, "rb")
+        # mmap of an empty file is not allowed, a video with no results has nothing to map
+        self.data = None
+        if os.path.getsize(data_path):
+            self.data = mmap.mmap(self.dataFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, frame_id):
+        """Get results of one frame
+
+        Returns:
+            dict or None: fullImageResults or None if nothing was drawn on the frame
+        """
+        offset, length = self.index[frame_id]
+        if length < 0:
+            return None
+        return json.loads(self.data[offset : offset + length])
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+        self.dataFile.close()
+
+
+class resultReplayCache:
+    """Persistent cache of process_frame results, used when the server keeps
+    looping over the same videos. An entry is keyed by
+    (video content hash, model weights hash, config hash) and holds the results
+    of every frame id of that video, so on later loops no model has to be loaded
+    and frames are only decoded and drawn.
+
+    Changing a weight file or any field of the camera or main config changes the
+    key, the stale entries of that video are deleted when the new entry is complete.
+
+    Attributes:
+        cacheDir (str): dir where entries are stored
+
+    Methods:
+        get_key: build the cache key of a video
+        get_reader: reader for a complete entry or None on miss
+        get_writer: writer for a new entry
+        remove_stale_entries: delete entries of the same video with old keys
+    """
+
+    def __init__(self, cache_dir):
+        self.cacheDir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_key(self, video_path, weight_paths, camera_config, main_config):
+        """Build the cache key of a video
+
+        Args:
+            video_path (str): path of video
+            weight_paths (list): weight files of every model used for this camera
+            camera_config (dict): camera config
+            main_config (dict): fields of main config the results depend on (thresholds,
+                class lists, tracker), see VideoProcessor.get_results_config
+
+        Returns:
+            str: key used as file name prefix
+        """
+        weights_sha = hashlib.sha1()
+        for weight_path in sorted(weight_paths):
+            # missing weights (eg: pretrained download) are keyed by path only
+            if os.path.isfile(weight_path):
+                weights_sha.update(hash_file(weight_path).encode("utf-8"))
+            else:
+                weights_sha.update(weight_path.encode("utf-8"))
+        return "{}_{}_{}".format(
+            hash_file(video_path)[:16],
+            weights_sha.hexdigest()[:16],
+            hash_config([camera_config, main_config])[:16],
+        )
+
+    def get_paths(self, key):
+        return (
+            os.path.join(self.cacheDir, key + ".bin"),
+            os.path.join(self.cacheDir, key + ".idx.npy"),
+        )
+
+    def get_reader(self, key):
+        """Get reader of a complete entry
+
+        Returns:
+            resultCacheReader or None: None if the entry does not exist
+        """
+        data_path, index_path = self.get_paths(key)
+        if not (os.path.exists(data_path) and os.path.exists(index_path)):
+            return None
+        return resultCacheReader(data_path, index_path)
+
+    def get_writer(self, key):
+        data_path, index_path = self.get_paths(key)
+        return resultCacheWriter(data_path, index_path)
+
+    def remove_stale_entries(self, key):
+        """Delete the entries of the same video made with other weights or configs"""
+        video_hash = key.split("_")[0]
+        for path in glob.glob(os.path.join(self.cacheDir, video_hash + "_*")):
+            if not os.path.basename(path).startswith(key + "."):
+                os.remove(path)
+                logger.info("Removed stale result cache file %s", path)
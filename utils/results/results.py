@@ -1,12 +1,57 @@
 import logging
 
-from shapely.geometry import Point, Polygon
 import json
 
+from utils.camera_config.camera_config import compile_camera_config
+
 # Configure logging
 logging.basicConfig(level=logging.WARNING)
 
 
+def extract_violations(full_image_results):
+    """Flatten the violations present in one fullImageResults dict.
+    The same rules as drawOnFrames are used, eg: a ppe with value 0 is a violation.
+
+    Args:
+        full_image_results (dict): results of one frame from jsonResultsManager
+
+    Returns:
+        list of tuples: (violation_type, detail, track_id, zone_name)
+    """
+    violations = []
+    for person in full_image_results["personResults"]:
+        track_id = person["personId"]
+        zone_name = None
+        if "zoneInformation" in person and person["zoneInformation"]["withinZone"]:
+            zone_name = person["zoneInformation"]["zoneName"]
+            violations.append(("zone", zone_name, track_id, zone_name))
+        # ppe value 0 means ppe missing while body part is visible
+        for ppe, status in person.get("ppeResults", {}).items():
+            if status == 0:
+                violations.append(("ppe", ppe, track_id, zone_name))
+        if person.get("fallDetected"):
+            violations.append(("fall", None, track_id, zone_name))
+
+    fire_smoke = full_image_results.get("fire_and_smoke")
+    if fire_smoke:
+        if fire_smoke["fire_detected"]:
+            violations.append(("fire", None, None, None))
+        if fire_smoke["smoke_detected"]:
+            violations.append(("smoke", None, None, None))
+
+    if full_image_results.get("garbageDetection", {}).get("garbage_detected"):
+        violations.append(("garbage", None, None, None))
+
+    if full_image_results.get("spillDetection", {}).get("spill_detected"):
+        violations.append(("spill", None, None, None))
+
+    for zone_id, zone_results in full_image_results.get("triphazardDetection", {}).items():
+        if zone_results["status"]:
+            violations.append(("tripHazard", zone_id, None, None))
+
+    return violations
+
+
 class jsonResultsManager:
     """This class is responsible for adding results in json and calculating
     the person within the zone
@@ -20,21 +65,23 @@ class jsonResultsManager:
         """Constructor for defining the schema for results
 
         Args:
-            camera_config (dict): Camera cofig
+            camera_config (cameraConfig or dict): Camera cofig, dicts are compiled
         """
-        self.cameraConfig = camera_config
-        self.camId = camera_config["camID"]
-        self.description = camera_config["description"]
+        self.cameraConfig = compile_camera_config(camera_config)
+        self.camId = self.cameraConfig.camID
+        self.description = self.cameraConfig.description
         self.fullImageResults = None
         self.onePersonResults = None
         
         
-    def init_template(self, camera_config):
+    def init_template(self, camera_config=None):
         """Initialize the templates for fullImageResults and onePersonResults
 
         Args:
-            camera_config (dict): Video config file
+            camera_config (cameraConfig or dict, optional): Video config file, defaults
+                to the camera config of this manager
         """
+        camera_config = self.cameraConfig if camera_config is None else compile_camera_config(camera_config)
         self.fullImageResults = self.define_full_image_results_schema(camera_config)
         self.onePersonResults = self.define_single_person_results_schema(camera_config)
         
@@ -58,6 +105,7 @@ class jsonResultsManager:
 
         """
         fullImageResults = dict()
+        analytics = camera_config.analytics
         # camera id comes from camera json
         fullImageResults["camId"] = self.camId
         # Description about the camera comes from  camera json
@@ -69,10 +117,10 @@ class jsonResultsManager:
         # Individual person results
         fullImageResults["personResults"] = []      
           
-        if camera_config["analytics"]["fallDetection"]:
+        if analytics["fallDetection"]:
             fullImageResults["fallDetected"] = False
             
-        if camera_config["analytics"].get("fire_smoke_detection", False):
+        if analytics["fire_smoke_detection"]:
             # define dict for fire and smoke detection results
             fullImageResults["fire_and_smoke"] = {
                 "fire": [],
@@ -81,41 +129,29 @@ class jsonResultsManager:
                 "smoke_detected": False,
             }
                 
-        if camera_config["analytics"]["garbageDetection"]:
+        if analytics["garbageDetection"]:
             # define dict for garbage detection results
             fullImageResults["garbageDetection"] = {
                 "garbage":[],
                 "garbage_detected":False
             }
 
-        if camera_config["analytics"]["tripHazardDetection"]:
-            # define dict for trip hazard detection results
-            fullImageResults["triphazardDetection"] = dict()
-            # Iterate through all zones in camera config
-            for each_zone in camera_config["tripzones"]:
-                zone_id = camera_config["tripzones"][each_zone]["id"]
-                # Initialize the structure for the current zone with status and empty bounding boxes
-                fullImageResults["triphazardDetection"][str(zone_id)] = {
-                    "status": False,
-                    "object_bbox": []
-                }        if camera_config["analytics"]["spillDetection"]:
+        if analytics["tripHazardDetection"]:
+            # status and empty bounding boxes for every trip zone, keyed by zone id
+            fullImageResults["triphazardDetection"] = {
+                zone_id: {"status": False, "object_bbox": []} for zone_id in camera_config.tripZoneIds
+            }
+
+        if analytics["spillDetection"]:
             fullImageResults["spillDetection"] = {
                 "spill":[],
                 "spill_detected":False
             }
 
-
-
         # Add results template if working with person in zone counting
-        if camera_config["analytics"]["personInZoneCounting"]:
-            # define dict for full results
-            fullImageResults["personCountInZone"] = dict()
-            # Iterate through all zones in camera config
-            for each_zone in camera_config["zones"]:
-                # Get zone name
-                zone_name = camera_config["zones"][each_zone]["name"]
-                # add zone name in camera config
-                fullImageResults["personCountInZone"][zone_name] = 0
+        if analytics["personInZoneCounting"]:
+            # person count of every zone, keyed by zone name
+            fullImageResults["personCountInZone"] = dict.fromkeys(camera_config.zoneNames, 0)
         return fullImageResults
 
     def define_single_person_results_schema(self, camera_config):
@@ -155,7 +191,7 @@ class jsonResultsManager:
         }
 
         Args:
-            camera_config (dict): camera configuration
+            camera_config (cameraConfig): camera configuration
         """
         one_person_results = dict()
         only_person_results = {
@@ -166,11 +202,11 @@ class jsonResultsManager:
         one_person_results.update(only_person_results)
 
         # Add fall detection if we are working with fall detection
-        if camera_config["analytics"]["fallDetection"]:
+        if camera_config.analytics["fallDetection"]:
             one_person_results["fallDetected"] = False
             
         # Add zone information in person results if we are working person within the zone
-        if camera_config["analytics"]["personInZoneCounting"]:
+        if camera_config.analytics["personInZoneCounting"]:
             zone_results = {
                 "zoneInformation": {
                     "withinZone": False,
@@ -183,34 +219,27 @@ class jsonResultsManager:
 
         # Add ppe information in person results if we are working with ppe detection
         # Please note we may not want all ppes to be detected so will have to be filtered
-        # Camera config of contains for which ppe we want to detect
-        if camera_config["analytics"]["ppeDetection"]:
-            ppe_dict = {"ppeResults": {}}
-            
-            for items,status in camera_config["ppeDetection"].items():
-                
-                if status:
-                    ppe_dict["ppeResults"][items] = False
-            if not ppe_dict:
-                logging.warning(
-                    "You have marked analytics-->ppeDetection as true but all ppes from ppeDetection are false. Please double check"
-                )
-
-            one_person_results.update(ppe_dict)
+        # Camera config contains for which ppe we want to detect, see cameraConfig.enabledPpe
+        if camera_config.analytics["ppeDetection"]:
+            one_person_results["ppeResults"] = dict.fromkeys(camera_config.enabledPpe, False)
         return one_person_results
 
-    def add_person_results(self, person_bboxes, frame_id):
+    def add_person_results(self, person_bboxes, frame_id, global_ids=None):
         """Append the person results from predictions to json
 
         Args:
             person_bboxes (list of lists): Person predictions from person detection model
             frame_id (int): frame id
+            global_ids (dict, optional): track id --> cross camera global id, added as
+                "globalPersonId" when given
         """
         
         # Iterate through each person prediction
         for person_bbox in person_bboxes:
             # APPEnd and update the results
             self.onePersonResults["personId"] = int(person_bbox[4])
+            if global_ids is not None:
+                self.onePersonResults["globalPersonId"] = global_ids.get(int(person_bbox[4]))
             self.onePersonResults["boundingBox"]["xMin"] = person_bbox[0]
             self.onePersonResults["boundingBox"]["yMin"] = person_bbox[1]
             self.onePersonResults["boundingBox"]["xMax"] = person_bbox[2]
@@ -328,30 +357,20 @@ class jsonResultsManager:
             # Calculate the center point of the bounding box
             center_x = (xmin + xmax) / 2
             center_y = (ymin + ymax) / 2
-            center_point = Point(center_x, center_y)
-
-            # Iterate through each trip zone directly from the cameraConfig
-            for zone_data in self.cameraConfig["tripzones"].values():
-                zone_points = zone_data.get("zonePoints", [])
-                zone_id = zone_data.get("id", None)
-
-                # if zone points are valid and create a polygon
-                if zone_points:
-                    zone_polygon = Polygon(zone_points)
-
-                    # if the center point is inside the zone
-                    if center_point.within(zone_polygon):
-                        # Add the bounding box to the zone's bbox list
-                        self.fullImageResults["triphazardDetection"][str(zone_id)]["object_bbox"].append([
-                            int(xmin),
-                            int(ymin),
-                            int(xmax),
-                            int(ymax)
-                        ])
-
-                        # Update the zone's status to True since we have detected a hazard
-                        self.fullImageResults["triphazardDetection"][str(zone_id)]["status"] = True
-                        break  
-                # else:
-                #     logging.warning(f"No zone points found for zone ID {zone_id}")
 
+            # Iterate through each trip zone of the camera config, polygons are built once there
+            for zone in self.cameraConfig.tripzones:
+                # if the center point is inside the zone, zones without points contain nothing
+                if zone.contains(center_x, center_y):
+                    zone_results = self.fullImageResults["triphazardDetection"][str(zone.id)]
+                    # Add the bounding box to the zone's bbox list
+                    zone_results["object_bbox"].append([
+                        int(xmin),
+                        int(ymin),
+                        int(xmax),
+                        int(ymax)
+                    ])
+
+                    # Update the zone's status to True since we have detected a hazard
+                    zone_results["status"] = True
+                    break  
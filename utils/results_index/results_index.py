@@ -0,0 +1,389 @@
+import logging
+import os
+import sqlite3
+import time
+
+from utils.results.results import extract_violations
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class resultsIndex:
+    """Local SQLite index over the per-frame results produced by jsonResultsManager.
+    Every frame is flattened into a few narrow rows (one row per frame, one per
+    violation and one per zone count) so questions like "all PPE violations on
+    camera X between T1 and T2" become an indexed lookup instead of grepping json.
+
+    Rows are buffered in memory and written with executemany inside a single
+    transaction, either when the buffer reaches batchSize rows or when
+    flushInterval seconds have passed since the last write. The database runs
+    in WAL mode so queries can be served while a pipeline is indexing.
+
+    Attributes:
+        databasePath (str): Path to the sqlite file
+        batchSize (int): Number of buffered rows that triggers a write
+        flushInterval (float): Max seconds rows stay buffered before a write
+        conn: sqlite3 connection used for writing and querying
+        pendingFrames, pendingViolations, pendingZoneCounts, pendingEvents (list): buffered rows
+
+    Methods:
+        add_results: flatten one fullImageResults dict and buffer its rows
+        add_events: buffer the events of violationEventEngine
+        flush: write all buffered rows in one transaction
+        query_violations: filter violations by camera, time, frame, type, track and zone
+        query_zone_counts: filter zone counts by camera, zone, time and minimum count
+        query_frames: filter indexed frames by camera and time
+        query_events: filter violation events by camera, time, type and track
+        close: flush and close the connection
+    """
+
+    def __init__(self, database_path, batch_size=500, flush_interval=1.0):
+        """
+        Args:
+            database_path (str): Path to the sqlite file, created if it does not exist.
+                Please don't use the ".db" extension, VideoProcessor deletes those at startup.
+            batch_size (int): Number of buffered rows that triggers a write
+            flush_interval (float): Max seconds rows stay buffered before a write
+        """
+        self.databasePath = database_path
+        self.batchSize = batch_size
+        self.flushInterval = flush_interval
+        self.pendingFrames = []
+        self.pendingViolations = []
+        self.pendingZoneCounts = []
+        self.pendingEvents = []
+        self.lastFlushTime = time.monotonic()
+
+        database_dir = os.path.dirname(database_path)
+        if database_dir:
+            os.makedirs(database_dir, exist_ok=True)
+        # check_same_thread is off so a pipeline thread can write and another thread can query
+        self.conn = sqlite3.connect(database_path, check_same_thread=False)
+        self.init_database()
+
+    def init_database(self):
+        """Create the tables and indexes if they don't exist yet"""
+        c = self.conn.cursor()
+        # WAL lets readers run while we are writing, NORMAL sync is safe with WAL
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("PRAGMA synchronous=NORMAL")
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS Frames
+                    (cam_id TEXT,
+                    frame_id INTEGER,
+                    timestamp REAL,
+                    person_count INTEGER)"""
+        )
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS Violations
+                    (cam_id TEXT,
+                    frame_id INTEGER,
+                    timestamp REAL,
+                    violation_type TEXT,
+                    detail TEXT,
+                    track_id INTEGER,
+                    zone_name TEXT)"""
+        )
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS ZoneCounts
+                    (cam_id TEXT,
+                    frame_id INTEGER,
+                    timestamp REAL,
+                    zone_name TEXT,
+                    person_count INTEGER)"""
+        )
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS Events
+                    (cam_id TEXT,
+                    frame_id INTEGER,
+                    timestamp REAL,
+                    event TEXT,
+                    violation_type TEXT,
+                    detail TEXT,
+                    track_id INTEGER,
+                    value TEXT,
+                    start_frame INTEGER,
+                    duration_frames INTEGER)"""
+        )
+        c.execute("CREATE INDEX IF NOT EXISTS idx_frames_cam_time ON Frames (cam_id, timestamp)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_frames_cam_frame ON Frames (cam_id, frame_id)")
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_violations_cam_type_time ON Violations (cam_id, violation_type, timestamp)"
+        )
+        c.execute("CREATE INDEX IF NOT EXISTS idx_violations_cam_frame ON Violations (cam_id, frame_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_violations_track ON Violations (track_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_violations_zone ON Violations (zone_name)")
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_zonecounts_cam_zone_time ON ZoneCounts (cam_id, zone_name, timestamp)"
+        )
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_events_cam_type_time ON Events (cam_id, violation_type, timestamp)"
+        )
+        c.execute("CREATE INDEX IF NOT EXISTS idx_events_track ON Events (track_id)")
+        self.conn.commit()
+
+    def add_results(self, full_image_results, timestamp=None):
+        """Buffer the rows of one frame, writes to db when buffer is full or old enough
+
+        Args:
+            full_image_results (dict): results of one frame from jsonResultsManager
+            timestamp (float, optional): epoch seconds of the frame. Defaults to now.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        cam_id = full_image_results["camId"]
+        frame_id = int(full_image_results["frameID"])
+
+        self.pendingFrames.append(
+            (cam_id, frame_id, timestamp, full_image_results["personCount"])
+        )
+        for violation_type, detail, track_id, zone_name in extract_violations(full_image_results):
+            self.pendingViolations.append(
+                (cam_id, frame_id, timestamp, violation_type, detail, track_id, zone_name)
+            )
+        for zone_name, count in full_image_results.get("personCountInZone", {}).items():
+            self.pendingZoneCounts.append((cam_id, frame_id, timestamp, zone_name, count))
+
+        self.flush_if_needed()
+
+    def add_events(self, events, timestamp=None):
+        """Buffer the events emitted by violationEventEngine
+
+        Args:
+            events (list of dict): events of one frame
+            timestamp (float, optional): epoch seconds of the frame. Defaults to now.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        for event in events:
+            self.pendingEvents.append(
+                (
+                    event["camId"],
+                    event["frameID"],
+                    timestamp,
+                    event["event"],
+                    event["type"],
+                    event["detail"],
+                    event["trackId"],
+                    None if event["value"] is None else str(event["value"]),
+                    event["startFrame"],
+                    event["durationFrames"],
+                )
+            )
+        self.flush_if_needed()
+
+    def flush_if_needed(self):
+        """Flush when enough rows are buffered or they are buffered for too long"""
+        pending_rows = (
+            len(self.pendingFrames)
+            + len(self.pendingViolations)
+            + len(self.pendingZoneCounts)
+            + len(self.pendingEvents)
+        )
+        if (
+            pending_rows >= self.batchSize
+            or time.monotonic() - self.lastFlushTime >= self.flushInterval
+        ):
+            self.flush()
+
+    def flush(self):
+        """Write all the buffered rows in a single transaction"""
+        self.lastFlushTime = time.monotonic()
+        if not (
+            self.pendingFrames or self.pendingViolations or self.pendingZoneCounts or self.pendingEvents
+        ):
+            return
+        # "with conn" wraps everything in one transaction and rollbacks on error
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO Frames VALUES (?, ?, ?, ?)", self.pendingFrames
+            )
+            self.conn.executemany(
+                "INSERT INTO Violations VALUES (?, ?, ?, ?, ?, ?, ?)", self.pendingViolations
+            )
+            self.conn.executemany(
+                "INSERT INTO ZoneCounts VALUES (?, ?, ?, ?, ?)", self.pendingZoneCounts
+            )
+            self.conn.executemany(
+                "INSERT INTO Events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self.pendingEvents
+            )
+        self.pendingFrames.clear()
+        self.pendingViolations.clear()
+        self.pendingZoneCounts.clear()
+        self.pendingEvents.clear()
+
+    def build_where_clause(self, filters):
+        """Build sql where clause from (sql condition, value) pairs, None values are skipped
+
+        Args:
+            filters (list of tuples): eg: [("cam_id = ?", "cam1.mp4"), ("timestamp >= ?", None)]
+
+        Returns:
+            str, list: where clause and the values to bind
+        """
+        conditions = []
+        values = []
+        for condition, value in filters:
+            if value is None:
+                continue
+            conditions.append(condition)
+            values.append(value)
+        if not conditions:
+            return "", values
+        return " WHERE " + " AND ".join(conditions), values
+
+    def run_query(self, query, values):
+        """Run a select query and return rows as list of dicts"""
+        # make buffered rows visible before reading
+        self.flush()
+        c = self.conn.execute(query, values)
+        columns = [description[0] for description in c.description]
+        return [dict(zip(columns, row)) for row in c.fetchall()]
+
+    def query_violations(
+        self,
+        cam_id=None,
+        violation_type=None,
+        detail=None,
+        track_id=None,
+        zone_name=None,
+        start_time=None,
+        end_time=None,
+        start_frame=None,
+        end_frame=None,
+        limit=None,
+    ):
+        """Get violations filtered by any combination of the arguments, None means no filter.
+
+        Args:
+            cam_id (str): camera id eg: "Red_zone_creation.mp4"
+            violation_type (str): one of zone, ppe, fall, fire, smoke, garbage, spill, tripHazard
+            detail (str): ppe name for ppe violations, zone name or trip zone id for zone ones
+            track_id (int): person track id
+            zone_name (str): zone the person was in
+            start_time, end_time (float): epoch seconds, both inclusive
+            start_frame, end_frame (int): frame ids, both inclusive
+            limit (int): max number of rows
+
+        Returns:
+            list of dict: violation rows ordered by time
+        """
+        where, values = self.build_where_clause(
+            [
+                ("cam_id = ?", cam_id),
+                ("violation_type = ?", violation_type),
+                ("detail = ?", detail),
+                ("track_id = ?", track_id),
+                ("zone_name = ?", zone_name),
+                ("timestamp >= ?", start_time),
+                ("timestamp <= ?", end_time),
+                ("frame_id >= ?", start_frame),
+                ("frame_id <= ?", end_frame),
+            ]
+        )
+        query = "SELECT * FROM Violations" + where + " ORDER BY timestamp, frame_id"
+        if limit is not None:
+            query += " LIMIT ?"
+            values.append(int(limit))
+        return self.run_query(query, values)
+
+    def query_zone_counts(
+        self,
+        cam_id=None,
+        zone_name=None,
+        min_count=None,
+        start_time=None,
+        end_time=None,
+        limit=None,
+    ):
+        """Get per frame person count of zones, eg: frames where zone1 count > 0
+        is query_zone_counts(zone_name="zone1", min_count=1)
+
+        Args:
+            cam_id (str): camera id
+            zone_name (str): name of the zone
+            min_count (int): minimum person count in zone, inclusive
+            start_time, end_time (float): epoch seconds, both inclusive
+            limit (int): max number of rows
+
+        Returns:
+            list of dict: zone count rows ordered by time
+        """
+        where, values = self.build_where_clause(
+            [
+                ("cam_id = ?", cam_id),
+                ("zone_name = ?", zone_name),
+                ("person_count >= ?", min_count),
+                ("timestamp >= ?", start_time),
+                ("timestamp <= ?", end_time),
+            ]
+        )
+        query = "SELECT * FROM ZoneCounts" + where + " ORDER BY timestamp, frame_id"
+        if limit is not None:
+            query += " LIMIT ?"
+            values.append(int(limit))
+        return self.run_query(query, values)
+
+    def query_frames(self, cam_id=None, start_time=None, end_time=None, limit=None):
+        """Get indexed frames of a camera between two timestamps
+
+        Returns:
+            list of dict: frame rows ordered by time
+        """
+        where, values = self.build_where_clause(
+            [
+                ("cam_id = ?", cam_id),
+                ("timestamp >= ?", start_time),
+                ("timestamp <= ?", end_time),
+            ]
+        )
+        query = "SELECT * FROM Frames" + where + " ORDER BY timestamp, frame_id"
+        if limit is not None:
+            query += " LIMIT ?"
+            values.append(int(limit))
+        return self.run_query(query, values)
+
+    def query_events(
+        self,
+        cam_id=None,
+        event=None,
+        violation_type=None,
+        track_id=None,
+        start_time=None,
+        end_time=None,
+        limit=None,
+    ):
+        """Get violation events filtered by any combination of the arguments
+
+        Args:
+            cam_id (str): camera id
+            event (str): one of start, update, end
+            violation_type (str): same types as violations plus zoneOccupancy
+            track_id (int): person track id
+            start_time, end_time (float): epoch seconds, both inclusive
+            limit (int): max number of rows
+
+        Returns:
+            list of dict: event rows ordered by time
+        """
+        where, values = self.build_where_clause(
+            [
+                ("cam_id = ?", cam_id),
+                ("event = ?", event),
+                ("violation_type = ?", violation_type),
+                ("track_id = ?", track_id),
+                ("timestamp >= ?", start_time),
+                ("timestamp <= ?", end_time),
+            ]
+        )
+        query = "SELECT * FROM Events" + where + " ORDER BY timestamp, frame_id"
+        if limit is not None:
+            query += " LIMIT ?"
+            values.append(int(limit))
+        return self.run_query(query, values)
+
+    def close(self):
+        """Flush the pending rows and close the connection"""
+        self.flush()
+        self.conn.close()
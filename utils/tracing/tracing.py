@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _spanTimer:
+    """Context manager recording one complete span"""
+
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.add_span(self.name, self.category, self.start, time.perf_counter() - self.start, self.args)
+        return False
+
+
+class _noopSpan:
+    """Shared context manager used while tracing is disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_noop_span = _noopSpan()
+
+
+class chromeTracer:
+    """Records spans of the pipeline and writes them in Chrome trace event format,
+    the output can be loaded in https://ui.perfetto.dev or chrome://tracing.
+
+    Every span is a complete ("X") event with pid, tid, timestamp and duration in
+    microseconds of the monotonic clock, so spans of different threads and of chunk
+    worker processes line up on the same timeline. The current frame id is added to
+    the args of every span.
+
+    There is one tracer per process (see `tracer` below) so deep calls like reid
+    database operations or model calls can add spans without passing it around.
+
+    Attributes:
+        enabled (bool): if False span() returns a shared no-op context manager
+        outputDir (str): dir where trace files are written
+        maxEvents (int): spans kept in memory, later spans are dropped and counted
+        frameId (int): frame id added to spans
+        events (list): recorded trace events
+
+    Methods:
+        configure: enable or disable tracing from the "tracing" field of main config
+        set_frame: set frame id of next spans
+        span: context manager recording one span
+        add_span: add an already measured span
+        save: write recorded events to a trace file
+        merge: add events of another trace file, eg: from a chunk worker
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.outputDir = "traces"
+        self.maxEvents = 1000000
+        self.frameId = None
+        self.events = []
+        self.droppedEvents = 0
+        self.threadNames = dict()
+        self.pid = os.getpid()
+
+    def configure(self, trace_config, enabled=None):
+        """
+        Args:
+            trace_config (dict): "tracing" field of main config
+            enabled (bool, optional): overrides trace_config["enabled"], eg: from command line
+        """
+        self.enabled = trace_config.get("enabled", False) if enabled is None else enabled
+        self.outputDir = trace_config.get("outputDir", self.outputDir)
+        self.maxEvents = trace_config.get("maxEvents", self.maxEvents)
+        self.pid = os.getpid()
+
+    def set_frame(self, frame_id):
+        self.frameId = frame_id
+
+    def span(self, name, category="stage", args=None):
+        """Record the time spent in a with block
+
+        Args:
+            name (str): span name, eg: "ppeModel"
+            category (str): eg: "stage", "model", "reid"
+            args (dict, optional): extra values shown with the span, eg: number of crops
+        """
+        if not self.enabled:
+            return _noop_span
+        return _spanTimer(self, name, category, args)
+
+    def add_span(self, name, category, start, duration, args=None):
+        """Add a span measured with time.perf_counter
+
+        Args:
+            name (str): span name
+            category (str): span category
+            start (float): perf_counter at start
+            duration (float): seconds
+            args (dict, optional): extra values shown with the span
+        """
+        if len(self.events) >= self.maxEvents:
+            self.droppedEvents += 1
+            return
+        tid = threading.get_ident()
+        if tid not in self.threadNames:
+            self.threadNames[tid] = threading.current_thread().name
+        span_args = {"frameId": self.frameId}
+        if args:
+            span_args.update(args)
+        self.events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": start * 1e6,
+                "dur": duration * 1e6,
+                "pid": self.pid,
+                "tid": tid,
+                "args": span_args,
+            }
+        )
+
+    def get_metadata_events(self, process_name):
+        """Process and thread name events shown by the trace viewers"""
+        events = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": process_name}}]
+        for tid, thread_name in self.threadNames.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": thread_name}})
+        return events
+
+    def merge(self, trace_path):
+        """Add the events of another trace file and delete it
+
+        Args:
+            trace_path (str): trace written by save in another process
+        """
+        with open(trace_path) as f:
+            self.events.extend(json.load(f)["traceEvents"])
+        os.remove(trace_path)
+
+    def save(self, name):
+        """Write recorded events to <outputDir>/<name>.trace.json and clear them
+
+        Args:
+            name (str): trace name, eg: video name
+
+        Returns:
+            str or None: path of trace file, None if tracing is disabled
+        """
+        if not self.enabled:
+            return None
+        os.makedirs(self.outputDir, exist_ok=True)
+        trace_path = os.path.join(self.outputDir, name + ".trace.json")
+        with open(trace_path, "w") as f:
+            json.dump(
+                {"traceEvents": self.get_metadata_events(name) + self.events, "displayTimeUnit": "ms"}, f
+            )
+        if self.droppedEvents:
+            logger.warning("Trace %s is missing %d spans, increase tracing.maxEvents", name, self.droppedEvents)
+        logger.info("Wrote %d spans to %s", len(self.events), trace_path)
+        self.events = []
+        self.droppedEvents = 0
+        return trace_path
+
+
+# tracer of this process
+tracer = chromeTracer()
@@ -0,0 +1,235 @@
+import logging
+
+import numpy as np
+
+from utils.detection_log import detection_log
+from utils.detection_log.detection_log import detectionLogReader, detectionLogWriter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def split_into_chunks(total_frames, num_chunks, overlap_frames):
+    """Split frame ids of a video into consecutive chunks. Every chunk except the
+    first starts overlap_frames early, those frames warm up the tracker of the chunk
+    and are used to stitch its tracks to the previous chunk, their results are
+    owned by the previous chunk.
+
+    Args:
+        total_frames (int): number of frames in the video
+        num_chunks (int): number of chunks, usually number of workers
+        overlap_frames (int): frames shared by two consecutive chunks
+
+    Returns:
+        list of dict: chunkId, firstFrame (first processed), start (first owned) and
+            end (exclusive) frame ids of every chunk
+    """
+    num_chunks = max(1, min(num_chunks, total_frames))
+    bounds = np.linspace(0, total_frames, num_chunks + 1).astype(int)
+    return [
+        {
+            "chunkId": chunk_id,
+            "firstFrame": max(0, int(bounds[chunk_id]) - overlap_frames),
+            "start": int(bounds[chunk_id]),
+            "end": int(bounds[chunk_id + 1]),
+        }
+        for chunk_id in range(num_chunks)
+    ]
+
+
+def box_iou(box_a, box_b):
+    """IoU of two xmin, ymin, xmax, ymax boxes"""
+    inter_w = min(box_a[2], box_b[2]) - max(box_a[0], box_b[0])
+    inter_h = min(box_a[3], box_b[3]) - max(box_a[1], box_b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+def read_person_boxes(log_path, start_frame, end_frame):
+    """Read person boxes of a frame range from a detection log
+
+    Returns:
+        dict: frame id --> {track id: box}
+    """
+    boxes = dict()
+    reader = detectionLogReader(log_path)
+    while reader.read_record():
+        if reader.frameId >= end_frame:
+            break
+        if reader.frameId < start_frame or detection_log.PERSON not in reader.recordBlocks:
+            continue
+        boxes[reader.frameId] = {
+            int(row[4]): row[:4] for row in reader.recordBlocks[detection_log.PERSON]
+        }
+    reader.close()
+    return boxes
+
+
+class trackStitcher:
+    """Stitches track ids of video chunks processed by separate workers into global ids.
+
+    Every chunk has its own tracker and reid, so the same person gets unrelated ids in
+    two chunks. Tracks of a chunk are matched to tracks of the previous chunk by the
+    mean IoU of their boxes on the overlap frames both chunks processed. Tracks left
+    unmatched (eg: a person coming back in a later chunk) are matched with the reid
+    embedding of every global id seen so far, else they get a new global id.
+
+    Attributes:
+        iouThreshold (float): min mean overlap IoU for a match
+        reidThreshold (float): min cosine similarity of embeddings for a reid match
+        gallery (dict): global id --> normalized embedding
+        nextGlobalId (int): next unused global id
+
+    Methods:
+        match_overlap: match tracks of two chunks on their overlap frames
+        match_gallery: match a track embedding with the global ids
+        stitch: build local --> global id maps of all chunks
+        write_stitched_log: merge chunk logs into one log with global ids
+    """
+
+    def __init__(self, iou_threshold, reid_threshold):
+        self.iouThreshold = iou_threshold
+        self.reidThreshold = reid_threshold
+        self.gallery = dict()
+        self.nextGlobalId = 1
+
+    def match_overlap(self, prev_boxes, cur_boxes):
+        """Greedy one to one matching of tracks on the overlap frames
+
+        Args:
+            prev_boxes (dict): frame id --> {track id: box} of previous chunk
+            cur_boxes (dict): frame id --> {track id: box} of current chunk
+
+        Returns:
+            dict: current track id --> previous track id
+        """
+        iou_sums = dict()
+        cur_frame_counts = dict()
+        for frame_id, cur_tracks in cur_boxes.items():
+            prev_tracks = prev_boxes.get(frame_id, {})
+            for cur_id, cur_box in cur_tracks.items():
+                cur_frame_counts[cur_id] = cur_frame_counts.get(cur_id, 0) + 1
+                for prev_id, prev_box in prev_tracks.items():
+                    iou = box_iou(cur_box, prev_box)
+                    if iou > 0:
+                        iou_sums[(cur_id, prev_id)] = iou_sums.get((cur_id, prev_id), 0.0) + iou
+        # mean over the frames the current track was seen, so short overlaps don't win
+        scores = sorted(
+            ((iou_sum / cur_frame_counts[cur_id], cur_id, prev_id) for (cur_id, prev_id), iou_sum in iou_sums.items()),
+            reverse=True,
+        )
+        matches = dict()
+        used_prev = set()
+        for score, cur_id, prev_id in scores:
+            if score < self.iouThreshold:
+                break
+            if cur_id in matches or prev_id in used_prev:
+                continue
+            matches[cur_id] = prev_id
+            used_prev.add(prev_id)
+        return matches
+
+    def match_gallery(self, embedding, excluded_ids):
+        """Find the global id with most similar embedding
+
+        Args:
+            embedding (np.array): normalized embedding of a track
+            excluded_ids (set): global ids already taken in this chunk
+
+        Returns:
+            int or None: global id, None if nothing is similar enough
+        """
+        best_id, best_similarity = None, self.reidThreshold
+        for global_id, gallery_embedding in self.gallery.items():
+            if global_id in excluded_ids:
+                continue
+            similarity = float(np.dot(embedding, gallery_embedding))
+            if similarity >= best_similarity:
+                best_id, best_similarity = global_id, similarity
+        return best_id
+
+    def update_gallery(self, global_id, embedding):
+        if embedding is None:
+            return
+        if global_id in self.gallery:
+            embedding = self.gallery[global_id] + embedding
+        self.gallery[global_id] = embedding / (np.linalg.norm(embedding) + 1e-12)
+
+    def stitch(self, chunk_results):
+        """Build local track id --> global id map of every chunk
+
+        Args:
+            chunk_results (list of dict): per chunk, in order, with chunk bounds
+                (firstFrame, start, end), logPath of its detection log and
+                embeddings (track id --> normalized embedding)
+
+        Returns:
+            list of dict: per chunk, local track id --> global track id
+        """
+        mappings = []
+        prev = None
+        for chunk in chunk_results:
+            embeddings = chunk["embeddings"]
+            track_ids = set(embeddings)
+            for boxes in read_person_boxes(chunk["logPath"], chunk["firstFrame"], chunk["end"]).values():
+                track_ids.update(boxes)
+
+            overlap_matches = dict()
+            if prev is not None and chunk["firstFrame"] < chunk["start"]:
+                overlap_matches = self.match_overlap(
+                    read_person_boxes(prev["logPath"], chunk["firstFrame"], chunk["start"]),
+                    read_person_boxes(chunk["logPath"], chunk["firstFrame"], chunk["start"]),
+                )
+
+            mapping = dict()
+            for cur_id, prev_id in overlap_matches.items():
+                mapping[cur_id] = mappings[-1][prev_id]
+            for track_id in sorted(track_ids - set(mapping)):
+                global_id = None
+                if track_id in embeddings:
+                    global_id = self.match_gallery(embeddings[track_id], set(mapping.values()))
+                if global_id is None:
+                    global_id = self.nextGlobalId
+                    self.nextGlobalId += 1
+                mapping[track_id] = global_id
+            for track_id, global_id in mapping.items():
+                self.update_gallery(global_id, embeddings.get(track_id))
+
+            logger.info(
+                "chunk %d: %d tracks, %d stitched on overlap, %d global ids so far",
+                chunk["chunkId"], len(mapping), len(overlap_matches), self.nextGlobalId - 1,
+            )
+            mappings.append(mapping)
+            prev = chunk
+        return mappings
+
+    def write_stitched_log(self, chunk_results, mappings, log_path):
+        """Merge the owned frames of every chunk log into one detection log with global track ids
+
+        Args:
+            chunk_results (list of dict): same as stitch
+            mappings (list of dict): output of stitch
+            log_path (str): path of merged log
+        """
+        writer = detectionLogWriter(log_path)
+        for chunk, mapping in zip(chunk_results, mappings):
+            reader = detectionLogReader(chunk["logPath"])
+            while reader.read_record():
+                if reader.frameId < chunk["start"]:
+                    continue
+                if reader.frameId >= chunk["end"]:
+                    break
+                writer.begin_frame(reader.frameId)
+                for kind, rows in reader.recordBlocks.items():
+                    column = detection_log.TRACK_ID_COLUMN.get(kind)
+                    if column is not None and rows.size:
+                        rows = rows.copy()
+                        rows[:, column] = [mapping.get(int(track_id), int(track_id)) for track_id in rows[:, column]]
+                    writer.add(kind, rows)
+                writer.end_frame()
+            reader.close()
+        writer.close()
@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class trackStore:
+    """Bounded bbox history of every track, replaces the dict of growing lists in reID.
+
+    Every track owns a slot of preallocated numpy arrays: a ring buffer of its last
+    historyLength boxes, the frame it was first and last seen and how many boxes it
+    has. Lookups go through a dict of track id --> slot, so add, lookup and eviction of
+    a track are O(1). Slots of evicted tracks are reused and the arrays only grow (by
+    doubling) when more tracks are alive at once, so memory stays flat on streams and
+    in the looping server mode.
+
+    Tracks not seen for ttlFrames frames are evicted by evict_expired. Evicted tracks are
+    passed to archiveHook, eg: a trackArchive writing them to disk, before their slot
+    is freed.
+
+    Usage:
+        store = trackStore(history_length=30, ttl_frames=300)
+        store.add(track_id, (xmin, ymin, xmax, ymax), frame_id)
+        if track_id in store: ...
+        store.evict_expired(frame_id)
+
+    Attributes:
+        historyLength (int): boxes kept per track
+        ttlFrames (int): frames after which an unseen track is evicted, 0 to never evict
+        archiveHook (callable): called with (track_id, boxes, first_frame, last_frame) of
+            evicted tracks, None to drop them
+        boxes (np.array): (capacity, historyLength, 4) ring buffers
+        counts (np.array): boxes added per slot
+        firstSeen (np.array): first frame of the track in each slot
+        lastSeen (np.array): last frame of the track in each slot
+        slots (dict): track id --> slot
+
+    Methods:
+        add: add a box of a track, creates the track if needed
+        get: boxes of a track, oldest first
+        last_box: latest box of a track
+        evict_expired: evict tracks not seen for ttlFrames
+        evict: evict one track
+        clear: evict every track
+    """
+
+    def __init__(self, history_length=30, ttl_frames=300, archive_hook=None, initial_capacity=64):
+        """
+        Args:
+            history_length (int): boxes kept per track
+            ttl_frames (int): frames after which an unseen track is evicted, 0 to never evict
+            archive_hook (callable, optional): gets (track_id, boxes, first_frame, last_frame)
+            initial_capacity (int): tracks that fit before the arrays grow
+        """
+        self.historyLength = max(1, history_length)
+        self.ttlFrames = ttl_frames
+        self.archiveHook = archive_hook
+        self.boxes = np.zeros((initial_capacity, self.historyLength, 4), dtype=np.int32)
+        self.counts = np.zeros(initial_capacity, dtype=np.int64)
+        self.firstSeen = np.zeros(initial_capacity, dtype=np.int64)
+        self.lastSeen = np.zeros(initial_capacity, dtype=np.int64)
+        self.slots = dict()
+        self.freeSlots = list(range(initial_capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, track_id):
+        return track_id in self.slots
+
+    def __getitem__(self, track_id):
+        return self.get(track_id)
+
+    def __iter__(self):
+        return iter(list(self.slots))
+
+    def keys(self):
+        return list(self.slots)
+
+    def values(self):
+        return [self.get(track_id) for track_id in self.slots]
+
+    def items(self):
+        return [(track_id, self.get(track_id)) for track_id in self.slots]
+
+    def grow(self):
+        """Double the capacity of the arrays"""
+        capacity = len(self.counts)
+        self.boxes = np.concatenate([self.boxes, np.zeros_like(self.boxes)])
+        self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
+        self.firstSeen = np.concatenate([self.firstSeen, np.zeros_like(self.firstSeen)])
+        self.lastSeen = np.concatenate([self.lastSeen, np.zeros_like(self.lastSeen)])
+        self.freeSlots.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def add(self, track_id, box, frame_id):
+        """Add a box of a track
+
+        Args:
+            track_id (int): track id
+            box (tuple): xmin, ymin, xmax, ymax
+            frame_id (int): frame of the box
+        """
+        slot = self.slots.get(track_id)
+        if slot is None:
+            if not self.freeSlots:
+                self.grow()
+            slot = self.slots[track_id] = self.freeSlots.pop()
+            self.counts[slot] = 0
+            self.firstSeen[slot] = frame_id
+        self.boxes[slot, self.counts[slot] % self.historyLength] = box[:4]
+        self.counts[slot] += 1
+        self.lastSeen[slot] = frame_id
+
+    def get(self, track_id):
+        """
+        Returns:
+            np.array: (boxes, 4) last boxes of the track, oldest first
+        """
+        return self.get_slot_boxes(self.slots[track_id])
+
+    def last_box(self, track_id):
+        slot = self.slots[track_id]
+        return self.boxes[slot, (self.counts[slot] - 1) % self.historyLength].copy()
+
+    def evict(self, track_id):
+        """Archive a track and free its slot"""
+        slot = self.slots.pop(track_id)
+        if self.archiveHook:
+            try:
+                self.archiveHook(track_id, self.get_slot_boxes(slot), int(self.firstSeen[slot]), int(self.lastSeen[slot]))
+            except Exception as e:
+                # archiving is best effort, the pipeline keeps running
+                logger.error("Could not archive track %s: %s", track_id, e)
+        self.freeSlots.append(slot)
+
+    def get_slot_boxes(self, slot):
+        """Ring buffer of a slot unrolled, oldest box first"""
+        count = self.counts[slot]
+        if count <= self.historyLength:
+            return self.boxes[slot, :count].copy()
+        head = count % self.historyLength
+        return np.concatenate([self.boxes[slot, head:], self.boxes[slot, :head]])
+
+    def evict_expired(self, frame_id):
+        """Evict tracks not seen in the last ttlFrames frames
+
+        Args:
+            frame_id (int): current frame
+
+        Returns:
+            list: evicted track ids
+        """
+        if not self.ttlFrames or not self.slots:
+            return []
+        slot_ids = np.fromiter(self.slots.values(), dtype=np.int64, count=len(self.slots))
+        expired = slot_ids[frame_id - self.lastSeen[slot_ids] > self.ttlFrames]
+        if not len(expired):
+            return []
+        expired = set(expired.tolist())
+        evicted = [track_id for track_id, slot in self.slots.items() if slot in expired]
+        for track_id in evicted:
+            self.evict(track_id)
+        return evicted
+
+    def clear(self, archive=True):
+        """Evict every track, eg: at end of video
+
+        Args:
+            archive (bool): pass the tracks to archiveHook
+        """
+        if archive and self.archiveHook:
+            for track_id in list(self.slots):
+                self.evict(track_id)
+        self.slots.clear()
+        self.freeSlots = list(range(len(self.counts) - 1, -1, -1))
+
+
+class trackArchive:
+    """Archive hook of trackStore writing every evicted track as a json line
+
+    Attributes:
+        path (str): json lines file, one file per camera
+    """
+
+    def __init__(self, archive_dir, cam_id):
+        """
+        Args:
+            archive_dir (str): dir of the archive files
+            cam_id (str): camera id, gives the file name
+        """
+        os.makedirs(archive_dir, exist_ok=True)
+        self.path = os.path.join(archive_dir, os.path.splitext(cam_id)[0] + ".tracks.jsonl")
+
+    def __call__(self, track_id, boxes, first_frame, last_frame):
+        with open(self.path, "a") as f:
+            f.write(
+                json.dumps(
+                    {
+                        "trackId": int(track_id),
+                        "firstFrame": first_frame,
+                        "lastFrame": last_frame,
+                        "boxes": boxes.tolist(),
+                    }
+                )
+                + "\n"
+            )
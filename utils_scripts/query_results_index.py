@@ -0,0 +1,110 @@
+"""Command line access to the results index written by app.py
+
+Run from repo root, eg:
+    python -m utils_scripts.query_results_index violations --cam Red_zone_creation.mp4 --type ppe \
+        --start "2024-10-21 12:00:00" --end "2024-10-21 13:00:00"
+    python -m utils_scripts.query_results_index zones --zone zone1 --min-count 1
+    python -m utils_scripts.query_results_index frames --cam firesmoke.mp4 --limit 10
+    python -m utils_scripts.query_results_index events --type fall --event start
+"""
+import argparse
+import json
+from datetime import datetime
+
+from utils.configs.config import jsonConfigParser
+from utils.results_index.results_index import resultsIndex
+
+
+def parse_time(value):
+    """Accept epoch seconds or an iso formatted datetime"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the results index")
+    parser.add_argument("--config", default="config/config.json", help="main config file")
+    parser.add_argument("--db", default=None, help="index path, defaults to resultsIndex.databasePath from config")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    violations = subparsers.add_parser("violations", help="query violations")
+    violations.add_argument("--cam", default=None)
+    violations.add_argument("--type", default=None, help="zone, ppe, fall, fire, smoke, garbage, spill, tripHazard")
+    violations.add_argument("--detail", default=None, help="eg: hard-hat for ppe violations")
+    violations.add_argument("--track", type=int, default=None)
+    violations.add_argument("--zone", default=None)
+    violations.add_argument("--start-frame", type=int, default=None)
+    violations.add_argument("--end-frame", type=int, default=None)
+
+    zones = subparsers.add_parser("zones", help="query person count in zones")
+    zones.add_argument("--cam", default=None)
+    zones.add_argument("--zone", default=None)
+    zones.add_argument("--min-count", type=int, default=None)
+
+    frames = subparsers.add_parser("frames", help="query indexed frames")
+    frames.add_argument("--cam", default=None)
+
+    events = subparsers.add_parser("events", help="query violation events")
+    events.add_argument("--cam", default=None)
+    events.add_argument("--event", default=None, help="start, update or end")
+    events.add_argument("--type", default=None)
+    events.add_argument("--track", type=int, default=None)
+
+    for sub in (violations, zones, frames, events):
+        sub.add_argument("--start", default=None, help="epoch seconds or iso datetime")
+        sub.add_argument("--end", default=None, help="epoch seconds or iso datetime")
+        sub.add_argument("--limit", type=int, default=None)
+
+    args = parser.parse_args()
+    database_path = args.db or jsonConfigParser(args.config).config["resultsIndex"]["databasePath"]
+    index = resultsIndex(database_path)
+    start_time, end_time = parse_time(args.start), parse_time(args.end)
+
+    if args.command == "violations":
+        rows = index.query_violations(
+            cam_id=args.cam,
+            violation_type=args.type,
+            detail=args.detail,
+            track_id=args.track,
+            zone_name=args.zone,
+            start_time=start_time,
+            end_time=end_time,
+            start_frame=args.start_frame,
+            end_frame=args.end_frame,
+            limit=args.limit,
+        )
+    elif args.command == "zones":
+        rows = index.query_zone_counts(
+            cam_id=args.cam,
+            zone_name=args.zone,
+            min_count=args.min_count,
+            start_time=start_time,
+            end_time=end_time,
+            limit=args.limit,
+        )
+    elif args.command == "events":
+        rows = index.query_events(
+            cam_id=args.cam,
+            event=args.event,
+            violation_type=args.type,
+            track_id=args.track,
+            start_time=start_time,
+            end_time=end_time,
+            limit=args.limit,
+        )
+    else:
+        rows = index.query_frames(
+            cam_id=args.cam, start_time=start_time, end_time=end_time, limit=args.limit
+        )
+    index.close()
+
+    for row in rows:
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()